@@ -0,0 +1,36 @@
+"""Compare the batch execution of multi-line input with line-by-line execution.
+
+Run this script in ChimeraX with the number of lines:
+
+    runscript /path/to/benchmarks/batch_execution.py 500
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from chimerax.core.commands import run  # type: ignore
+from chimerax.clix._injection import chimerax_run_batch  # type: ignore
+
+_LINES = ["turn y 1", "color #1 red", "color #1 byhetero", "cartoon #1", "hide #1 cartoon"]
+
+def main(session, num_lines: int):
+    run(session, "close; open 1ubq", log=False)
+    code = "\n".join(_LINES[i % len(_LINES)] for i in range(num_lines))
+
+    t0 = time.perf_counter()
+    for line in code.split("\n"):
+        run(session, line)
+    line_by_line = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    result = chimerax_run_batch(session)(code, "stop")
+    batch = time.perf_counter() - t0
+    assert not result.errors
+
+    session.logger.info(
+        f"{num_lines} lines: line-by-line {line_by_line:.3f} s, batch {batch:.3f} s "
+        f"({line_by_line / batch:.1f}x)"
+    )
+
+main(session, int(sys.argv[1]) if len(sys.argv) > 1 else 500)  # noqa: F821
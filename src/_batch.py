@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from html import escape
+import time
+from typing import Any, Callable, Iterable, Literal
+
+@dataclass
+class LineResult:
+    """Result of a line run in a batch."""
+    lineno: int
+    line: str
+    wall: float
+    error: Exception | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+@dataclass
+class BatchResult:
+    """Result of the lines run as a batch."""
+    results: list[LineResult] = field(default_factory=list)
+    num_skipped: int = 0  # lines not run because of an error
+
+    @property
+    def errors(self) -> list[LineResult]:
+        return [r for r in self.results if not r.ok]
+
+    @property
+    def wall(self) -> float:
+        return sum(r.wall for r in self.results)
+
+    def to_html(self) -> str:
+        """Combined log entry of the batch."""
+        lines = "<br>".join(escape(r.line) for r in self.results)
+        summary = f"Ran {len(self.results)} lines in {self.wall:.2f} s"
+        if errors := self.errors:
+            summary += f", {len(errors)} failed"
+        if self.num_skipped:
+            summary += f", {self.num_skipped} skipped"
+        out = f"<b>{summary}</b><br><code>{lines}</code>"
+        for r in errors:
+            out += (
+                f"<br><span style='color:red'>line {r.lineno}: <code>{escape(r.line)}</code>"
+                f" &mdash; {escape(str(r.error))}</span>"
+            )
+        return out
+
+def iter_lines(code: str) -> Iterable[tuple[int, str]]:
+    """Iterate over the (1-based line number, stripped line) of the non-empty lines."""
+    for lineno, line in enumerate(code.split("\n"), start=1):
+        if line := line.strip():
+            yield lineno, line
+
+def run_batch(
+    code: str,
+    run: Callable[[str], Any],
+    on_error: Literal["stop", "continue"] = "stop",
+) -> BatchResult:
+    """Run all the lines of the code and collect the errors of each line.
+
+    If `on_error` is "stop", the lines after the first error are skipped.
+    """
+    result = BatchResult()
+    lines = list(iter_lines(code))
+    for i, (lineno, line) in enumerate(lines):
+        t0 = time.perf_counter()
+        try:
+            run(line)
+        except Exception as e:
+            result.results.append(LineResult(lineno, line, time.perf_counter() - t0, e))
+            if on_error == "stop":
+                result.num_skipped = len(lines) - i - 1
+                break
+        else:
+            result.results.append(LineResult(lineno, line, time.perf_counter() - t0))
+    return result
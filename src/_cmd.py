@@ -1,8 +1,9 @@
 from __future__ import annotations
 
 from chimerax.core.commands import CmdDesc, run      # Command description
-from chimerax.core.commands.cli import NoArg, BoolArg, EnumOf
-import json
+from chimerax.core.commands.cli import (
+    NoArg, BoolArg, PositiveIntArg, EnumOf, ListOf, OpenFileNameArg, OpenFolderNameArg, SaveFileNameArg
+)
 from .user_data import COMMAND_HISTORY_PATH, read_log
 
 def clix_show(session):
@@ -16,31 +17,42 @@ clix_show_desc = CmdDesc(
 
 def clix_import_history(session, append: bool = False, include_errors: bool = False):
     from ._history import HistoryManager
+    from ._utils import iter_json_array
 
     if not COMMAND_HISTORY_PATH.exists():
         raise FileNotFoundError(
             "No ChimeraX command history file found. Expected location: "
             f"{COMMAND_HISTORY_PATH.as_posix()}."
         )
-    with open(COMMAND_HISTORY_PATH, "r") as f:
-        history: list[tuple[str, bool]] = json.load(f)
     mgr = HistoryManager.instance()
-    
-    to_import: list[str] = []
-    imported = set()
-    for code, is_ok in history:
-        if code in imported:
+
+    # codes are imported in the same order as prepending or appending them one by one
+    to_import: dict[str, None] = {}  # ordered set
+    num_duplicates = 0
+    num_errors = 0
+    for i, item in enumerate(iter_json_array(COMMAND_HISTORY_PATH)):
+        if i % 10000 == 0 and i > 0:
+            session.logger.status(f"Reading command history ... {i} entries")
+        if not (isinstance(item, list) and len(item) == 2 and isinstance(item[0], str)):
+            num_errors += 1  # malformed entry, never imported
             continue
-        if is_ok or include_errors:
-            to_import.append(code)
-            imported.add(code)
-    if append:
-        for code in to_import:
-            mgr._history.append_unique(code)
-    else:
-        for code in to_import:
-            mgr._history.prepend_unique(code)
-    mgr._history.save()
+        code, is_ok = item
+        if not is_ok:
+            num_errors += 1
+            if not include_errors:
+                continue
+        if code in to_import:
+            num_duplicates += 1
+            continue
+        to_import[code] = None
+    session.logger.status(f"Saving {len(to_import)} commands ...")
+    num_new = mgr._history.merge(to_import, prepend=not append)
+    mgr.rebuild_index()
+    errors = "imported" if include_errors else "skipped"
+    session.logger.info(
+        f"Imported {len(to_import)} commands ({num_new} new). {num_duplicates} "
+        f"duplicates skipped, {num_errors} failed commands {errors}."
+    )
 
 clix_import_history_desc = CmdDesc(
     required=[],
@@ -58,9 +70,13 @@ def clix_preference(
     show_label: bool | None = None,
     enter_completion: bool | None = None,
     auto_focus: bool | None = None,
+    file_index_roots: list[str] | None = None,
+    history_backend: str | None = None,
+    batch_execution: str | None = None,
+    validate_scripts: bool | None = None,
     show: bool = False,
 ):
-    from ._preference import load_preference, save_preference
+    from ._preference import RESTART_FIELDS, load_preference, save_preference
 
     old_pref = load_preference()
     new_pref = save_preference(
@@ -69,11 +85,18 @@ def clix_preference(
         show_label=show_label,
         enter_completion=enter_completion,
         auto_focus=auto_focus,
+        file_index_roots=file_index_roots,
+        history_backend=history_backend,
+        batch_execution=batch_execution,
+        validate_scripts=validate_scripts,
     )
     if show:
         print(new_pref.as_repr())
-    if old_pref != new_pref:
-        print("Please restart CliX to apply the changes.")
+    changed = [
+        name for name in RESTART_FIELDS if getattr(old_pref, name) != getattr(new_pref, name)
+    ]
+    if changed:
+        print(f"Please restart CliX to apply the changes of {', '.join(changed)}.")
 
 clix_preference_desc = CmdDesc(
     keyword=[
@@ -82,6 +105,10 @@ clix_preference_desc = CmdDesc(
         ("show_label", BoolArg),
         ("enter_completion", BoolArg),
         ("auto_focus", BoolArg),
+        ("file_index_roots", ListOf(OpenFolderNameArg)),
+        ("history_backend", EnumOf(["file", "sqlite"])),
+        ("batch_execution", EnumOf(["off", "stop", "continue"])),
+        ("validate_scripts", BoolArg),
         ("show", NoArg),
     ],
     synopsis="set preference of CliX.",
@@ -104,3 +131,242 @@ clix_log_desc = CmdDesc(
     optional=[],
     synopsis="show the CliX log.",
 )
+
+def clix_history_stats(session, top: int = 10):
+    from html import escape
+    from ._timing import CommandTimingLog, HISTOGRAM_BINS
+
+    stats = CommandTimingLog.instance().stats(top=top)
+    if stats.num_lines == 0:
+        session.logger.info("No command timing recorded yet.")
+        return
+
+    def _sec(t: float) -> str:
+        return f"{t * 1000:.1f} ms" if t < 1 else f"{t:.2f} s"
+
+    slowest_rows = "".join(
+        f"<tr><td>{_sec(e.wall)}</td><td>{'' if e.ok else 'error'}</td>"
+        f"<td><code>{escape(e.line)}</code></td></tr>"
+        for e in stats.slowest
+    )
+    command_rows = "".join(
+        f"<tr><td>{escape(s.name)}</td><td>{s.count}</td><td>{_sec(s.total)}</td>"
+        f"<td>{_sec(s.median)}</td><td>{_sec(s.quantile(0.9))}</td><td>{_sec(s.max)}</td>"
+        f"<td>{s.num_errors}</td></tr>"
+        for s in stats.per_command[:top]
+    )
+    hist_rows = []
+    lower = 0.0
+    max_count = max(stats.histogram)
+    for upper, count in zip(HISTOGRAM_BINS, stats.histogram):
+        label = f"&ge; {_sec(lower)}" if upper == float("inf") else f"&lt; {_sec(upper)}"
+        bar = "&#9608;" * round(30 * count / max_count)
+        hist_rows.append(f"<tr><td>{label}</td><td>{count}</td><td>{bar}</td></tr>")
+        lower = upper
+    html = (
+        f"<b>CliX command timing</b> ({stats.num_lines} lines)<br>"
+        f"<b>Slowest lines</b><table>"
+        f"<tr><th>Time</th><th></th><th>Line</th></tr>{slowest_rows}</table>"
+        f"<b>Total time per command</b><table>"
+        f"<tr><th>Command</th><th>Count</th><th>Total</th><th>Median</th><th>p90</th>"
+        f"<th>Max</th><th>Errors</th></tr>{command_rows}</table>"
+        f"<b>Duration histogram</b><table>{''.join(hist_rows)}</table>"
+    )
+    session.logger.info(html, is_html=True)
+
+clix_history_stats_desc = CmdDesc(
+    required=[],
+    optional=[],
+    keyword=[("top", PositiveIntArg)],
+    synopsis="show the statistics of the execution time of commands.",
+)
+
+def clix_run(
+    session,
+    path: str,
+    profile: bool = False,
+    top: int = 10,
+    output: str | None = None,
+):
+    from html import escape
+    from ._script import run_script
+    from ._timing import CommandTimingLog
+    from .tool import ClixTool
+    from ._injection import chimerax_run
+    from ._preference import load_preference
+    from ._script import iter_script_lines
+    from ._cli_utils import iter_all_commands
+    from .algorithms.validate import SignatureTable, validate_lines, diagnostics_to_html
+
+    widget = None
+    for tool in session.tools.list():
+        if isinstance(tool, ClixTool):
+            widget = tool._clix_widget
+            break
+    if load_preference(force=False).validate_scripts:
+        table = SignatureTable.from_commands(dict(iter_all_commands()))
+        if diagnostics := list(validate_lines(iter_script_lines(path), table)):
+            session.logger.error(diagnostics_to_html(diagnostics), is_html=True)
+            return
+    timing_log = CommandTimingLog.instance()
+
+    def _on_line(result):
+        timing_log.record(result.line, result.wall, result.ok)
+        if result.ok and widget is not None:
+            widget._update_alias(result.line)
+            widget._update_namespace(result.line)
+        if result.lineno % 100 == 0:
+            session.logger.status(f"Running {path} ... line {result.lineno}")
+
+    result = run_script(
+        path, chimerax_run(session), top=top, output=output, on_line=_on_line
+    )
+    session.logger.status("")
+    if not profile:
+        return
+    rows = "".join(
+        f"<tr><td>{each.lineno}</td><td>{each.wall * 1000:.1f} ms</td>"
+        f"<td><code>{escape(each.line)}</code></td></tr>"
+        for each in result.slowest
+    )
+    session.logger.info(
+        f"<b>{escape(path)}</b>: {result.num_lines} lines in {result.wall:.2f} s<br>"
+        f"<b>Slowest lines</b><table><tr><th>Line</th><th>Time</th><th></th></tr>"
+        f"{rows}</table>",
+        is_html=True,
+    )
+
+clix_run_desc = CmdDesc(
+    required=[("path", OpenFileNameArg)],
+    keyword=[
+        ("profile", BoolArg),
+        ("top", PositiveIntArg),
+        ("output", SaveFileNameArg),
+    ],
+    synopsis="run a command script line by line and optionally profile each line.",
+)
+
+def clix_lint(
+    session,
+    path: str,
+    signatures: str | None = None,
+    save_signatures: str | None = None,
+    processes: int | None = None,
+):
+    import json
+    import os
+    import subprocess
+    import sys
+    import tempfile
+    import threading
+    from .lint import python_executable
+    from ._cli_utils import iter_all_commands
+    from .algorithms.validate import SignatureTable
+
+    if signatures is not None:
+        with open(signatures, encoding="utf-8") as f:
+            snapshot = json.load(f)
+    else:
+        snapshot = SignatureTable.from_commands(
+            dict(iter_all_commands()), resolve=True
+        ).to_snapshot()
+    if save_signatures is not None:
+        with open(save_signatures, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f)
+
+    # removed by the reader thread when the linter finishes
+    tmpdir = tempfile.mkdtemp(prefix="clix-lint-")
+    snapshot_path = os.path.join(tmpdir, "signatures.json")
+    with open(snapshot_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f)
+    args = [
+        python_executable(), "-m", f"{__package__}.lint",
+        "--signatures", snapshot_path, "--json", path,
+    ]
+    if processes is not None:
+        args += ["--processes", str(processes)]
+    # the workers import this package from the same paths as ChimeraX
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in sys.path if p))
+    # stderr goes to a file, so that the linter never blocks on a full pipe
+    stderr_path = os.path.join(tmpdir, "stderr.txt")
+    with open(stderr_path, "w", encoding="utf-8") as stderr:
+        proc = subprocess.Popen(
+            args, stdout=subprocess.PIPE, stderr=stderr, text=True, env=env
+        )
+    session.logger.status(f"Checking the scripts in {path} ...")
+    threading.Thread(
+        target=_read_lint_results, args=(session, proc, tmpdir, stderr_path),
+        name="clix-lint", daemon=True,
+    ).start()
+
+def _read_lint_results(session, proc, tmpdir: str, stderr_path: str):
+    """Read the results of the linter and log them in the main thread."""
+    import shutil
+    from .lint import FileDiagnostics
+
+    num_files = num_problems = 0
+    others: list[str] = []  # lines that are not results, such as warnings
+    try:
+        for line in proc.stdout:
+            try:
+                result = FileDiagnostics.from_json(line)
+            except (ValueError, KeyError, TypeError):
+                others.append(line.rstrip("\n"))
+                continue
+            num_files += 1
+            num_problems += len(result.diagnostics) + int(result.error is not None)
+            session.ui.thread_safe(_log_lint_result, session, result, num_files)
+    except Exception:
+        proc.kill()
+        raise
+    finally:
+        returncode = proc.wait()
+        try:
+            with open(stderr_path, encoding="utf-8", errors="replace") as f:
+                stderr = f.read()
+        except OSError:
+            stderr = ""
+        shutil.rmtree(tmpdir, ignore_errors=True)
+        session.ui.thread_safe(
+            _log_lint_summary, session, num_files, num_problems, returncode, stderr, others
+        )
+
+def _log_lint_result(session, result, num_files: int):
+    from html import escape
+
+    session.logger.status(f"Checked {num_files} scripts")
+    if result.error is not None:
+        session.logger.warning(f"{result.path}: {result.error}")
+    if not result.diagnostics:
+        return
+    items = "".join(
+        f"<li>line {d.lineno}: {escape(d.message)}<br><code>{escape(d.line)}</code></li>"
+        for d in result.diagnostics
+    )
+    session.logger.warning(f"<b>{escape(result.path)}</b><ul>{items}</ul>", is_html=True)
+
+def _log_lint_summary(
+    session,
+    num_files: int,
+    num_problems: int,
+    returncode: int,
+    stderr: str,
+    others: list[str],
+):
+    session.logger.status("")
+    if others:
+        session.logger.warning("clix lint printed:\n" + "\n".join(others))
+    if returncode not in (0, 1):
+        session.logger.error(f"clix lint failed:\n{stderr}")
+        return
+    session.logger.info(f"Checked {num_files} scripts, found {num_problems} problem(s).")
+
+clix_lint_desc = CmdDesc(
+    required=[("path", OpenFolderNameArg)],
+    keyword=[
+        ("signatures", OpenFileNameArg),
+        ("save_signatures", SaveFileNameArg),
+        ("processes", PositiveIntArg),
+    ],
+    synopsis="check the command scripts in a directory without running them.",
+)
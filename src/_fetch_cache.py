@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, astuple
+from datetime import datetime
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Iterable
+
+from .user_data import CLIX_DATA_DIR, CLIX_FETCH_CACHE_FILE
+
+LOGGER = logging.getLogger(__name__)
+
+@dataclass
+class FetchEntry:
+    """A file in the ChimeraX fetch cache."""
+    database: str
+    id: str
+    path: str
+    size: int
+    mtime: float
+
+    @property
+    def spec(self) -> str:
+        """The string to be passed to the `open` command."""
+        if self.database == "pdb":
+            return self.id
+        return f"{self.database}:{self.id}"
+
+    def describe(self) -> str:
+        date = datetime.fromtimestamp(self.mtime).strftime("%Y-%m-%d")
+        return f"local, {_format_size(self.size)}, {date}"
+
+class FetchCacheIndex:
+    """Index of the files already fetched into the ChimeraX download cache."""
+
+    _instance: FetchCacheIndex | None = None
+
+    def __init__(self, path: Path = CLIX_FETCH_CACHE_FILE):
+        self._path = path
+        self._entries: list[FetchEntry] = []
+        self._dir_mtimes: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def instance(cls) -> FetchCacheIndex:
+        """Return the singleton instance of the class."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def start(self, cache_dirs: Iterable[str]):
+        """Start indexing the cache directories in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return None
+        self._thread = threading.Thread(
+            target=self.update,
+            args=(list(cache_dirs),),
+            name="clix-fetch-cache",
+            daemon=True,
+        )
+        self._thread.start()
+        return None
+
+    def update(self, cache_dirs: Iterable[str]):
+        """Update the index (blocking)."""
+        if not self._entries:
+            self.load()
+        old_entries: dict[str, list[FetchEntry]] = {}
+        for entry in self._entries:
+            old_entries.setdefault(str(Path(entry.path).parent), []).append(entry)
+        entries: list[FetchEntry] = []
+        dir_mtimes: dict[str, int] = {}
+        for cache_dir in cache_dirs:
+            try:
+                with os.scandir(cache_dir) as it:
+                    db_dirs = [e.path for e in it if e.is_dir()]
+            except OSError:
+                continue
+            for db_dir in db_dirs:
+                try:
+                    mtime_ns = os.stat(db_dir).st_mtime_ns
+                except OSError:
+                    continue
+                dir_mtimes[db_dir] = mtime_ns
+                if self._dir_mtimes.get(db_dir) == mtime_ns and db_dir in old_entries:
+                    entries.extend(old_entries[db_dir])
+                else:
+                    entries.extend(_scan_database_dir(db_dir))
+        entries.sort(key=lambda e: (e.database, e.id))
+        with self._lock:
+            self._entries = entries
+            self._dir_mtimes = dir_mtimes
+        self.save()
+        return None
+
+    def search(self, prefix: str, n: int = 32) -> list[FetchEntry]:
+        """Return the entries whose spec starts with the prefix (case insensitive)."""
+        prefix = prefix.lower()
+        if prefix == "":
+            return []
+        with self._lock:
+            entries = self._entries
+        out: list[FetchEntry] = []
+        found: set[str] = set()
+        for entry in entries:
+            spec = entry.spec
+            if spec.lower().startswith(prefix) and spec not in found:
+                out.append(entry)
+                found.add(spec)
+                if len(out) >= n:
+                    break
+        return out
+
+    def load(self):
+        """Load the index file."""
+        if not self._path.exists():
+            return None
+        try:
+            with self._path.open("r") as f:
+                js = json.load(f)
+            entries = [FetchEntry(*each) for each in js["entries"]]
+            dir_mtimes = js["dir_mtimes"]
+        except Exception:
+            LOGGER.warning("Failed to load the fetch cache index %s", self._path)
+            return None
+        with self._lock:
+            self._entries = entries
+            self._dir_mtimes = dir_mtimes
+        return None
+
+    def save(self):
+        """Save the index file."""
+        if not CLIX_DATA_DIR.exists():
+            CLIX_DATA_DIR.mkdir(parents=True)
+        js = {
+            "dir_mtimes": self._dir_mtimes,
+            "entries": [astuple(e) for e in self._entries],
+        }
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            json.dump(js, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path)
+        return None
+
+def _scan_database_dir(db_dir: str) -> list[FetchEntry]:
+    database = os.path.basename(db_dir).lower()
+    out: list[FetchEntry] = []
+    try:
+        with os.scandir(db_dir) as it:
+            for entry in it:
+                if not entry.is_file() or entry.name.startswith("."):
+                    continue
+                if (_id := _file_name_to_id(database, entry.name)) is None:
+                    continue
+                stat = entry.stat()
+                out.append(
+                    FetchEntry(database, _id, entry.path, stat.st_size, stat.st_mtime)
+                )
+    except OSError:
+        pass
+    return out
+
+def _file_name_to_id(database: str, name: str) -> str | None:
+    """Convert the cached file name to the database ID.
+
+    >>> _file_name_to_id("pdb", "7abc.cif")
+    '7abc'
+    >>> _file_name_to_id("emdb", "emd_1234.map")
+    '1234'
+    >>> _file_name_to_id("alphafold", "AF-P12345-F1-model_v4.cif")
+    'P12345'
+    """
+    stem = name.split(".", 1)[0]
+    if stem == "":
+        return None
+    if database == "emdb":
+        if stem.lower().startswith("emd_"):
+            return stem[4:]
+        return None
+    if database == "alphafold":
+        if stem.startswith("AF-"):
+            return stem.split("-")[1]
+        return None
+    return stem
+
+def _format_size(size: int) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
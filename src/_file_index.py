@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import json
+import logging
+import os
+from pathlib import Path
+import threading
+from typing import Iterable, Iterator
+
+from .algorithms.fuzzy import FuzzyMatch, fuzzy_match, subsequence_regex
+from .user_data import CLIX_DATA_DIR, CLIX_FILE_INDEX_FILE
+
+LOGGER = logging.getLogger(__name__)
+
+class _DirEntry:
+    """Indexed contents of a directory."""
+
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: list[str], subdirs: list[str]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+class FileIndex:
+    """Background file indexer for fuzzy file path completion.
+
+    Directories under the given roots are walked by a thread pool. The index is saved
+    in the user data directory, and directories whose mtime did not change since the
+    last indexing are not listed again.
+    """
+
+    _instance: FileIndex | None = None
+
+    def __init__(
+        self,
+        path: Path = CLIX_FILE_INDEX_FILE,
+        max_workers: int = 4,
+        max_files: int = 500_000,
+    ):
+        self._path = path
+        self._max_workers = max_workers
+        self._max_files = max_files
+        self._roots: list[str] = []
+        self._dirs: dict[str, _DirEntry] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        # search table (newline separated relative paths)
+        self._text = ""
+        self._line_starts: list[int] = []
+        self._line_paths: list[str] = []
+        # lines matched by the last query, to narrow down when the query grows
+        self._last_query = ""
+        self._last_lines: list[int] | None = None
+
+    @classmethod
+    def instance(cls) -> FileIndex:
+        """Return the singleton instance of the class."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    @property
+    def roots(self) -> list[str]:
+        return list(self._roots)
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, roots: Iterable[str]):
+        """Start indexing the roots in a background thread."""
+        roots = [Path(r).expanduser().absolute().as_posix() for r in roots]
+        if not roots or self.is_running():
+            return None
+        self._thread = threading.Thread(
+            target=self.update, args=(roots,), name="clix-file-index", daemon=True
+        )
+        self._thread.start()
+        return None
+
+    def update(self, roots: Iterable[str]):
+        """Update the index for the roots (blocking)."""
+        self._roots = [Path(r).as_posix() for r in roots]
+        if not self._dirs:
+            self.load()
+            with self._lock:
+                self._build_search_table()
+        old_dirs = self._dirs
+        new_dirs: dict[str, _DirEntry] = {}
+        nfiles = 0
+        with ThreadPoolExecutor(self._max_workers, thread_name_prefix="clix-walk") as ex:
+            pending = [r for r in self._roots if os.path.isdir(r)]
+            while pending and nfiles < self._max_files:
+                results = ex.map(lambda d: _scan_dir(d, old_dirs.get(d)), pending)
+                pending = []
+                for directory, entry in results:
+                    if entry is None:
+                        continue
+                    new_dirs[directory] = entry
+                    nfiles += len(entry.files)
+                    pending.extend(f"{directory}/{sub}" for sub in entry.subdirs)
+        with self._lock:
+            self._dirs = new_dirs
+            self._build_search_table()
+        self.save()
+        LOGGER.info("File index updated: %d directories, %d files", len(new_dirs), nfiles)
+        return None
+
+    def search(self, query: str, n: int = 32) -> list[FuzzyMatch]:
+        """Return the fuzzy matched file paths in descending order of the score.
+
+        If the query extends the last one, only the lines matched last time are
+        searched, since a line matching the query also matches its prefix.
+        """
+        if query == "":
+            return []
+        with self._lock:
+            text = self._text
+            line_starts = self._line_starts
+            line_paths = self._line_paths
+            last_query = self._last_query
+            last_lines = self._last_lines
+        if last_lines is not None and query.startswith(last_query):
+            lines = _iter_lines(text, line_starts, last_lines)
+        else:
+            lines = (
+                (bisect_right(line_starts, m.start()) - 1, m.group(0))
+                for m in subsequence_regex(query).finditer(text)
+            )
+        matched_lines: list[int] = []
+        matches: list[tuple[FuzzyMatch, int]] = []
+        for i, rel_path in lines:
+            if (match := fuzzy_match(query, rel_path)) is None:
+                continue
+            # file name matches are more important
+            name_start = rel_path.rfind("/") + 1
+            match.score += sum(pos >= name_start for pos in match.positions)
+            matched_lines.append(i)
+            matches.append((match, i))
+        with self._lock:
+            if self._text is text:
+                self._last_query = query
+                self._last_lines = matched_lines
+        top = heapq.nlargest(n, matches, key=lambda x: x[0].score)
+        for match, i in top:
+            match.text = line_paths[i]
+        return [match for match, _ in top]
+
+    def load(self):
+        """Load the index file."""
+        if not self._path.exists():
+            return None
+        try:
+            with self._path.open("r") as f:
+                js = json.load(f)
+            self._dirs = {
+                d: _DirEntry(mtime_ns, files, subdirs)
+                for d, (mtime_ns, files, subdirs) in js["dirs"].items()
+            }
+        except Exception:
+            LOGGER.warning("Failed to load the file index %s", self._path)
+            self._dirs = {}
+        return None
+
+    def save(self):
+        """Save the index file."""
+        if not CLIX_DATA_DIR.exists():
+            CLIX_DATA_DIR.mkdir(parents=True)
+        js = {
+            "roots": self._roots,
+            "dirs": {
+                d: [e.mtime_ns, e.files, e.subdirs] for d, e in self._dirs.items()
+            },
+        }
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            json.dump(js, f, separators=(",", ":"))
+        os.replace(tmp_path, self._path)
+        return None
+
+    def _build_search_table(self):
+        lines: list[str] = []
+        line_starts: list[int] = []
+        line_paths: list[str] = []
+        pos = 0
+        for root in self._roots:
+            prefix_len = len(root) + 1
+            for directory, entry in self._dirs.items():
+                if directory != root and not directory.startswith(root + "/"):
+                    continue
+                rel_dir = directory[prefix_len:]
+                for name in entry.files:
+                    rel_path = f"{rel_dir}/{name}" if rel_dir else name
+                    lines.append(rel_path)
+                    line_starts.append(pos)
+                    line_paths.append(f"{directory}/{name}")
+                    pos += len(rel_path) + 1
+        self._text = "\n".join(lines)
+        self._line_starts = line_starts
+        self._line_paths = line_paths
+        self._last_lines = None
+
+def _iter_lines(
+    text: str, line_starts: list[int], indices: list[int]
+) -> Iterator[tuple[int, str]]:
+    """Iterate over the (index, line) of the lines of the search table."""
+    num_lines = len(line_starts)
+    for i in indices:
+        end = line_starts[i + 1] - 1 if i + 1 < num_lines else len(text)
+        yield i, text[line_starts[i]:end]
+
+def _scan_dir(directory: str, old: _DirEntry | None) -> tuple[str, _DirEntry | None]:
+    """Scan a directory if it is modified after the last indexing."""
+    try:
+        mtime_ns = os.stat(directory).st_mtime_ns
+        if old is not None and old.mtime_ns == mtime_ns:
+            return directory, old
+        files: list[str] = []
+        subdirs: list[str] = []
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith(".") or "\n" in entry.name:
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                else:
+                    files.append(entry.name)
+    except OSError:
+        return directory, None
+    return directory, _DirEntry(mtime_ns, files, subdirs)
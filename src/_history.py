@@ -1,101 +1,380 @@
 from __future__ import annotations
 
-from typing import MutableSequence, Sequence
+from collections import deque
+from itertools import chain
+from pathlib import Path
+from typing import Any, Iterable, Iterator, MutableSequence, Sequence
+import atexit
 import json
-from .user_data import CLIX_DATA_DIR, CLIX_HISTORY_FILE
+import logging
+import threading
+import time
+from ._history_store import HistoryStore, SQLiteHistoryStore, code_key
+from ._preference import load_preference
+from ._timing import CommandTimingLog
+from .algorithms.prefix_index import PrefixIndex, frecency_weight, log_add
+from .algorithms.next_command import NextCommandModel
+from .algorithms.keyword_values import KeywordValueIndex
+from .user_data import CLIX_HISTORY_FILE, CLIX_HISTORY_DIR, CLIX_HISTORY_DB_FILE
 
+LOGGER = logging.getLogger(__name__)
 
 class CommandHistory(MutableSequence[str]):
-    def __init__(self, codes: Sequence[str] = (), max_size: int = 120):
-        self._codes = list(codes)
+    """Command history backed by a segmented on-disk store.
+
+    Only the record indices are kept in memory and codes are decoded lazily, so the
+    history can be very long. Loading runs in a background thread. Until it finishes
+    the history looks empty, and modifications wait for it. `max_size` is the number
+    of records retained on the disk.
+
+    The records are held in an insertion-ordered dict keyed by the code hash, so that
+    deduplication and moving a code to the end are O(1). Other modifications, such
+    as inserting a code at the start, rewrite the store so that the order persists.
+    """
+
+    def __init__(
+        self,
+        store: HistoryStore | SQLiteHistoryStore | None = None,
+        max_size: int = 100_000,
+        legacy_files: Sequence[Path] = (),
+        legacy_store: HistoryStore | None = None,
+    ):
+        if store is None:
+            store = HistoryStore(CLIX_HISTORY_DIR, max_records=max_size)
+        self._store = store
         self._max_size = max_size
-    
+        self._legacy_files = list(legacy_files)
+        self._legacy_store = legacy_store
+        self._entries: dict[int, int] = {}  # code key -> record index, in history order
+        self._order_cache: list[int] | None = None  # for random access
+        self._version = 0
+        self._first_index = 0
+        self._end_index = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._load_thread: threading.Thread | None = None
+        self._loaded = threading.Event()
+        atexit.register(store.close)
+
+    def load_async(self):
+        """Start loading the history in a background thread."""
+        with self._lock:
+            if self._load_thread is None:
+                self._load_thread = threading.Thread(
+                    target=self._load, name="clix-history-load", daemon=True
+                )
+                self._load_thread.start()
+        return None
+
+    def wait_loaded(self):
+        """Block until the history is loaded."""
+        self.load_async()
+        self._loaded.wait()
+        return None
+
+    def is_loaded(self) -> bool:
+        return self._loaded.is_set()
+
+    @property
+    def version(self) -> int:
+        """Number incremented every time the history is modified."""
+        return self._version
+
     def insert(self, index: int, code: str):
-        self._codes.insert(index, code)
-        if len(self._codes) > self._max_size:
-            del self._codes[0]
-        
+        self.wait_loaded()
+        if index >= len(self._entries):
+            return self.record(code)
+        key = code_key(code)
+        records = [self._store.get(rec) for k, rec in self._entries.items() if k != key]
+        records.insert(index, self._new_record(code))
+        self._rewrite(records)
+
     def __getitem__(self, index: int) -> str:
-        return self._codes[index]
-    
+        if isinstance(index, slice):
+            return [self._store.get(rec)["code"] for rec in self._order()[index]]
+        return self._store.get(self._order()[index])["code"]
+
     def __setitem__(self, index: int, code: str):
-        self._codes[index] = code
-    
+        self.wait_loaded()
+        old = self._order()[index]
+        key = code_key(code)
+        new_record = self._new_record(code)
+        records: list[dict[str, Any]] = []
+        for k, rec in self._entries.items():
+            if rec == old:
+                records.append(new_record)
+            elif k != key:
+                records.append(self._store.get(rec))
+        self._rewrite(records)
+
     def __delitem__(self, index: int):
-        del self._codes[index]
-    
+        self.wait_loaded()
+        old = self._order()[index]
+        self._rewrite([self._store.get(rec) for rec in self._order() if rec != old])
+
     def __len__(self) -> int:
-        return len(self._codes)
-    
+        return len(self._entries)
+
     def __iter__(self):
-        return iter(self._codes)
-    
+        for rec in list(self._entries.values()):
+            yield self._store.get(rec)["code"]
+
     def __reversed__(self):
-        return reversed(self._codes)
-    
+        for rec in reversed(list(self._entries.values())):
+            yield self._store.get(rec)["code"]
+
+    def __contains__(self, code: object) -> bool:
+        return isinstance(code, str) and code_key(code) in self._entries
+
+    def iter_records(self) -> Iterator[dict[str, Any]]:
+        """Iterate over the records of the codes in the history order."""
+        for rec in list(self._entries.values()):
+            yield self._store.get(rec)
+
+    def iter_records_reversed(self) -> Iterator[dict[str, Any]]:
+        """Iterate over the records from the newest one without copying the history."""
+        for rec in reversed(self._entries.values()):
+            yield self._store.get(rec)
+
     def save(self):
-        if not CLIX_DATA_DIR.exists():
-            CLIX_DATA_DIR.mkdir(parents=True)
-        with CLIX_HISTORY_FILE.open("w") as f:
-            json.dump(self._codes, f)
+        """Rewrite the store in the history order."""
+        self.wait_loaded()
+        self._rewrite([self._store.get(rec) for rec in self._order()])
         return None
-    
+
+    def merge(self, codes: Iterable[str], prepend: bool = False) -> int:
+        """Merge codes into the history and rewrite the store in one bulk operation.
+
+        Codes already in the history are moved (keeping their records) to the end,
+        or to the start if `prepend` is true. The number of new codes is returned.
+        """
+        self.wait_loaded()
+        merged: dict[int, dict[str, Any]] = {}
+        num_new = 0
+        for code in codes:
+            key = code_key(code)
+            if key in merged:
+                continue
+            if (rec := self._entries.get(key)) is not None:
+                merged[key] = self._store.get(rec)
+            else:
+                merged[key] = {"code": code}
+                num_new += 1
+        rest = (
+            self._store.get(rec) for key, rec in self._entries.items() if key not in merged
+        )
+        if prepend:
+            records = chain(reversed(merged.values()), rest)
+        else:
+            records = chain(rest, merged.values())
+        self._store.rewrite(deque(records, maxlen=self._max_size))
+        self._rebuild()
+        return num_new
+
+    def refresh(self) -> list[dict[str, Any]] | None:
+        """Pick up the records appended by other processes.
+
+        The records are read in the background, so the records read since the last
+        call are picked up and the next read is started. The new records are
+        returned. If the history was rewritten by another process, the whole history
+        is reloaded and None is returned.
+        """
+        if not self.is_loaded():
+            return []
+        changes = self._store.take_changes()
+        self._store.request_changes(self._end_index, self._generation)
+        if changes is None:
+            return []
+        generation, keys, full = changes
+        if full:
+            self._rebuild(keys)
+            return None
+        new = [(rec, key) for rec, key in keys if rec >= self._end_index]
+        if generation != self._generation or not new:
+            return []
+        for rec, key in new:
+            self._entries.pop(key, None)
+            self._entries[key] = rec
+        self._end_index = new[-1][0] + 1
+        self._modified()
+        return [self._store.get(rec) for rec, _ in new]
+
     @classmethod
-    def load(cls, max_size: int = 120) -> CommandHistory:
-        if not CLIX_HISTORY_FILE.exists():
-            return CommandHistory(max_size=max_size)
-        try:
-            with CLIX_HISTORY_FILE.open() as f:
-                codes = json.load(f)
-            self = CommandHistory(codes, max_size)
-        except Exception:
-            self = CommandHistory(max_size=max_size)
+    def load(
+        cls,
+        store: HistoryStore | SQLiteHistoryStore | None = None,
+        max_size: int = 100_000,
+        legacy_files: Sequence[Path] = (),
+        legacy_store: HistoryStore | None = None,
+    ) -> CommandHistory:
+        """Load the history (blocking)."""
+        self = cls(store, max_size, legacy_files, legacy_store)
+        self.wait_loaded()
         return self
 
+    def record(self, code: str, wall: float | None = None):
+        """Add a code to the end and save it to the store with its execution time."""
+        self.wait_loaded()
+        record = self._new_record(code)
+        if wall is not None:
+            record["wall"] = round(wall, 6)
+        key = code_key(code)
+        rec = self._store.append(record)
+        self._entries.pop(key, None)
+        self._entries[key] = rec
+        self._modified()
+        return None
+
     def append_unique(self, code: str):
-        if code in self._codes:
-            self._codes.remove(code)
-        self.append(code)
-    
+        self.append(code)  # existing code is moved to the end
+
     def prepend_unique(self, code: str):
-        if code in self._codes:
-            self._codes.remove(code)
-        self.insert(0, code)
-    
-    def iter_bidirectional(
-        self,
-        index: int | None = None,
-        last: str | None = None
-    ) -> BidirectionalIterator:
-        if last is None:
-            codes = self._codes
-        else:
-            codes = self._codes + [last]
-        return BidirectionalIterator(codes, index)
-    
+        self.insert(0, code)  # existing code is moved to the start
 
-class BidirectionalIterator:
-    def __init__(self, data: list[str], index: int | None = None):
-        if index is None:
-            index = len(data) - 1
-        self._data = data
-        self._index: int = index
-    
-    def next(self) -> str | None:
-        cur_index = self._index
-        self._index = min(self._index + 1, len(self._data) - 1)
-        if cur_index < len(self._data) - 1:
-            return self._data[cur_index + 1]
+    def cursor(self, last: str | None = None) -> HistoryCursor:
+        """Return a cursor to walk the history from the newest code."""
+        return HistoryCursor(self, last)
+
+    def _order(self) -> list[int]:
+        if self._order_cache is None:
+            self._order_cache = list(self._entries.values())
+        return self._order_cache
+
+    def _rewrite(self, records: list[dict[str, Any]]):
+        self._store.rewrite(records[-self._max_size:])
+        self._rebuild()
+
+    def _modified(self):
+        self._version += 1
+        self._order_cache = None
+        self._apply_retention()
+
+    def _new_record(self, code: str) -> dict[str, Any]:
+        # the record holds the frecency score of all the uses of the code
+        now = time.time()
+        score = frecency_weight(now)
+        if (prev := self._entries.get(code_key(code))) is not None:
+            score = log_add(record_score(self._store.get(prev)), score)
+        return {"code": code, "time": now, "score": score}
+
+    def _load(self):
+        try:
+            self._store.open()
+            if self._store.is_empty():
+                self._migrate()
+            self._rebuild()
+        except Exception:
+            LOGGER.exception("Failed to load history from %s", self._store.root)
+        finally:
+            self._loaded.set()
+
+    def _migrate(self):
+        if self._legacy_store is not None and self._legacy_store.root.exists():
+            legacy = CommandHistory.load(self._legacy_store, self._max_size)
+            self._store.rewrite(legacy.iter_records())
+            self._legacy_store.close()
+        elif codes := _read_legacy_history(*self._legacy_files):
+            self._store.rewrite({"code": code} for code in codes[-self._max_size:])
+
+    def _rebuild(self, keys: Iterable[tuple[int, int]] | None = None):
+        generation = self._store.generation()
+        if keys is None:
+            keys = self._store.iter_keys()
+        entries: dict[int, int] = {}
+        end = 0
+        for rec, key in keys:
+            entries.pop(key, None)
+            entries[key] = rec
+            end = rec + 1
+        for rec, key in self._store.pending_keys():  # not written yet
+            entries.pop(key, None)
+            entries[key] = rec
+        self._entries = entries
+        self._first_index = self._store.first_index()
+        self._end_index = max(end, self._store.end_index())
+        self._generation = generation
+        self._version += 1
+        self._order_cache = None
+
+    def _apply_retention(self):
+        if self._store.generation() != self._generation:
+            self._rebuild()  # compacted
+            return
+        first = self._store.first_index()
+        if first == self._first_index:
+            return
+        self._entries = {k: rec for k, rec in self._entries.items() if rec >= first}
+        self._first_index = first
+
+def record_score(record: dict[str, Any]) -> float:
+    """Return the log-frecency score of a history record."""
+    if (score := record.get("score")) is not None:
+        return score
+    return frecency_weight(record.get("time", 0.0))
+
+def _read_legacy_history(path: Path | None = None) -> list[str]:
+    """Read the codes from the history.json file of the older versions."""
+    if path is None or not path.exists():
+        return []
+    try:
+        with path.open("r") as f:
+            return list(dict.fromkeys(json.load(f)))  # deduplicated
+    except Exception:
+        LOGGER.warning("Failed to load history file %s", path)
+        return []
+
+
+class HistoryCursor:
+    """Cursor to walk the history backward from the newest code.
+
+    The history is iterated lazily from the end and only the codes already visited
+    are kept. `last` is shown as a virtual entry after the newest code, such as the
+    command that just failed. The cursor restarts if the history is modified.
+    """
+
+    def __init__(self, history: CommandHistory, last: str | None = None):
+        self._history = history
+        self._last = last
+        self._version = -1
+        self._iter: Iterator[dict[str, Any]] = iter(())
+        self._visited: list[str] = []  # newest first
+        self._exhausted = False
+        self._offset = 0  # offset from the newest entry
+
+    def _get(self, offset: int) -> str | None:
+        if self._version != self._history.version:
+            self._version = self._history.version
+            self._iter = self._history.iter_records_reversed()
+            self._visited = [] if self._last is None else [self._last]
+            self._exhausted = False
+        while len(self._visited) <= offset and not self._exhausted:
+            try:
+                self._visited.append(next(self._iter)["code"])
+            except StopIteration:
+                self._exhausted = True
+        if offset < len(self._visited):
+            return self._visited[offset]
         return None
-    
+
+    def next(self) -> str | None:
+        """Move to the newer entry and return it, or None if at the newest."""
+        if self._offset == 0:
+            return None
+        self._offset -= 1
+        return self._get(self._offset)
+
     def prev(self) -> str:
-        cur_index = self._index
-        self._index = max(self._index - 1, 0)
-        return self._data[cur_index]
+        """Return the current entry and move to the older one."""
+        text = self._get(self._offset)
+        if text is None:
+            raise IndexError("History is empty.")
+        if self._get(self._offset + 1) is not None:
+            self._offset += 1
+        return text
 
     @property
-    def index(self) -> int:
-        return self._index
+    def offset(self) -> int:
+        return self._offset
 
 class HistoryManager:
     """A class to manage history searching."""
@@ -103,11 +382,31 @@ class HistoryManager:
     _instance: HistoryManager | None = None
 
     def __init__(self):
-        self._history = CommandHistory.load()
-        self._history_iter = self._history.iter_bidirectional()
+        legacy_files = (CLIX_HISTORY_FILE,)
+        if load_preference(force=False).history_backend == "sqlite":
+            self._history = CommandHistory(
+                SQLiteHistoryStore(CLIX_HISTORY_DB_FILE),
+                legacy_files=legacy_files,
+                legacy_store=HistoryStore(CLIX_HISTORY_DIR),
+            )
+        else:
+            self._history = CommandHistory(legacy_files=legacy_files)
+        self._history_iter = self._history.cursor()
         self._current_input: str = ""
         self._is_searching = False
         self._current_suggestion: str | None = None
+        self._prefix_index: PrefixIndex | None = None
+        self._next_command_model: NextCommandModel | None = None
+        self._keyword_value_index: KeywordValueIndex | None = None
+        # uses of codes added while building the index and the next command model
+        self._pending_codes: list[tuple[str, float]] | None = []
+        self._pending_model_codes: list[tuple[str, float]] | None = []
+        # only the latest build of the index takes the pending codes
+        self._index_generation = 0
+        # codes in the history order and the history version they are valid for
+        self._codes: list[str] | None = None
+        self._codes_version = -1
+        self._index_lock = threading.Lock()
         self.__class__._instance = self
     
     @classmethod
@@ -117,13 +416,79 @@ class HistoryManager:
             cls._instance = cls()
         return cls._instance
     
-    def add_code(self, code: str):
+    def load_async(self):
+        """Start loading the history and building the index in the background."""
+        self.rebuild_index()
+        # the lines logged until now are replayed, and the later ones are pending
+        end = CommandTimingLog.instance().end_offset()
+        threading.Thread(
+            target=self._build_next_command_model, args=(end,),
+            name="clix-next-command", daemon=True,
+        ).start()
+
+    def rebuild_index(self):
+        """Rebuild the indexes in the background."""
+        with self._index_lock:
+            self._pending_codes = []
+            self._index_generation += 1
+            generation = self._index_generation
+        threading.Thread(
+            target=self._build_index, args=(generation,),
+            name="clix-history-index", daemon=True,
+        ).start()
+        return None
+
+    def add_code(self, code: str, wall: float | None = None):
         """Add new code to the history."""
-        self._history.append_unique(code)
-        self._history.save()
+        version = self._history.version
+        self._history.record(code, wall)
+        self._move_codes_to_end([code], version)
+        weight = frecency_weight(time.time())
+        self._add_to_index(code, weight)
+        with self._index_lock:
+            if self._pending_model_codes is not None:
+                self._pending_model_codes.append((code, weight))
+            else:
+                self._next_command_model.add(code, weight)
+
+    def _move_codes_to_end(self, new_codes: list[str], version: int):
+        # update the cached code list if the history was modified only by the codes
+        with self._index_lock:
+            codes = self._codes
+            if (
+                codes is None
+                or self._codes_version != version
+                or self._history.version != version + 1
+            ):
+                self._codes = None
+                return
+            for code in new_codes:
+                for i in range(len(codes) - 1, -1, -1):
+                    if codes[i] == code:
+                        del codes[i]
+                        break
+                codes.append(code)
+            self._codes_version = self._history.version
+
+    def _add_to_index(self, code: str, weight: float):
+        with self._index_lock:
+            if self._pending_codes is not None:
+                self._pending_codes.append((code, weight))
+            elif self._prefix_index is not None:
+                self._prefix_index.add(code, weight)
+                self._keyword_value_index.add(code, weight)
 
     def init_iterator(self, last: str | None = None):
-        self._history_iter = self._history.iter_bidirectional(last=last)
+        # commands run in other ChimeraX instances are shown from here
+        version = self._history.version
+        new_records = self._history.refresh()
+        if new_records is None:
+            self.rebuild_index()
+        elif new_records:
+            self._move_codes_to_end([record["code"] for record in new_records], version)
+            for record in new_records:
+                self._add_to_index(record["code"], frecency_weight(record.get("time", 0.0)))
+        self._history_iter = self._history.cursor(last=last)
     
     def look_for_prev(self, current_input: str) -> str:
         text = self._history_iter.prev()
@@ -142,19 +507,91 @@ class HistoryManager:
         return text
 
     def suggest(self, current_input: str) -> str | None:
-        if current_input.strip() == "":
+        if current_input == "":
+            if lines := self.predict_next():
+                self._current_suggestion = lines[0]
+                return self._current_suggestion
             return None
-        for code in reversed(self._history):
-            for line in code.splitlines():
-                if line.startswith(current_input):
-                    self._current_suggestion = line[len(current_input):]
-                    return self._current_suggestion
+        if current_input.strip() == "" or self._prefix_index is None:
+            return None
+        if (line := self._prefix_index.lookup(current_input)) is not None:
+            self._current_suggestion = line[len(current_input):]
+            return self._current_suggestion
         return None
 
+    def predict_next(self) -> list[str]:
+        """Return the lines that are likely to be run next."""
+        if self._next_command_model is None:
+            return []
+        return self._next_command_model.predict()
+
+    def keyword_values(self, command: str, keyword: str) -> list[str]:
+        """Return the values of the keyword used in the history, the best first."""
+        if self._keyword_value_index is None:
+            return []
+        return self._keyword_value_index.values(command, keyword)
+
     def pop_suggestion(self) -> str | None:
         out = self._current_suggestion
         self._current_suggestion = None
         return out
 
     def aslist(self) -> list[str]:
-        return list(self._history)
+        """Return the codes in the history order.
+
+        The list is built with the index and kept up to date while codes are added,
+        so that decoding all the records is not needed every time.
+        """
+        with self._index_lock:
+            if self._codes is not None and self._codes_version == self._history.version:
+                return list(self._codes)
+        version = self._history.version
+        codes = list(self._history)
+        with self._index_lock:
+            if self._history.version == version:
+                self._codes = codes
+                self._codes_version = version
+        return list(codes)
+
+    def _build_index(self, generation: int):
+        self._history.wait_loaded()
+        index = PrefixIndex()
+        kw_index = KeywordValueIndex()
+        version = self._history.version
+        codes: list[str] = []
+        for record in self._history.iter_records():
+            codes.append(record["code"])
+            score = record_score(record)
+            index.add(record["code"], score)
+            kw_index.add(record["code"], score)
+        with self._index_lock:
+            if generation != self._index_generation:
+                return  # a later build publishes its index
+            for code, weight in self._pending_codes:
+                index.add(code, weight)
+                kw_index.add(code, weight)
+            self._prefix_index = index
+            self._keyword_value_index = kw_index
+            self._pending_codes = None
+            if self._history.version == version:
+                self._codes = codes
+                self._codes_version = version
+
+    def _build_next_command_model(self, end: int):
+        model = next_command_model_from_log(CommandTimingLog.instance(), end)
+        with self._index_lock:
+            for code, weight in self._pending_model_codes:
+                model.add(code, weight)
+            self._next_command_model = model
+            self._pending_model_codes = None
+
+def next_command_model_from_log(log: CommandTimingLog, end: int | None = None) -> NextCommandModel:
+    """Train the next command model on the lines in the order they were run.
+
+    The history cannot be used, because it only keeps the last use of each code.
+    """
+    model = NextCommandModel()
+    for entry in log.iter_entries(end):
+        if entry.ok:
+            model.add(entry.line, frecency_weight(entry.timestamp))
+    return model
@@ -0,0 +1,663 @@
+from __future__ import annotations
+
+from bisect import bisect_right
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+import queue
+import shutil
+import sqlite3
+import struct
+import threading
+from typing import Any, Iterable, Iterator
+
+LOGGER = logging.getLogger(__name__)
+
+_INDEX_ENTRY = struct.Struct("<QQ")  # (offset, key)
+
+def code_key(code: str) -> int:
+    """64-bit hash of a code, used to deduplicate records without decoding them."""
+    digest = hashlib.blake2b(code.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+class _Segment:
+    """A segment of the history store.
+
+    A segment consists of a data file (one JSON record per line) and an index file
+    (packed pairs of the byte offset and the code key of each record). The file name
+    is the global index of the first record in the segment.
+    """
+
+    def __init__(self, root: Path, start: int):
+        self.start = start
+        self.data_path = root / f"{start:012d}.jsonl"
+        self.index_path = root / f"{start:012d}.idx"
+        self._data: mmap.mmap | bytes = b""
+        self._index: mmap.mmap | bytearray = bytearray()
+        self._data_writer = None
+        self._index_writer = None
+
+    def __len__(self) -> int:
+        return len(self._index) // _INDEX_ENTRY.size
+
+    def open_sealed(self):
+        """Open the segment as a read-only, memory-mapped segment."""
+        self.close()
+        self._data = _mmap_file(self.data_path)
+        self._index = _mmap_file(self.index_path)
+
+    def open_active(self):
+        """Open the segment as the writable segment."""
+        self.close()
+        self.data_path.touch()
+        self.index_path.touch()
+        data_size = self.data_path.stat().st_size
+        index = bytearray(self.index_path.read_bytes())
+        del index[len(index) - len(index) % _INDEX_ENTRY.size:]
+        # drop entries that were not fully written in a crash
+        while index and _INDEX_ENTRY.unpack_from(index, len(index) - _INDEX_ENTRY.size)[0] >= data_size:
+            del index[-_INDEX_ENTRY.size:]
+        self._index = index
+        with self.index_path.open("wb") as f:
+            f.write(index)
+        self._data_writer = self.data_path.open("ab")
+        self._index_writer = self.index_path.open("ab")
+
+    def key(self, i: int) -> int:
+        return _INDEX_ENTRY.unpack_from(self._index, i * _INDEX_ENTRY.size)[1]
+
+    def iter_keys(self) -> Iterator[int]:
+        for _, key in _INDEX_ENTRY.iter_unpack(self._index):
+            yield key
+
+    def read(self, i: int) -> bytes:
+        offset = _INDEX_ENTRY.unpack_from(self._index, i * _INDEX_ENTRY.size)[0]
+        if self._data_writer is None:
+            data = self._data
+            end = data.find(b"\n", offset)
+            return data[offset:end if end >= 0 else len(data)]
+        with self.data_path.open("rb") as f:
+            f.seek(offset)
+            return f.readline().rstrip(b"\n")
+
+    def append(self, line: bytes, key: int):
+        writer = self._data_writer
+        offset = writer.seek(0, os.SEEK_END)
+        writer.write(line + b"\n")
+        writer.flush()
+        entry = _INDEX_ENTRY.pack(offset, key)
+        self._index_writer.write(entry)
+        self._index_writer.flush()
+        self._index.extend(entry)
+
+    def nbytes(self) -> int:
+        if self._data_writer is not None:
+            return self._data_writer.tell()
+        return len(self._data)
+
+    def sync(self):
+        for f in (self._data_writer, self._index_writer):
+            if f is not None:
+                os.fsync(f.fileno())
+
+    def close(self):
+        for f in (self._data_writer, self._index_writer):
+            if f is not None:
+                f.close()
+        self._data_writer = self._index_writer = None
+        for m in (self._data, self._index):
+            if isinstance(m, mmap.mmap):
+                m.close()
+        self._data = b""
+        self._index = bytearray()
+
+    def delete(self):
+        self.close()
+        self.data_path.unlink(missing_ok=True)
+        self.index_path.unlink(missing_ok=True)
+
+class HistoryStore:
+    """Segmented, append-only on-disk store of history records.
+
+    Records are addressed by global indices that never change, even after old
+    segments are deleted by the retention policy, until the store is rewritten
+    (`generation` is incremented). Records are decoded lazily from the memory-mapped
+    segments, and a small number of decoded records are cached.
+
+    `max_records` is the number of codes retained. Records superseded by a newer
+    record of the same code are dropped when the store holds twice as many records.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        max_records: int = 100_000,
+        segment_bytes: int = 1024 * 1024,
+        fsync_every: int = 8,
+        cache_size: int = 512,
+    ):
+        self._root = root
+        self._max_records = max_records
+        self._segment_bytes = segment_bytes
+        self._fsync_every = fsync_every
+        self._cache_size = cache_size
+        self._segments: list[_Segment] = []
+        self._starts: list[int] = []
+        self._cache: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self._unsynced = 0
+        self._generation = 0
+        self._live: dict[int, int] = {}  # code key -> index of its latest record
+        self._lock = threading.RLock()
+
+    @property
+    def root(self) -> Path:
+        return self._root
+
+    def open(self):
+        """Open all the segments."""
+        with self._lock:
+            self.close()
+            self._root.mkdir(parents=True, exist_ok=True)
+            starts = sorted(int(p.stem) for p in self._root.glob("*.idx") if p.stem.isdigit())
+            self._segments = [_Segment(self._root, start) for start in starts]
+            if not self._segments:
+                self._segments.append(_Segment(self._root, 0))
+            for seg in self._segments[:-1]:
+                seg.open_sealed()
+            self._segments[-1].open_active()
+            self._starts = [seg.start for seg in self._segments]
+            self._live.clear()
+            for index, key in self.iter_keys():
+                self._live.pop(key, None)
+                self._live[key] = index
+        return None
+
+    def is_empty(self) -> bool:
+        return self.first_index() == self.end_index()
+
+    def first_index(self) -> int:
+        """Global index of the oldest record."""
+        return self._segments[0].start if self._segments else 0
+
+    def end_index(self) -> int:
+        """Global index of the next record."""
+        if not self._segments:
+            return 0
+        last = self._segments[-1]
+        return last.start + len(last)
+
+    def generation(self) -> int:
+        """Number incremented every time the records are rewritten."""
+        return self._generation
+
+    def iter_keys(self, start: int = 0) -> Iterator[tuple[int, int]]:
+        """Iterate over (index, key) of the records without decoding them."""
+        for seg in list(self._segments):
+            if seg.start + len(seg) <= start:
+                continue
+            for i, key in enumerate(seg.iter_keys()):
+                if seg.start + i >= start:
+                    yield seg.start + i, key
+
+    def pending_keys(self) -> list[tuple[int, int]]:
+        """(index, key) of the records appended but not written yet.
+
+        Records are written by `append` itself, so nothing is returned.
+        """
+        return []
+
+    def request_changes(self, start: int, generation: int):
+        """The store is not shared by processes, so there are no changes to read."""
+        return None
+
+    def take_changes(self) -> tuple[int, list[tuple[int, int]], bool] | None:
+        return None
+
+    def key(self, index: int) -> int:
+        seg = self._find_segment(index)
+        return seg.key(index - seg.start)
+
+    def get(self, index: int) -> dict[str, Any]:
+        """Decode the record at the global index."""
+        with self._lock:
+            if (rec := self._cache.get(index)) is not None:
+                self._cache.move_to_end(index)
+                return rec
+            seg = self._find_segment(index)
+            rec = json.loads(seg.read(index - seg.start))
+            self._cache[index] = rec
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return rec
+
+    def append(self, record: dict[str, Any]) -> int:
+        """Append a record and return its global index."""
+        key = code_key(record["code"])
+        line = json.dumps(record).encode("utf-8")
+        with self._lock:
+            active = self._segments[-1]
+            index = active.start + len(active)
+            active.append(line, key)
+            self._live.pop(key, None)
+            self._live[key] = index
+            self._unsynced += 1
+            if self._unsynced >= self._fsync_every:
+                self.sync()
+            if active.nbytes() > self._segment_bytes:
+                self._roll_segment()
+                index = self._live[key]  # records may be compacted
+        return index
+
+    def rewrite(self, records: Iterable[dict[str, Any]]):
+        """Replace all the records in one bulk operation."""
+        self._rewrite_lines(
+            (json.dumps(record).encode("utf-8"), code_key(record["code"]))
+            for record in records
+        )
+        return None
+
+    def _rewrite_lines(self, lines: Iterable[tuple[bytes, int]]):
+        with self._lock:
+            tmp_root = self._root.with_name(self._root.name + ".tmp")
+            if tmp_root.exists():
+                shutil.rmtree(tmp_root)
+            tmp_root.mkdir(parents=True)
+            seg = _Segment(tmp_root, 0)
+            seg.open_active()
+            count = 0
+            for line, key in lines:
+                seg.append(line, key)
+                count += 1
+                if seg.nbytes() > self._segment_bytes:
+                    seg.sync()
+                    seg.close()
+                    seg = _Segment(tmp_root, count)
+                    seg.open_active()
+            seg.sync()
+            seg.close()
+            self.close()
+            old_root = self._root.with_name(self._root.name + ".old")
+            if old_root.exists():
+                shutil.rmtree(old_root)
+            if self._root.exists():
+                os.replace(self._root, old_root)
+            os.replace(tmp_root, self._root)
+            shutil.rmtree(old_root, ignore_errors=True)
+            self.open()
+            self._generation += 1
+        return None
+
+    def sync(self):
+        """Force writing the active segment to the disk."""
+        with self._lock:
+            if self._segments and self._unsynced > 0:
+                self._segments[-1].sync()
+                self._unsynced = 0
+        return None
+
+    def close(self):
+        with self._lock:
+            self.sync()
+            for seg in self._segments:
+                seg.close()
+            self._segments.clear()
+            self._starts.clear()
+            self._cache.clear()
+        return None
+
+    def _find_segment(self, index: int) -> _Segment:
+        if index < self.first_index() or index >= self.end_index():
+            raise IndexError(f"Record {index} does not exist.")
+        return self._segments[bisect_right(self._starts, index) - 1]
+
+    def _roll_segment(self):
+        active = self._segments[-1]
+        active.sync()
+        self._unsynced = 0
+        active.open_sealed()
+        new = _Segment(self._root, active.start + len(active))
+        new.open_active()
+        self._segments.append(new)
+        self._starts.append(new.start)
+        # retention: the oldest segments are deleted only if they have no live record
+        # and the superseded records are dropped by compaction
+        while len(self._segments) > 1 and not self._has_live_record(self._segments[0]):
+            oldest = self._segments.pop(0)
+            self._starts.pop(0)
+            oldest.delete()
+        if self.end_index() - self.first_index() > 2 * self._max_records:
+            self._compact()
+        for index in [i for i in self._cache if i < self.first_index()]:
+            del self._cache[index]
+
+    def _has_live_record(self, seg: _Segment) -> bool:
+        live = self._live
+        return any(live.get(key) == seg.start + i for i, key in enumerate(seg.iter_keys()))
+
+    def _compact(self):
+        """Rewrite the latest records of the newest `max_records` codes.
+
+        Since a superseded record never follows the latest record of the same code,
+        the order of the latest records is the history order.
+        """
+        indices = sorted(self._live.values())[-self._max_records:]
+
+        def _iter_lines():
+            for index in indices:
+                seg = self._find_segment(index)
+                yield bytes(seg.read(index - seg.start)), seg.key(index - seg.start)
+
+        self._rewrite_lines(_iter_lines())
+
+def _mmap_file(path: Path) -> mmap.mmap | bytes:
+    if not path.exists() or path.stat().st_size == 0:
+        return b""
+    with path.open("rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+_PROVISIONAL_BASE = 1 << 62
+_SIGN_BIT = 1 << 63
+
+class SQLiteHistoryStore:
+    """History store shared by processes on a SQLite database in WAL mode.
+
+    This class has the same interface as `HistoryStore`. Records are inserted by a
+    background writer thread, so `append` never waits for the database. The index
+    returned by `append` is a provisional one that is valid only in this process.
+
+    The writer thread also applies the retention policy and reads the records
+    appended by other processes (`request_changes`), so that the thread calling
+    `append` only runs queries to decode records and to rewrite the store. The
+    indices and the generation are the values last read by these operations.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_records: int = 100_000,
+        cache_size: int = 512,
+    ):
+        self._path = path
+        self._max_records = max_records
+        self._cache_size = cache_size
+        self._cache: OrderedDict[int, dict[str, Any]] = OrderedDict()
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()  # held while the records are written
+        self._local: dict[int, dict[str, Any]] = {}  # provisional index -> record
+        self._pending: dict[int, int] = {}  # provisional index -> key, not written yet
+        self._next_local = _PROVISIONAL_BASE
+        self._own_ids: set[int] = set()  # records inserted by this process
+        self._queue: queue.Queue[tuple | None] = queue.Queue()
+        self._writer: threading.Thread | None = None
+        self._first = 0
+        self._end = 0
+        self._num_rows = 0
+        self._generation = 0
+        self._changes: tuple[int, list[tuple[int, int]], bool] | None = None
+        self._polling = False
+
+    @property
+    def root(self) -> Path:
+        return self._path
+
+    def open(self):
+        with self._lock:
+            self.close()
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = _connect(self._path)
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS records "
+                    "(id INTEGER PRIMARY KEY AUTOINCREMENT, key INTEGER, data TEXT)"
+                )
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)"
+                )
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO meta VALUES ('generation', 0)"
+                )
+            self._read_state(self._conn)
+            self._writer = threading.Thread(
+                target=self._write_loop, name="clix-history-writer", daemon=True
+            )
+            self._writer.start()
+        return None
+
+    def is_empty(self) -> bool:
+        return self.first_index() == self.end_index() and not self._local
+
+    def first_index(self) -> int:
+        return self._first
+
+    def end_index(self) -> int:
+        return self._end
+
+    def generation(self) -> int:
+        """Number incremented every time the records are rewritten."""
+        return self._generation
+
+    def iter_keys(self, start: int = 0) -> Iterator[tuple[int, int]]:
+        rows = self._execute(
+            "SELECT id, key FROM records WHERE id >= ? ORDER BY id", (start,)
+        ).fetchall()
+        for index, key in rows:
+            yield index, key % (1 << 64)
+
+    def pending_keys(self) -> list[tuple[int, int]]:
+        """(provisional index, key) of the records not written by the writer yet."""
+        return list(self._pending.items())
+
+    def request_changes(self, start: int, generation: int):
+        """Read the records appended by other processes in the writer thread.
+
+        Records from `start` are read, or all the records if the store was rewritten
+        since `generation`. The result is returned by `take_changes`.
+        """
+        with self._lock:
+            if self._polling or self._writer is None:
+                return None
+            self._polling = True
+        self._queue.put(("poll", start, generation))
+        return None
+
+    def take_changes(self) -> tuple[int, list[tuple[int, int]], bool] | None:
+        """Return the result of the last `request_changes` if it is ready.
+
+        The result is (generation, [(index, key), ...], full). If `full` is true, the
+        store was rewritten and all the records are listed. Otherwise, only the
+        records of other processes are listed.
+        """
+        with self._lock:
+            changes, self._changes = self._changes, None
+            if changes is not None and changes[2]:
+                self._generation = changes[0]
+        return changes
+
+    def key(self, index: int) -> int:
+        if (rec := self._local.get(index)) is not None:
+            return code_key(rec["code"])
+        row = self._execute("SELECT key FROM records WHERE id = ?", (index,)).fetchone()
+        if row is None:
+            raise IndexError(f"Record {index} does not exist.")
+        return row[0] % (1 << 64)
+
+    def get(self, index: int) -> dict[str, Any]:
+        if (rec := self._local.get(index)) is not None:
+            return rec
+        with self._lock:
+            if (rec := self._cache.get(index)) is not None:
+                self._cache.move_to_end(index)
+                return rec
+            row = self._execute("SELECT data FROM records WHERE id = ?", (index,)).fetchone()
+            if row is None:
+                raise IndexError(f"Record {index} does not exist.")
+            rec = json.loads(row[0])
+            self._cache_record(index, rec)
+            return rec
+
+    def append(self, record: dict[str, Any]) -> int:
+        """Queue a record to be inserted and return its provisional index."""
+        with self._lock:
+            index = self._next_local
+            self._next_local += 1
+            self._local[index] = record
+            self._pending[index] = code_key(record["code"])
+        self._queue.put(("insert", index, record))
+        return index
+
+    def rewrite(self, records: Iterable[dict[str, Any]]):
+        """Replace all the records in one transaction.
+
+        The queued records are not inserted afterwards, because the records passed
+        here are the whole history.
+        """
+        rows = [(_to_signed(code_key(r["code"])), json.dumps(r)) for r in records]
+        with self._write_lock, self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM records")
+                self._conn.executemany("INSERT INTO records (key, data) VALUES (?, ?)", rows)
+                self._conn.execute(
+                    "UPDATE meta SET value = value + 1 WHERE name = 'generation'"
+                )
+                self._read_state(self._conn)
+            self._local.clear()
+            self._pending.clear()
+            self._own_ids.clear()
+            self._cache.clear()
+            self._changes = None
+        return None
+
+    def sync(self):
+        """Wait for the queued operations to finish.
+
+        This method blocks until the writer thread catches up, so it is not used by
+        the history itself.
+        """
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.join()
+        return None
+
+    def close(self):
+        if (writer := self._writer) is not None:
+            self._writer = None
+            self._queue.put(None)
+            writer.join()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._cache.clear()
+        return None
+
+    def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _cache_record(self, index: int, rec: dict[str, Any]):
+        with self._lock:
+            self._cache[index] = rec
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _read_state(self, conn: sqlite3.Connection) -> int:
+        first, last = conn.execute("SELECT MIN(id), MAX(id) FROM records").fetchone()
+        self._first = first if first is not None else 0
+        self._end = last + 1 if last is not None else 0
+        self._num_rows = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+        row = conn.execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()
+        if conn is self._conn:
+            self._generation = row[0]
+        return row[0]
+
+    def _write_loop(self):
+        conn = _connect(self._path)
+        try:
+            while True:
+                items = [self._queue.get()]
+                while not self._queue.empty():
+                    items.append(self._queue.get())
+                try:
+                    inserts = [item for item in items if item and item[0] == "insert"]
+                    if inserts:
+                        self._insert(conn, inserts)
+                    for item in items:
+                        if item and item[0] == "poll":
+                            self._poll(conn, item[1], item[2])
+                except sqlite3.Error:
+                    LOGGER.exception("Failed to write history to %s", self._path)
+                finally:
+                    with self._lock:
+                        self._polling = False
+                    for _ in items:
+                        self._queue.task_done()
+                if None in items:
+                    return
+        finally:
+            conn.close()
+
+    def _insert(self, conn: sqlite3.Connection, inserts: list[tuple]):
+        with self._write_lock:
+            written: list[int] = []
+            with conn:
+                for _, index, record in inserts:
+                    if index not in self._pending:
+                        continue  # dropped by rewrite
+                    cur = conn.execute(
+                        "INSERT INTO records (key, data) VALUES (?, ?)",
+                        (_to_signed(self._pending[index]), json.dumps(record)),
+                    )
+                    self._own_ids.add(cur.lastrowid)
+                    written.append(index)
+                self._read_state(conn)
+                compacted = self._num_rows > 2 * self._max_records
+                if compacted:
+                    self._compact(conn)
+                    self._read_state(conn)
+            for index in written:
+                self._pending.pop(index, None)
+        if compacted:
+            self._poll(conn, 0, self._generation)  # reload all the records
+
+    def _compact(self, conn: sqlite3.Connection):
+        # keep the latest record of the newest codes, like `HistoryStore`
+        conn.execute(
+            "DELETE FROM records WHERE id NOT IN ("
+            "SELECT MAX(id) AS last FROM records GROUP BY key ORDER BY last DESC LIMIT ?)",
+            (self._max_records,),
+        )
+        conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+
+    def _poll(self, conn: sqlite3.Connection, start: int, generation: int):
+        with conn:  # read in one transaction
+            current = self._read_state(conn)
+            if current != generation:
+                rows = conn.execute("SELECT id, key FROM records ORDER BY id").fetchall()
+                keys = [(index, key % (1 << 64)) for index, key in rows]
+            else:
+                rows = conn.execute(
+                    "SELECT id, key, data FROM records WHERE id >= ? ORDER BY id", (start,)
+                ).fetchall()
+                keys = []
+                for index, key, data in rows:
+                    if index in self._own_ids:
+                        continue
+                    keys.append((index, key % (1 << 64)))
+                    self._cache_record(index, json.loads(data))
+        with self._lock:
+            if current >= self._generation:  # not rewritten by this process meanwhile
+                self._changes = (current, keys, current != generation)
+
+def _connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+def _to_signed(key: int) -> int:
+    """Convert an unsigned 64-bit key to a SQLite integer."""
+    return key - (1 << 64) if key >= _SIGN_BIT else key
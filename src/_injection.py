@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from pathlib import Path
 from typing import Callable, TYPE_CHECKING
 from chimerax.core.commands import (  # type: ignore
     run,
@@ -85,11 +86,40 @@ def chimerax_get_mode(last_annot: type) -> str:
         mode = "r"  # never happens
     return mode
 
+@cached_function
+def chimerax_open_suffixes(session) -> list[str]:
+    """Get the suffixes of all the file formats that can be opened."""
+    suffixes: set[str] = set()
+    for fmt in session.open_command.open_data_formats:
+        suffixes.update(fmt.suffixes)
+    return sorted(suffixes)
+
+def chimerax_fetch_cache_dirs() -> list[str]:
+    """Get the directories of the fetched files."""
+    try:
+        from chimerax.core.fetch import cache_directories  # type: ignore
+
+        return list(cache_directories())
+    except Exception:
+        return [str(Path.home() / "Downloads" / "ChimeraX")]
+
 def chimerax_run(session):
     def _run(line):
         return run(session, line)
     return _run
 
+def chimerax_run_batch(session):
+    """Run lines without redrawing and echoing each of them."""
+    from ._batch import run_batch
+
+    def _run_batch(code: str, on_error: str):
+        session.update_loop.block_redraw()
+        try:
+            return run_batch(code, lambda line: run(session, line, log=False), on_error)
+        finally:
+            session.update_loop.unblock_redraw()
+    return _run_batch
+
 @cached_function
 def chimerax_builtin_colors() -> dict[str, str]:
     out: dict[str, str] = {}
@@ -30,9 +30,20 @@ def chimerax_file_history(session) -> Callable[[], list[FileSpec]]:
 def chimerax_get_mode(last_annot: type) -> str:
     return "r"
 
+def chimerax_open_suffixes(session) -> list[str]:
+    return []
+
+def chimerax_fetch_cache_dirs() -> list[str]:
+    return []
+
 def chimerax_run(session):
     return lambda line: None
 
+def chimerax_run_batch(session):
+    from ._batch import run_batch
+
+    return lambda code, on_error: run_batch(code, lambda line: None, on_error)
+
 def chimerax_builtin_colors() -> dict[str, str]:
     return {}
 
@@ -35,6 +35,15 @@ class CliXAPI(BundleAPI):
         elif ci.name == "clix log":
             func = _cmd.clix_log
             desc = _cmd.clix_log_desc
+        elif ci.name == "clix history stats":
+            func = _cmd.clix_history_stats
+            desc = _cmd.clix_history_stats_desc
+        elif ci.name == "clix run":
+            func = _cmd.clix_run
+            desc = _cmd.clix_run_desc
+        elif ci.name == "clix lint":
+            func = _cmd.clix_lint
+            desc = _cmd.clix_lint_desc
         else:
             raise ValueError(f"trying to register unknown command: {ci.name}")
         
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
-import timeit
+from pathlib import Path
+import threading
 import warnings
-from .user_data import CLIX_DATA_DIR, CLIX_PREFERENCE_FILE
+from .user_data import CLIX_PREFERENCE_FILE
 import json
-from typing import Literal
-from dataclasses import dataclass, asdict, field
+from typing import Any, Callable, Literal
+from dataclasses import dataclass, asdict, field, replace
 
 @dataclass
 class ColorTheme:
@@ -33,6 +34,10 @@ class Preference:
     show_label: bool = False
     enter_completion: bool = True
     auto_focus: bool = True
+    file_index_roots: list[str] = field(default_factory=list)
+    history_backend: Literal["file", "sqlite"] = "file"
+    batch_execution: Literal["off", "stop", "continue"] = "off"
+    validate_scripts: bool = True
     color_theme: ColorTheme = field(default_factory=ColorTheme)
     
     def __post_init__(self):
@@ -45,47 +50,110 @@ class Preference:
     def __eq__(self, other):
         return asdict(self) == asdict(other)
 
-_CACHED_PREFERENCE: Preference | None = None
-_LAST_LOADED: float = -1
+# fields used only when the CliX tool starts, while the others are applied at once
+RESTART_FIELDS = (
+    "area", "hide_title_bar", "show_label", "auto_focus", "file_index_roots",
+    "history_backend",
+)
 
-def load_preference(force: bool = True) -> Preference:
-    global _CACHED_PREFERENCE, _LAST_LOADED
+class PreferenceStore:
+    """Preference held in memory.
 
-    now = timeit.default_timer()
-    if _CACHED_PREFERENCE is not None and now - _LAST_LOADED < 0.25 and not force:
-        return _CACHED_PREFERENCE
-    _LAST_LOADED = now
+    The preference file is parsed again only when its modification time or size
+    changes, so that getting the preference costs one `stat` call. Callbacks are
+    called with the new preference when it is changed by `save` or by editing the
+    file (such as by another ChimeraX instance). Callbacks may be called from any
+    thread that gets the preference.
+    """
 
-    prepare_preference_file()
-    with CLIX_PREFERENCE_FILE.open("r") as f:
-        js = json.load(f)
+    _instance: PreferenceStore | None = None
+
+    def __init__(self, path: Path = CLIX_PREFERENCE_FILE):
+        self._path = path
+        self._preference: Preference | None = None
+        self._stat: tuple[int, int] | None = None  # (mtime_ns, size) of the file
+        self._callbacks: list[Callable[[Preference], Any]] = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def instance(cls) -> PreferenceStore:
+        """Return the singleton instance of the class."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def connect(self, callback: Callable[[Preference], Any]):
+        """Call the callback with the new preference when it is changed."""
+        self._callbacks.append(callback)
+
+    def disconnect(self, callback: Callable[[Preference], Any]):
+        self._callbacks.remove(callback)
+
+    def get(self, force: bool = False) -> Preference:
+        """Return the preference, reading the file only if it is changed.
+
+        The returned preference is shared and must not be modified.
+        """
+        with self._lock:
+            old = self._preference
+            stat = self._file_stat()
+            if old is not None and stat == self._stat and not force:
+                return old
+            new = self._read()
+            self._preference = new
+            self._stat = self._file_stat()
+        if old is not None and new != old:
+            self._notify(new)
+        return new
+
+    def save(self, **kwargs) -> Preference:
+        """Update the preference by the given non-None values and save it."""
+        old = self.get()
+        new = replace(old, **{k: v for k, v in kwargs.items() if v is not None})
+        with self._lock:
+            with self._path.open("w") as f:
+                json.dump(asdict(new), f)
+            self._preference = new
+            self._stat = self._file_stat()
+        if new != old:
+            self._notify(new)
+        return new
+
+    def _file_stat(self) -> tuple[int, int] | None:
+        try:
+            stat = self._path.stat()
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read(self) -> Preference:
+        prepare_preference_file(self._path)
+        with self._path.open("r") as f:
+            js = json.load(f)
         if not isinstance(js, dict):
             warnings.warn("Invalid preference file, using default preference")
-            out = Preference()
-        else:
-            kwargs = {}
-            for key, value in js.items():
-                if key in Preference.__annotations__:
-                    kwargs[key] = value
-            out = Preference(**kwargs)
-    _CACHED_PREFERENCE = out
-    return out
+            return Preference()
+        kwargs = {}
+        for key, value in js.items():
+            if key in Preference.__annotations__:
+                kwargs[key] = value
+        return Preference(**kwargs)
+
+    def _notify(self, preference: Preference):
+        for callback in list(self._callbacks):
+            callback(preference)
+
+def load_preference(force: bool = False) -> Preference:
+    return PreferenceStore.instance().get(force=force)
 
 def save_preference(**kwargs):
-    prepare_preference_file()
-    pref = load_preference()
-    for k, v in kwargs.items():
-        if v is not None:
-            setattr(pref, k, v)
-    with CLIX_PREFERENCE_FILE.open("w") as f:
-        json.dump(asdict(pref), f)
-    return pref
-
-def prepare_preference_file():
+    return PreferenceStore.instance().save(**kwargs)
+
+def prepare_preference_file(path: Path = CLIX_PREFERENCE_FILE):
     """Create directory and file if not exists."""
-    if not CLIX_DATA_DIR.exists():
-        CLIX_DATA_DIR.mkdir(parents=True)
-    if not CLIX_PREFERENCE_FILE.exists():
-        with CLIX_PREFERENCE_FILE.open("w") as f:
+    if not path.parent.exists():
+        path.parent.mkdir(parents=True)
+    if not path.exists():
+        with path.open("w") as f:
             json.dump(asdict(Preference()), f)
     return None
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import csv
+import heapq
+import json
+from pathlib import Path
+import time
+from typing import Any, Callable, Iterator, TextIO
+
+from ._batch import LineResult
+
+def iter_script_lines(path: str | Path) -> Iterator[tuple[int, str]]:
+    """Iterate over the (1-based line number, stripped line) of the non-empty lines.
+
+    The file is read as a stream, so that a large script is never loaded at once.
+    """
+    with Path(path).open("r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, start=1):
+            if line := line.strip():
+                yield lineno, line
+
+@dataclass
+class ScriptProfile:
+    """Profile of a script run."""
+    top: int = 10
+    num_lines: int = 0
+    wall: float = 0.0
+    _heap: list[tuple[float, int, str]] = field(default_factory=list, repr=False)
+
+    def add(self, result: LineResult):
+        self.num_lines += 1
+        self.wall += result.wall
+        item = (result.wall, -result.lineno, result.line)
+        if self.top <= 0:
+            return
+        if len(self._heap) < self.top:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    @property
+    def slowest(self) -> list[LineResult]:
+        """The slowest lines, the slowest first."""
+        return [
+            LineResult(-neg_lineno, line, wall)
+            for wall, neg_lineno, line in sorted(self._heap, reverse=True)
+        ]
+
+_FIELDS = ("lineno", "line", "wall", "ok")
+
+class _ProfileWriter:
+    """Write the line profile as CSV or JSON without keeping it in memory."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._is_json = path.suffix.lower() == ".json"
+        self._file: TextIO = path.open("w", newline="", encoding="utf-8")
+        self._num_rows = 0
+        if self._is_json:
+            self._file.write("[")
+        else:
+            self._csv = csv.writer(self._file)
+            self._csv.writerow(["lineno", "line", "wall", "ok"])
+
+    def write(self, result: LineResult):
+        row = [result.lineno, result.line, round(result.wall, 6), result.ok]
+        if self._is_json:
+            sep = "," if self._num_rows else ""
+            self._file.write(f"{sep}\n{json.dumps(dict(zip(_FIELDS, row)))}")
+        else:
+            self._csv.writerow(row)
+        self._num_rows += 1
+
+    def close(self):
+        if self._is_json:
+            self._file.write("\n]\n")
+        self._file.close()
+
+def run_script(
+    path: str | Path,
+    run: Callable[[str], Any],
+    top: int = 10,
+    output: str | Path | None = None,
+    on_line: Callable[[LineResult], Any] | None = None,
+) -> ScriptProfile:
+    """Run a script line by line in constant memory and profile each line.
+
+    If `output` is given, the profile of every line is written to the CSV or JSON
+    (if the suffix is ".json") file. An error stops the script and is re-raised,
+    after the profile of the lines run so far is written.
+    """
+    profile = ScriptProfile(top=top)
+    writer = _ProfileWriter(Path(output)) if output is not None else None
+    try:
+        for lineno, line in iter_script_lines(path):
+            t0 = time.perf_counter()
+            try:
+                run(line)
+            except Exception as e:
+                result = LineResult(lineno, line, time.perf_counter() - t0, e)
+                if writer is not None:
+                    writer.write(result)
+                if on_line is not None:
+                    on_line(result)
+                raise
+            result = LineResult(lineno, line, time.perf_counter() - t0)
+            profile.add(result)
+            if writer is not None:
+                writer.write(result)
+            if on_line is not None:
+                on_line(result)
+    finally:
+        if writer is not None:
+            writer.close()
+    return profile
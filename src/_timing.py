@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import statistics
+import time
+from typing import Iterator
+
+from .user_data import CLIX_TIMING_LOG_FILE
+
+# upper bounds of the duration histogram bins (seconds)
+HISTOGRAM_BINS = (0.01, 0.1, 1.0, 10.0, float("inf"))
+
+@dataclass
+class TimingEntry:
+    """Execution time of a command line."""
+    timestamp: float
+    line: str
+    wall: float
+    ok: bool
+
+    @property
+    def command_name(self) -> str:
+        return self.line.split(" ", 1)[0]
+
+@dataclass
+class CommandStats:
+    """Statistics of the execution time of a command."""
+    name: str
+    walls: list[float] = field(default_factory=list)
+    num_errors: int = 0
+
+    @property
+    def count(self) -> int:
+        return len(self.walls)
+
+    @property
+    def total(self) -> float:
+        return sum(self.walls)
+
+    @property
+    def median(self) -> float:
+        return statistics.median(self.walls)
+
+    @property
+    def max(self) -> float:
+        return max(self.walls)
+
+    def quantile(self, q: float) -> float:
+        walls = sorted(self.walls)
+        return walls[min(int(q * len(walls)), len(walls) - 1)]
+
+@dataclass
+class TimingStats:
+    """Summary of the timing log."""
+    slowest: list[TimingEntry]
+    per_command: list[CommandStats]  # sorted by the total time
+    histogram: list[int]  # number of lines in each of HISTOGRAM_BINS
+    num_lines: int
+
+class CommandTimingLog:
+    """Append-only log of the execution time of every command line run by CliX.
+
+    Each line of the log file is a JSON array of (timestamp, line, wall time, ok).
+    When the file exceeds `max_bytes`, the older half of the log is dropped.
+    """
+
+    _instance: CommandTimingLog | None = None
+
+    def __init__(self, path: Path = CLIX_TIMING_LOG_FILE, max_bytes: int = 8 * 1024 * 1024):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._file = None
+
+    @classmethod
+    def instance(cls) -> CommandTimingLog:
+        """Return the singleton instance of the class."""
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def record(self, line: str, wall: float, ok: bool, timestamp: float | None = None):
+        """Append the execution time of a command line."""
+        if timestamp is None:
+            timestamp = time.time()
+        if self._file is None:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self._path.open("a")
+        self._file.write(json.dumps([timestamp, line, round(wall, 6), ok]) + "\n")
+        self._file.flush()
+        if self._file.tell() > self._max_bytes:
+            self._truncate()
+        return None
+
+    def end_offset(self) -> int:
+        """Size of the log file, to read the entries logged until now later."""
+        try:
+            return self._path.stat().st_size
+        except OSError:
+            return 0
+
+    def iter_entries(self, end: int | None = None) -> Iterator[TimingEntry]:
+        """Iterate over the logged entries from the oldest one, until `end` bytes."""
+        if not self._path.exists():
+            return
+        with self._path.open("rb") as f:
+            while end is None or f.tell() < end:
+                if not (line := f.readline()):
+                    break
+                try:
+                    timestamp, code, wall, ok = json.loads(line)
+                except Exception:
+                    continue  # broken line written during a crash
+                yield TimingEntry(timestamp, code, wall, ok)
+
+    def stats(self, top: int = 10) -> TimingStats:
+        """Summarize the log."""
+        slowest: list[TimingEntry] = []
+        per_command: dict[str, CommandStats] = {}
+        histogram = [0] * len(HISTOGRAM_BINS)
+        num_lines = 0
+        for entry in self.iter_entries():
+            num_lines += 1
+            if (name := entry.command_name) not in per_command:
+                per_command[name] = CommandStats(name)
+            stats = per_command[name]
+            stats.walls.append(entry.wall)
+            if not entry.ok:
+                stats.num_errors += 1
+            for i, upper in enumerate(HISTOGRAM_BINS):
+                if entry.wall < upper:
+                    histogram[i] += 1
+                    break
+            slowest.append(entry)
+            if len(slowest) > top * 4:
+                slowest = sorted(slowest, key=lambda e: e.wall, reverse=True)[:top]
+        slowest = sorted(slowest, key=lambda e: e.wall, reverse=True)[:top]
+        return TimingStats(
+            slowest=slowest,
+            per_command=sorted(per_command.values(), key=lambda s: s.total, reverse=True),
+            histogram=histogram,
+            num_lines=num_lines,
+        )
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        return None
+
+    def _truncate(self):
+        self.close()
+        lines = self._path.read_text().splitlines(keepends=True)
+        tmp_path = self._path.with_suffix(".tmp")
+        with tmp_path.open("w") as f:
+            f.writelines(lines[len(lines) // 2:])
+        os.replace(tmp_path, self._path)
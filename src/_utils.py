@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from typing import Iterable
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+import json
 import re
 
 def colored(text: str, color: str) -> str:
@@ -36,3 +38,33 @@ def safe_is_subclass(obj, superclass) -> bool:
         return issubclass(obj, superclass)
     except TypeError:
         return False
+
+def iter_json_array(path: str | Path, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Iterate over the elements of a JSON array file without loading it at once."""
+    decoder = json.JSONDecoder()
+    with open(path, "r") as f:
+        buf = f.read(chunk_size).lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{path} is not a JSON array.")
+        pos = 1
+        eof = False
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = -1
+            if end < 0 or (end == len(buf) and not eof):
+                # the element may continue in the next chunk
+                if eof:
+                    raise ValueError(f"{path} ended unexpectedly.")
+                more = f.read(chunk_size)
+                eof = more == ""
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            yield obj
+            pos = end
@@ -1,9 +1,25 @@
 """All the algorithms independent of ChimeraX."""
 
-from .filepath import complete_path
-from .model import complete_model, complete_chain, complete_residue, complete_atom
-from .state import CompletionState, Context
-from .core import complete_keyword_name_or_value
+# The completion functions are imported lazily, because they depend on Qt through
+# the completion actions, while modules such as `validate` are used without Qt.
+
+_LAZY = {
+    "complete_path": ".filepath",
+    "complete_model": ".model",
+    "complete_chain": ".model",
+    "complete_residue": ".model",
+    "complete_atom": ".model",
+    "complete_keyword_name_or_value": ".core",
+    "CompletionState": ".state",
+    "Context": ".state",
+}
+
+def __getattr__(name):
+    if (module_name := _LAZY.get(name)) is not None:
+        from importlib import import_module
+
+        return getattr(import_module(module_name, __name__), name)
+    raise AttributeError(name)
 
 __all__ = [
     "complete_path",
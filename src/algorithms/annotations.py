@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+# Predicates of the ChimeraX argument annotations. Annotations are identified by their
+# names, so that this module is used without importing ChimeraX or Qt.
+
+def is_object(annotation) -> bool:
+    return getattr(annotation, "name", "") in (
+        "an object specifier",
+        "an objects specifier",
+    )
+
+def is_model(annotation) -> bool:
+    return is_object(annotation) or getattr(annotation, "name", "") in (
+        "a model specifier", 
+        "a models specifier",
+        "a model id",  # TODO: is this correct?
+    )
+
+def is_surface(annotation) -> bool:
+    return is_object(annotation) or getattr(annotation, "name", "") in (
+        "a surface specifier",
+        "a surfaces specifier",
+    )
+
+def is_density_map(annotation) -> bool:
+    return is_object(annotation) or getattr(annotation, "name", "") in (
+        "a density map specifier",
+        "a density maps specifier",
+    )
+
+def is_atomic(annotation) -> bool:
+    return is_object(annotation) or getattr(annotation, "name", "") in (
+        "a chains specifier",
+        "a residues specifier",
+        "an atom specifier",
+        "an atoms specifier",
+        "a structures specifier",
+        "an atomic structures specifier",
+    )
+
+def is_pseudobond(annotation) -> bool:
+    return getattr(annotation, "name", "") in (
+        "a pseudobonds specifier",
+        "a pseudobond groups specifier",
+    )
+
+def is_bond(annotation) -> bool:
+    return getattr(annotation, "name", "") in (
+        "a bonds specifier",
+        "a bond specifier",
+    )
+
+def is_value_type(annotation) -> bool:
+    return getattr(annotation, "name", "") == "numeric value type"
+
+def is_model_like(last_annot) -> bool:
+    return (
+        is_model(last_annot)
+        or is_surface(last_annot) 
+        or is_density_map(last_annot)
+        or is_atomic(last_annot)
+        or is_pseudobond(last_annot)
+        or is_bond(last_annot)
+    )
+
+def is_enumof(annotation) -> bool:
+    return type(annotation).__name__ == "EnumOf"
+
+def is_dynamic_enum(annotation) -> bool:
+    return type(annotation).__name__ == "DynamicEnum"
+
+def is_listof_enumof(annotation) -> bool:
+    return type(annotation).__name__ == "ListOf" and is_enumof(annotation.annotation)
+
+def is_boolean(annotation) -> bool:
+    return getattr(annotation, "name", "") == "true or false"
+
+def is_onoff(annotation) -> bool:
+    return getattr(annotation, "name", "") == "on or off"
+
+def is_noarg(annotation) -> bool:
+    return getattr(annotation, "__name__", "") == "NoArg"
+
+def is_none_arg(annotation) -> bool:
+    return getattr(annotation, "name", "") == "none"
+
+def is_or(annotation) -> bool:
+    return type(annotation).__name__ == "Or"
+
+def is_color(annotation) -> bool:
+    return getattr(annotation, "name", "") == "a color"
+
+def is_file_path(annotation) -> bool:
+    return hasattr(annotation, "check_existence")
+
+def is_axis(annotation) -> bool:
+    return getattr(annotation, "name", "") == "an axis vector"
+
+def is_target_arg(annotation) -> bool:
+    return getattr(annotation, "__name__", "") == "TargetArg"
+
+def is_colormap(annotation) -> bool:
+    return getattr(annotation, "name", "") == "a colormap"
+
+def is_number(annotation) -> bool:
+    return _annotation_name(annotation) in (
+        "IntArg", "FloatArg", "FloatOrDeltaArg", "PositiveIntArg", "NonNegativeIntArg",
+        "PositiveFloatArg", "NonNegativeFloatArg", "Bounded",
+    )
+
+def is_string(annotation) -> bool:
+    return _annotation_name(annotation) in ("StringArg", "RestOfLine", "WholeRestOfLine")
+
+def _annotation_name(annotation) -> str:
+    """Name of the annotation class, which may be used without instantiation."""
+    if isinstance(annotation, type):
+        return annotation.__name__
+    return type(annotation).__name__
@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+class _Node:
+    __slots__ = ("children", "name")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.name: str | None = None  # command name if a command ends here
+
+class CommandTrie:
+    """Command names stored word by word.
+
+    Finding the command at the start of a line walks the words once, instead of
+    joining the words and looking up every joined string.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._root = _Node()
+        for name in names:
+            node = self._root
+            for word in name.split(" "):
+                node = node.children.setdefault(word, _Node())
+            node.name = name
+
+    @property
+    def root(self) -> _Node:
+        return self._root
+
+    def longest_match(self, words: Iterable[str]) -> str | None:
+        """Return the longest command name made of the leading words."""
+        node = self._root
+        found = None
+        for word in words:
+            if (node := node.children.get(word)) is None:
+                break
+            if node.name is not None:
+                found = node.name
+        return found
+
+    def current_command(self, text: str) -> str | None:
+        """Return the command of the text being typed.
+
+        The words of the command must be followed by a space, so that "volume"
+        is still being typed while "volume " is the command "volume".
+        """
+        return self.longest_match(text.lstrip().split(" ")[:-1])
+
+def iter_words(text: str) -> Iterator[tuple[int, str]]:
+    """Iterate over the (start, word) of the words separated by spaces."""
+    start = 0
+    for word in text.split(" "):
+        if word:
+            yield start, word
+        start += len(word) + 1
+
+def split_tokens(text: str) -> list[str]:
+    """Split a command line into tokens in the way ChimeraX does.
+
+    A quote only opens a string at the start of a token, and backslashes are
+    literal, so that `don't` and `C:\\data\\x.pdb` are single tokens. ValueError is
+    raised if a quoted string is not closed.
+    """
+    tokens: list[str] = []
+    for start, end in _iter_tokens(text):
+        if text[start] in "'\"":
+            tokens.append(text[start + 1:end - 1])
+        else:
+            tokens.append(text[start:end])
+    return tokens
+
+def find_semicolon(text: str, start: int = 0) -> int:
+    """Return the index of the first semicolon that ends a command, or -1.
+
+    The text is tokenized as `split_tokens` does, so that semicolons in quoted
+    strings are skipped. An unclosed quote hides the rest of the text.
+    """
+    try:
+        for token_start, _ in _iter_tokens(text, start, semicolon=True):
+            if text[token_start] == ";":
+                return token_start
+    except ValueError:
+        pass
+    return -1
+
+def _iter_tokens(
+    text: str, start: int = 0, semicolon: bool = False
+) -> Iterator[tuple[int, int]]:
+    # (start, end) of the tokens including the quotes; if `semicolon` is true, an
+    # unquoted semicolon ends a token and is a token by itself
+    i = start
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if c.isspace():
+            i += 1
+        elif semicolon and c == ";":
+            yield i, i + 1
+            i += 1
+        elif c in "'\"":
+            if (end := text.find(c, i + 1)) < 0:
+                raise ValueError("incomplete quoted text")
+            yield i, end + 1
+            i = end + 1
+        else:
+            end = i
+            while end < n and not text[end].isspace() and not (semicolon and text[end] == ";"):
+                end += 1
+            yield i, end
+            i = end
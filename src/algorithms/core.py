@@ -11,6 +11,12 @@ from .state import CompletionState, Context
 from .model import complete_model, complete_chain, complete_residue, complete_atom
 from .._types import resolve_cmd_desc
 from .._utils import colored, is_hex_color
+from .annotations import (
+    is_object, is_surface, is_density_map, is_atomic, is_pseudobond, is_bond,
+    is_value_type, is_model_like, is_enumof, is_dynamic_enum, is_listof_enumof,
+    is_boolean, is_onoff, is_noarg, is_none_arg, is_or, is_color, is_file_path, is_axis,
+    is_target_arg, is_colormap, is_number, is_string,
+)
 
 # For types, see https://github.com/RBVI/ChimeraX/tree/develop/src/bundles/core/src/commands
 
@@ -61,7 +67,9 @@ def complete_keyword_name_or_value(
                 type="keyword-value",
             )
         last_annot = cmd_desc._keyword[last_pref]
-        if state := complete_keyword_value(last_annot, last_word, current_command, context):
+        if state := complete_keyword_value(
+            last_annot, last_word, current_command, context, keyword=last_pref
+        ):
             return state
     else:
         it = itertools.chain(cmd_desc._required.values(), cmd_desc._optional.values())
@@ -85,16 +93,28 @@ def complete_keyword_value(
     last_annot, 
     last_word: str,
     current_command: str,
-    context: Context
+    context: Context,
+    keyword: str | None = None,
 ) -> CompletionState | None:
-    """Get completion for keyword value of specific types."""
+    """Get completion for keyword value of specific types.
+    
+    If `keyword` is given, the values used in the history are also suggested for
+    the numeric and the string arguments.
+    """
 
     if is_noarg(last_annot):
         return list_keywords(last_word, current_command, context)
     elif is_none_arg(last_annot):
         return _from_values(["none"], last_word, current_command, "none", last_annot)
     elif is_number(last_annot):
-        return _from_values([], last_word, current_command, "number", last_annot)
+        values = [
+            v for v in _history_values(keyword, last_word, current_command, context)
+            if _is_number_text(v)
+        ]
+        return _from_values(values, last_word, current_command, "number", last_annot)
+    elif is_string(last_annot):
+        values = _history_values(keyword, last_word, current_command, context)
+        return _from_values(values, last_word, current_command, "text", last_annot)
     elif is_enumof(last_annot):
         values = to_list_of_str(last_annot.values, startswith=last_word)
         return _from_values(values, last_word, current_command, "enum", last_annot)
@@ -168,13 +188,38 @@ def complete_keyword_value(
         )
 
     elif is_file_path(last_annot):
-        if last_word and (states := complete_path(last_word, current_command)):
+        mode = context.get_file_open_mode(last_annot)
+        if last_word.startswith("**"):
+            # fuzzy search of the indexed files, such as "**emd_1234"
+            paths = context.search_files(last_word[2:])
+            return CompletionState(
+                text=last_word,
+                completions=paths,
+                command=current_command,
+                info=["(<i>indexed</i>)"] * len(paths),
+                type="keyword-value,path,replace",
+                keyword_type=last_annot,
+            )
+        if current_command == "open" and _maybe_fetch_id(last_word):
+            fetched = context.search_fetch_cache(last_word)
+        else:
+            fetched = []
+        if last_word and (
+            states := complete_path(
+                last_word,
+                current_command,
+                context.on_path_listed,
+                mode=mode,
+                suffixes=context.get_open_suffixes(),
+            )
+        ):
             paths = states.completions
-            info = ["(<i>path</i>)"] * len(paths)
+            info = states.info
             action = [NoAction()] * len(paths)
+        elif fetched:
+            paths, info, action = [], [], []
         else:
             # empty
-            mode = context.get_file_open_mode(last_annot)
             try:
                 default_paths = [Path.home().as_posix()]
             except Exception:
@@ -184,6 +229,11 @@ def complete_keyword_value(
             info=["<i>Browse ...</i>"] + ["(<i>path</i>)"] * npaths
             action=[SelectFile(mode=mode)] + [NoAction()] * npaths
 
+        if fetched:
+            # files already fetched are listed first
+            paths = [spec for spec, _ in fetched] + paths
+            info = [f"(<i>{desc}</i>)" for _, desc in fetched] + info
+            action = [NoAction()] * len(fetched) + action
         return CompletionState(
             text=last_word,
             completions=paths,
@@ -244,7 +294,9 @@ def complete_keyword_value(
         info = []
         action = []
         for each in last_annot.annotations:
-            if state := complete_keyword_value(each, last_word, current_command, context):
+            if state := complete_keyword_value(
+                each, last_word, current_command, context, keyword=keyword
+            ):
                 completions.extend(state.completions)
                 info.extend(state.info)
                 action.extend(state.action)
@@ -296,6 +348,30 @@ def complete_keyword_value(
                 )
     return None
 
+def _maybe_fetch_id(word: str) -> bool:
+    """True if the word may be a database ID such as "7abc" or "emdb:1234"."""
+    return word != "" and not any(c in word for c in "/\\~.")
+
+def _history_values(
+    keyword: str | None,
+    last_word: str,
+    current_command: str,
+    context: Context,
+) -> list[str]:
+    if keyword is None:
+        return []
+    return [
+        v for v in context.keyword_values(current_command, keyword)
+        if v.startswith(last_word)
+    ]
+
+def _is_number_text(text: str) -> bool:
+    try:
+        float(text)
+    except ValueError:
+        return False
+    return True
+
 def _from_values(
     values: list[str],
     last_word: str,
@@ -345,111 +421,9 @@ def list_keywords(
         )
     return None
 
-def is_object(annotation) -> bool:
-    return getattr(annotation, "name", "") in (
-        "an object specifier",
-        "an objects specifier",
-    )
-
-def is_model(annotation) -> bool:
-    return is_object(annotation) or getattr(annotation, "name", "") in (
-        "a model specifier", 
-        "a models specifier",
-        "a model id",  # TODO: is this correct?
-    )
-
-def is_surface(annotation) -> bool:
-    return is_object(annotation) or getattr(annotation, "name", "") in (
-        "a surface specifier",
-        "a surfaces specifier",
-    )
-
-def is_density_map(annotation) -> bool:
-    return is_object(annotation) or getattr(annotation, "name", "") in (
-        "a density map specifier",
-        "a density maps specifier",
-    )
-
-def is_atomic(annotation) -> bool:
-    return is_object(annotation) or getattr(annotation, "name", "") in (
-        "a chains specifier",
-        "a residues specifier",
-        "an atom specifier",
-        "an atoms specifier",
-        "a structures specifier",
-        "an atomic structures specifier",
-    )
-
-def is_pseudobond(annotation) -> bool:
-    return getattr(annotation, "name", "") in (
-        "a pseudobonds specifier",
-        "a pseudobond groups specifier",
-    )
-
-def is_bond(annotation) -> bool:
-    return getattr(annotation, "name", "") in (
-        "a bonds specifier",
-        "a bond specifier",
-    )
-
-def is_value_type(annotation) -> bool:
-    return getattr(annotation, "name", "") == "numeric value type"
-
-def is_model_like(last_annot) -> bool:
-    return (
-        is_model(last_annot)
-        or is_surface(last_annot) 
-        or is_density_map(last_annot)
-        or is_atomic(last_annot)
-        or is_pseudobond(last_annot)
-        or is_bond(last_annot)
-    )
-
-def is_enumof(annotation) -> bool:
-    return type(annotation).__name__ == "EnumOf"
-
-def is_dynamic_enum(annotation) -> bool:
-    return type(annotation).__name__ == "DynamicEnum"
-
-def is_listof_enumof(annotation) -> bool:
-    return type(annotation).__name__ == "ListOf" and is_enumof(annotation.annotation)
-
-def is_boolean(annotation) -> bool:
-    return getattr(annotation, "name", "") == "true or false"
-
-def is_onoff(annotation) -> bool:
-    return getattr(annotation, "name", "") == "on or off"
-
-def is_noarg(annotation) -> bool:
-    return getattr(annotation, "__name__", "") == "NoArg"
-
-def is_none_arg(annotation) -> bool:
-    return getattr(annotation, "name", "") == "none"
-
-def is_or(annotation) -> bool:
-    return type(annotation).__name__ == "Or"
-
-def is_color(annotation) -> bool:
-    return getattr(annotation, "name", "") == "a color"
-
-def is_file_path(annotation) -> bool:
-    return hasattr(annotation, "check_existence")
-
-def is_axis(annotation) -> bool:
-    return getattr(annotation, "name", "") == "an axis vector"
-
 def to_list_of_str(it: Iterable[Any], startswith: str = "") -> list[str]:
     out: list[str] = []
     for a in it:
         if str(a).startswith(startswith):
             out.append(str(a))
     return out
-
-def is_target_arg(annotation) -> bool:
-    return getattr(annotation, "__name__", "") == "TargetArg"
-
-def is_colormap(annotation) -> bool:
-    return getattr(annotation, "name", "") == "a colormap"
-
-def is_number(annotation) -> bool:
-    return type(annotation).__name__ in ("IntArg", "FloatArg", "FloatOrDeltaArg")
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import OrderedDict
+import os
+import sys
+import threading
+from typing import Callable, Iterable, Iterator
+
+_IS_DIR = 1
+_IS_LINK = 2
+
+class DirectoryListing:
+    """Sorted entry names of a directory with their file-type bits."""
+
+    def __init__(self, names: list[str], types: bytes, mtime_ns: int):
+        self.names = names
+        self.types = types
+        self.mtime_ns = mtime_ns
+        self.nbytes = sum(sys.getsizeof(name) for name in names) + len(types) + 128
+
+    @classmethod
+    def from_entries(cls, entries: list[tuple[str, int]], mtime_ns: int) -> DirectoryListing:
+        entries.sort()
+        return cls(
+            [name for name, _ in entries],
+            bytes(typ for _, typ in entries),
+            mtime_ns,
+        )
+
+    def find(self, filt: EntryFilter) -> list[tuple[str, bool]]:
+        """Return the entries that pass the filter."""
+        names = self.names
+        for i in range(bisect_left(names, filt.prefix), len(names)):
+            name = names[i]
+            if not name.startswith(filt.prefix):
+                break
+            filt.add(name, self.types[i])
+            if filt.is_full():
+                break
+        return filt.result()
+
+class EntryFilter:
+    """Collect at most `n` entries that start with `prefix`.
+
+    If `favored_suffixes` is given, directories and files with these suffixes are
+    listed before other files.
+    """
+
+    def __init__(
+        self,
+        prefix: str = "",
+        n: int = 64,
+        include_hidden: bool = False,
+        dirs_only: bool = False,
+        favored_suffixes: Iterable[str] = (),
+    ):
+        self.prefix = prefix
+        self._n = n
+        self._include_hidden = include_hidden
+        self._dirs_only = dirs_only
+        self._suffixes = tuple(s.lower() for s in favored_suffixes)
+        self._favored: list[tuple[str, bool]] = []
+        self._others: list[tuple[str, bool]] = []
+
+    def add(self, name: str, typ: int) -> bool:
+        """Add an entry and return true if it is accepted."""
+        if not name.startswith(self.prefix):
+            return False
+        if not self._include_hidden and name.startswith("."):
+            return False
+        is_dir = bool(typ & _IS_DIR)
+        if self._dirs_only and not is_dir:
+            return False
+        if not self._suffixes or is_dir or _has_suffix(name, self._suffixes):
+            if len(self._favored) < self._n:
+                self._favored.append((name, is_dir))
+                return True
+        elif len(self._others) < self._n:
+            self._others.append((name, is_dir))
+            return True
+        return False
+
+    def is_full(self) -> bool:
+        return len(self._favored) >= self._n
+
+    def result(self, sort: bool = False) -> list[tuple[str, bool]]:
+        if sort:
+            self._favored.sort()
+            self._others.sort()
+        return (self._favored + self._others)[:self._n]
+
+    def copy(self) -> EntryFilter:
+        """Return a new filter with the same conditions."""
+        return EntryFilter(
+            self.prefix, self._n, self._include_hidden, self._dirs_only, self._suffixes
+        )
+
+class DirectoryCache:
+    """LRU cache of directory listings validated by the directory mtime.
+
+    The cache holds listings up to `max_bytes` (roughly estimated). Each lookup costs
+    one `stat` call of the directory if the listing is cached. Otherwise the whole
+    directory is read to be cached, except for directories with more than
+    `max_entries` entries, which are not cached and whose listing stops as soon as
+    `max_entries` entries are read and enough entries are found.
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, max_entries: int = 100_000):
+        self._max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._nbytes = 0
+        self._listings: OrderedDict[str, DirectoryListing] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        directory: str,
+        filt: EntryFilter | None = None,
+        is_alive: Callable[[], bool] | None = None,
+        on_match: Callable[[str, bool], object] | None = None,
+    ) -> list[tuple[str, bool]]:
+        """Return the (name, is_dir) pairs of the directory that pass the filter.
+
+        `is_alive` is checked during listing to abort it. Aborted listings are not
+        cached and partial results are returned. `on_match` is called for each
+        matched entry found during listing. If the directory cannot be read, the
+        entries found until then are returned.
+        """
+        if filt is None:
+            filt = EntryFilter()
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+        except OSError:
+            return []  # deleted or inaccessible
+        with self._lock:
+            listing = self._listings.get(directory)
+            if listing is not None and listing.mtime_ns == mtime_ns:
+                self._listings.move_to_end(directory)
+                return listing.find(filt)
+
+        entries: list[tuple[str, int]] = []
+        try:
+            for name, typ in iter_scandir(directory, is_alive):
+                entries.append((name, typ))
+                if filt.add(name, typ) and on_match is not None:
+                    on_match(name, bool(typ & _IS_DIR))
+                if len(entries) > self._max_entries and filt.is_full():
+                    # too large to be cached. Stop listing here.
+                    return filt.result(sort=True)
+        except OSError:
+            # not readable or deleted during listing. Partial results are not cached.
+            return filt.result(sort=True)
+        if is_alive is not None and not is_alive():
+            return filt.result(sort=True)
+        listing = DirectoryListing.from_entries(entries, mtime_ns)
+        self._store(directory, listing)
+        return listing.find(filt.copy())
+
+    def clear(self):
+        with self._lock:
+            self._listings.clear()
+            self._nbytes = 0
+
+    def _store(self, directory: str, listing: DirectoryListing):
+        with self._lock:
+            if old := self._listings.pop(directory, None):
+                self._nbytes -= old.nbytes
+            if listing.nbytes > self._max_bytes:
+                return
+            self._listings[directory] = listing
+            self._nbytes += listing.nbytes
+            while self._nbytes > self._max_bytes:
+                _, evicted = self._listings.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+
+def iter_scandir(
+    directory: str,
+    is_alive: Callable[[], bool] | None = None,
+) -> Iterator[tuple[str, int]]:
+    """Iterate over (name, type bits) of the directory entries."""
+    with os.scandir(directory) as it:
+        for entry in it:
+            if is_alive is not None and not is_alive():
+                return
+            yield entry.name, _entry_type(entry)
+
+def _has_suffix(name: str, suffixes: tuple[str, ...]) -> bool:
+    name = name.lower()
+    for ext in (".gz", ".bz2", ".xz"):
+        if name.endswith(ext):
+            name = name[:-len(ext)]
+            break
+    return name.endswith(suffixes)
+
+def _entry_type(entry: os.DirEntry) -> int:
+    typ = 0
+    try:
+        if entry.is_dir():
+            typ |= _IS_DIR
+        if entry.is_symlink():
+            typ |= _IS_LINK
+    except OSError:
+        pass
+    return typ
@@ -1,11 +1,45 @@
 from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
 from pathlib import Path
-from typing import Iterable
+import threading
+import time
+from typing import Callable, Iterable
+from .dircache import DirectoryCache, EntryFilter
 from .state import CompletionState
 
-def complete_path(last_word: str, current_command: str) -> CompletionState | None:
-    """Return list of available paths for the given last word."""
-    if completions := _complete_path_impl(last_word):
+def complete_path(
+    last_word: str,
+    current_command: str,
+    callback: Callable[[], object] | None = None,
+    wait: float = 0.05,
+    mode: str = "",
+    suffixes: Iterable[str] = (),
+) -> CompletionState | None:
+    """Return list of available paths for the given last word.
+
+    Directory listing runs in a worker thread. If `callback` is given and the listing
+    is not done yet, the partial results are returned at once with a "listing..."
+    row, and the `callback` is called (from the worker thread) once the listing is
+    done. Without `callback`, the listing is waited for at most `wait` seconds.
+
+    `mode` is the file open mode ("r", "rm", "w" or "d"). Only directories are listed
+    in "d" mode, and files with given `suffixes` are listed first in "r" and "rm"
+    modes.
+    """
+    if last_word == "":
+        return None
+    if mode not in ("r", "rm"):
+        suffixes = ()
+    request = _LISTER.request(last_word, mode == "d", tuple(suffixes))
+    if callback is not None and request.notify_when_done(callback):
+        # never block the caller; the callback refreshes the completion list
+        return _listing_state(last_word, current_command, request)
+    try:
+        completions = request.future.result(timeout=wait)
+    except TimeoutError:
+        return _listing_state(last_word, current_command, request)
+    if completions:
         return CompletionState(
             last_word,
             completions=completions,
@@ -15,7 +49,131 @@ def complete_path(last_word: str, current_command: str) -> CompletionState | Non
         )
     return None
 
-def _complete_path_impl(last_word: str) -> list[str] | None:
+def _listing_state(
+    last_word: str,
+    current_command: str,
+    request: ListingRequest,
+) -> CompletionState:
+    partial = list(request.partial)
+    return CompletionState(
+        last_word,
+        completions=partial + [""],
+        command=current_command,
+        info=["(<i>path</i>)"] * len(partial) + ["<i>listing ...</i>"],
+        type="path",
+    )
+
+class ListingRequest:
+    """A directory listing request running in the worker thread."""
+
+    def __init__(
+        self,
+        last_word: str,
+        dirs_only: bool,
+        suffixes: tuple[str, ...],
+        timeout: float,
+    ):
+        self.last_word = last_word
+        self.dirs_only = dirs_only
+        self.suffixes = suffixes
+        self.deadline = time.monotonic() + timeout
+        self.partial: list[str] = []
+        self.finished_at: float | None = None
+        self.future: Future[list[str] | None] = Future()
+        self._cancelled = threading.Event()
+        self._callback: Callable[[], object] | None = None
+        self._lock = threading.Lock()
+
+    def notify_when_done(self, callback: Callable[[], object] | None) -> bool:
+        """Register a callback called when listing is done. False if already done."""
+        with self._lock:
+            if self.future.done():
+                return False
+            self._callback = callback
+            return True
+
+    def set_result(self, result: list[str] | None):
+        with self._lock:
+            self.finished_at = time.monotonic()
+            self.future.set_result(result)
+            callback = self._callback
+        if callback is not None and not self._cancelled.is_set():
+            callback()
+
+    def cancel(self):
+        """Cancel the request. Worker stops listing at the next entry."""
+        self._cancelled.set()
+        self.future.cancel()
+
+    def is_alive(self) -> bool:
+        """True if the listing should be continued."""
+        return not self._cancelled.is_set() and time.monotonic() < self.deadline
+
+    def is_reusable(self, max_age: float = 1.0) -> bool:
+        """True if the request is still running or has finished recently."""
+        if self.future.cancelled():
+            return False
+        if self.finished_at is None:
+            return not self.future.done()
+        return time.monotonic() - self.finished_at < max_age
+
+class PathLister:
+    """Directory lister that never blocks the caller thread.
+
+    Only the latest request is kept. A new request cancels the pending one, and each
+    request is aborted (with partial results) when it exceeds the deadline.
+    """
+
+    def __init__(self, max_workers: int = 2, timeout: float = 5.0):
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="clix-path")
+        self._timeout = timeout
+        self._current: ListingRequest | None = None
+        self._lock = threading.Lock()
+
+    def request(
+        self,
+        last_word: str,
+        dirs_only: bool = False,
+        suffixes: tuple[str, ...] = (),
+    ) -> ListingRequest:
+        """Return the (running or finished) listing request for the given word."""
+        with self._lock:
+            current = self._current
+            if (
+                current is not None
+                and current.last_word == last_word
+                and current.dirs_only == dirs_only
+                and current.suffixes == suffixes
+                and current.is_reusable()
+            ):
+                return current
+            if current is not None:
+                current.cancel()
+            req = self._current = ListingRequest(
+                last_word, dirs_only, suffixes, self._timeout
+            )
+        self._executor.submit(self._run, req)
+        return req
+
+    def _run(self, req: ListingRequest):
+        if not req.future.set_running_or_notify_cancel():
+            return
+        try:
+            out = _complete_path_impl(req.last_word, req)
+        except OSError:
+            # the callback must be called even if the directory cannot be listed
+            out = list(req.partial) or None
+        except Exception as e:
+            req.future.set_exception(e)
+            return
+        req.set_result(out)
+
+_LISTER = PathLister()
+
+def _complete_path_impl(
+    last_word: str,
+    request: ListingRequest | None = None,
+) -> list[str] | None:
     if last_word == "":
         return None
     # If path string ends with ".", pathlib.Path will ignore it.
@@ -27,34 +185,65 @@ def _complete_path_impl(last_word: str) -> list[str] | None:
         _maybe_path = Path(last_word[:-1].lstrip("'").lstrip('"')).expanduser().absolute() / temp_char
     else:
         _maybe_path = Path(last_word.lstrip("'").lstrip('"')).expanduser().absolute()
+    if request is None:
+        dirs_only, suffixes = False, ()
+    else:
+        dirs_only, suffixes = request.dirs_only, request.suffixes
+    # directories are marked by the same separator as the user typed
+    dir_sep = "\\" if "\\" in last_word else "/"
     if _maybe_path.exists():
         if _maybe_path.is_dir():
             if last_word.endswith(("/", "\\")):
                 sep = ""
             else:
-                sep = "\\" if "\\" in last_word else "/"
-            completions = [
-                sep + _p for _p in _iter_upto(p.name for p in _maybe_path.glob("*"))
-            ]
-            return completions
+                sep = dir_sep
+            return _list_directory(
+                _maybe_path,
+                EntryFilter(dirs_only=dirs_only, favored_suffixes=suffixes),
+                sep=sep,
+                dir_sep=dir_sep,
+                request=request,
+            )
     elif (
         _maybe_path.parent.exists()
         and _maybe_path != Path("/").absolute()
         and "/" in _maybe_path.as_posix()
     ):
-        _iter = _maybe_path.parent.glob("*")
         pref = _maybe_path.as_posix().rsplit("/", 1)[1]
         if pref == temp_char:
             pref = "."
-        completions = _iter_upto(
-            (p.name for p in _iter if p.name.startswith(pref)),
-            include_hidden=pref.startswith(".") or pref == "$",
+        return _list_directory(
+            _maybe_path.parent,
+            EntryFilter(
+                pref,
+                include_hidden=pref.startswith("."),
+                dirs_only=dirs_only,
+                favored_suffixes=suffixes,
+            ),
+            dir_sep=dir_sep,
+            request=request,
         )
-        return completions
     return None
 
-def _iter_upto(it: Iterable[str], n: int = 64, include_hidden: bool = False) -> list[str]:
-    if include_hidden:
-        return [a for _, a in zip(range(n), it)]
+_DIR_CACHE = DirectoryCache()
+
+def _list_directory(
+    directory: Path,
+    filt: EntryFilter,
+    sep: str = "",
+    dir_sep: str = "/",
+    request: ListingRequest | None = None,
+) -> list[str]:
+    """List entries using the directory cache."""
+    def _as_completion(name: str, is_dir: bool) -> str:
+        return sep + name + dir_sep if is_dir else sep + name
+
+    if request is None:
+        is_alive = on_match = None
     else:
-        return [a for _, a in zip(range(n), it) if not a.startswith(".")]
+        is_alive = request.is_alive
+        on_match = lambda name, is_dir: request.partial.append(_as_completion(name, is_dir))
+    entries = _DIR_CACHE.lookup(
+        str(directory), filt, is_alive=is_alive, on_match=on_match
+    )
+    return [_as_completion(name, is_dir) for name, is_dir in entries]
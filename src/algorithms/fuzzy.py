@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import heapq
+import re
+from typing import Iterable
+
+SCORE_MATCH = 16
+BONUS_BOUNDARY = 8
+BONUS_CONSECUTIVE = 6
+PENALTY_GAP_START = 5
+PENALTY_GAP_EXTENSION = 1
+_BOUNDARY_CHARS = frozenset(" /\\_-.,:;#")
+
+@dataclass
+class FuzzyMatch:
+    """Result of a fuzzy match."""
+    text: str
+    score: float
+    positions: list[int] = field(default_factory=list)
+
+    def __lt__(self, other: FuzzyMatch) -> bool:
+        return self.score < other.score
+
+def fuzzy_match(query: str, text: str) -> FuzzyMatch | None:
+    """Match `query` as a case-insensitive subsequence of `text`.
+
+    The matched span is the shortest one that ends at the first complete match, just
+    like the fzf (v1) algorithm. Matches are scored by the contiguity and the word
+    boundaries of the matched characters.
+    """
+    if query == "":
+        return FuzzyMatch(text, 0.0)
+    q = query.lower()
+    t = text.lower()
+    nq = len(q)
+
+    # forward scan to find the end of the first match
+    qi = 0
+    end = -1
+    for ti, c in enumerate(t):
+        if c == q[qi]:
+            qi += 1
+            if qi == nq:
+                end = ti + 1
+                break
+    if end < 0:
+        return None
+
+    # backward scan to find the shortest span
+    qi = nq - 1
+    start = 0
+    for ti in range(end - 1, -1, -1):
+        if t[ti] == q[qi]:
+            qi -= 1
+            if qi < 0:
+                start = ti
+                break
+
+    positions: list[int] = []
+    qi = 0
+    for ti in range(start, end):
+        if qi < nq and t[ti] == q[qi]:
+            positions.append(ti)
+            qi += 1
+    return FuzzyMatch(text, _score(text, positions), positions)
+
+def fuzzy_search(
+    query: str,
+    candidates: Iterable[str],
+    n: int = 32,
+) -> list[FuzzyMatch]:
+    """Return the top `n` fuzzy matches of the candidates in descending order."""
+    matches = (m for c in candidates if (m := fuzzy_match(query, c)) is not None)
+    return heapq.nlargest(n, matches)
+
+def subsequence_regex(query: str) -> re.Pattern[str]:
+    """Return a line-wise regex that matches lines containing `query` as a subsequence.
+
+    Each character class excludes the next query character, so that the regex never
+    backtracks. This is useful to prefilter a large newline-separated text at once.
+    """
+    parts = ["^"]
+    for c in query:
+        excluded = re.escape(c.lower()) + re.escape(c.upper())
+        parts.append(f"[^{excluded}\\n]*{re.escape(c)}")
+    parts.append("[^\\n]*$")
+    return re.compile("".join(parts), re.IGNORECASE | re.MULTILINE)
+
+def _score(text: str, positions: list[int]) -> float:
+    score = 0.0
+    prev = -2
+    for pos in positions:
+        score += SCORE_MATCH
+        if pos == 0 or text[pos - 1] in _BOUNDARY_CHARS:
+            score += BONUS_BOUNDARY
+        if pos == prev + 1:
+            score += BONUS_CONSECUTIVE
+        elif prev >= 0:
+            score -= PENALTY_GAP_START + PENALTY_GAP_EXTENSION * (pos - prev - 2)
+        prev = pos
+    return score
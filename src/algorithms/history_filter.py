@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from enum import Enum
+import heapq
+import re
+import threading
+from typing import Sequence
+
+from .fuzzy import FuzzyMatch, fuzzy_match
+
+class FilterMode(Enum):
+    STARTS_WITH = "startswith"
+    ENDS_WITH = "endswith"
+    CONTAINS = "contains"
+    REGEX = "regex"
+    FUZZY = "fuzzy"
+
+BONUS_RECENCY = 16  # fuzzy score bonus for the newest text
+FUZZY_MAX_RESULTS = 200
+FUZZY_MAX_CANDIDATES = 2000  # matches scored, from the newest text
+
+_REGEX_SPECIAL = frozenset("\\.^$*+?{}[]()|")
+_REGEX_OPTIONAL = frozenset("*?{")
+
+class HistoryFilter:
+    """Indexed filter of history texts.
+
+    The indexes are built lazily on the first query of each mode, or all at once in
+    a background thread by `build_async`:
+
+    - a sorted array of the texts for the "starts with" mode
+    - a sorted array of the reversed texts for the "ends with" mode
+    - a trigram index for the "contains" and "regex" modes
+    - bitmasks of the characters in each text for the "fuzzy" mode
+
+    While the background thread is building an index, queries of its mode scan all
+    the texts. If a query only adds characters to the previous one, the candidates
+    are narrowed from the previous result when it is smaller than the candidates from
+    the index. The result is a list of indices of the texts in the original order,
+    except for the "fuzzy" mode, where the top matches are returned in ascending
+    order of the score so that the best one comes last. A fuzzy query matching many
+    texts, such as a single character, only scores the newest
+    `FUZZY_MAX_CANDIDATES` matches.
+    """
+
+    def __init__(self, texts: Sequence[str]):
+        self._texts = list(texts)
+        self._prefix_index: list[tuple[str, int]] | None = None
+        self._suffix_index: list[tuple[str, int]] | None = None
+        self._trigrams: dict[str, list[int]] | None = None
+        self._char_masks: list[int] | None = None
+        self._fuzzy_matched: list[int] = []  # texts matched in the fuzzy mode
+        self._fuzzy_complete = False  # if all the matched texts are in _fuzzy_matched
+        self._positions: dict[int, list[int]] = {}
+        self._last_mode: FilterMode | None = None
+        self._last_query = ""
+        self._last_result: list[int] = []
+        self._build_thread: threading.Thread | None = None
+
+    def build_async(self):
+        """Start building all the indexes in a background thread."""
+        if self._build_thread is None:
+            self._build_thread = threading.Thread(
+                target=self._build_indexes, name="clix-history-filter", daemon=True
+            )
+            self._build_thread.start()
+        return None
+
+    def wait_built(self):
+        """Block until the indexes are built by `build_async`."""
+        if self._build_thread is not None:
+            self._build_thread.join()
+        return None
+
+    @property
+    def texts(self) -> list[str]:
+        return self._texts
+
+    def run(self, mode: FilterMode | str, query: str) -> list[int]:
+        """Return the indices of the texts that match the query."""
+        mode = FilterMode(mode)
+        self._positions = {}
+        if query == "":
+            result = list(range(len(self._texts)))
+        elif mode is FilterMode.FUZZY:
+            result = self._run_fuzzy(query)
+        else:
+            candidates = self._candidates(mode, query)
+            if self._is_narrowing(mode, query) and len(self._last_result) < len(candidates):
+                candidates = self._last_result
+            result = self._verify(mode, query, candidates)
+        self._last_mode = mode
+        self._last_query = query
+        self._last_result = result
+        return result
+
+    def positions(self, index: int) -> list[int]:
+        """Positions of the characters matched by the last fuzzy query."""
+        return self._positions.get(index, [])
+
+    def _run_fuzzy(self, query: str) -> list[int]:
+        if self._is_narrowing(FilterMode.FUZZY, query) and self._fuzzy_complete:
+            candidates = self._fuzzy_matched
+        else:
+            candidates = range(len(self._texts))
+        terms = query.split()
+        qmask = _char_mask("".join(terms))
+        masks = self._get_char_masks()
+        texts = self._texts
+        matched: list[int] = []
+        scored: list[tuple[float, int, list[int]]] = []
+        n = max(len(texts), 1)
+        complete = True
+        for i in reversed(candidates):
+            mask = _char_mask(texts[i]) if masks is None else masks[i]
+            if mask & qmask != qmask:
+                continue
+            if (match := fuzzy_match_terms(terms, texts[i])) is None:
+                continue
+            matched.append(i)
+            scored.append((match.score + BONUS_RECENCY * i / n, i, match.positions))
+            if len(matched) >= FUZZY_MAX_CANDIDATES:
+                complete = False
+                break
+        matched.reverse()
+        self._fuzzy_matched = matched
+        self._fuzzy_complete = complete
+        top = heapq.nlargest(FUZZY_MAX_RESULTS, scored)
+        self._positions = {i: positions for _, i, positions in top}
+        return [i for _, i, _ in reversed(top)]
+
+    def _is_narrowing(self, mode: FilterMode, query: str) -> bool:
+        if mode is not self._last_mode or self._last_query == "":
+            return False
+        last = self._last_query
+        if mode is FilterMode.STARTS_WITH:
+            return query.startswith(last)
+        elif mode is FilterMode.ENDS_WITH:
+            return query.endswith(last)
+        elif mode is FilterMode.CONTAINS:
+            return last in query
+        elif mode is FilterMode.FUZZY:
+            return query.startswith(last)
+        return False
+
+    def _candidates(self, mode: FilterMode, query: str) -> list[int]:
+        if mode is FilterMode.STARTS_WITH:
+            return self._range_candidates(self._get_prefix_index(), query)
+        elif mode is FilterMode.ENDS_WITH:
+            return self._range_candidates(self._get_suffix_index(), query[::-1])
+        elif mode is FilterMode.CONTAINS:
+            return self._trigram_candidates([query])
+        return self._trigram_candidates(regex_literals(query))
+
+    def _verify(self, mode: FilterMode, query: str, candidates: list[int]) -> list[int]:
+        texts = self._texts
+        if mode is FilterMode.STARTS_WITH:
+            return [i for i in candidates if texts[i].startswith(query)]
+        elif mode is FilterMode.ENDS_WITH:
+            return [i for i in candidates if texts[i].endswith(query)]
+        elif mode is FilterMode.CONTAINS:
+            return [i for i in candidates if query in texts[i]]
+        match = re.compile(query).match
+        return [i for i in candidates if match(texts[i]) is not None]
+
+    def _range_candidates(self, index: list[tuple[str, int]] | None, key: str) -> list[int]:
+        if index is None:
+            return list(range(len(self._texts)))
+        start = bisect_left(index, (key,))
+        out: list[int] = []
+        for i in range(start, len(index)):
+            text, idx = index[i]
+            if not text.startswith(key):
+                break
+            out.append(idx)
+        out.sort()
+        return out
+
+    def _trigram_candidates(self, literals: list[str]) -> list[int]:
+        grams = {lit[i:i + 3] for lit in literals for i in range(len(lit) - 2)}
+        if not grams:
+            return list(range(len(self._texts)))
+        if (trigrams := self._get_trigrams()) is None:
+            return list(range(len(self._texts)))
+        postings = sorted((trigrams.get(g, []) for g in grams), key=len)
+        out = postings[0]
+        for posting in postings[1:]:
+            if not out:
+                break
+            posting_set = set(posting)
+            out = [i for i in out if i in posting_set]
+        return out
+
+    def _build_indexes(self):
+        self._get_char_masks()
+        self._get_trigrams()
+        self._get_prefix_index()
+        self._get_suffix_index()
+
+    def _can_build(self) -> bool:
+        # None is returned by the getters while the background thread is building
+        thread = self._build_thread
+        return thread is None or thread is threading.current_thread()
+
+    def _get_prefix_index(self) -> list[tuple[str, int]] | None:
+        if self._prefix_index is None and self._can_build():
+            self._prefix_index = sorted((t, i) for i, t in enumerate(self._texts))
+        return self._prefix_index
+
+    def _get_suffix_index(self) -> list[tuple[str, int]] | None:
+        if self._suffix_index is None and self._can_build():
+            self._suffix_index = sorted((t[::-1], i) for i, t in enumerate(self._texts))
+        return self._suffix_index
+
+    def _get_char_masks(self) -> list[int] | None:
+        if self._char_masks is None and self._can_build():
+            self._char_masks = [_char_mask(text) for text in self._texts]
+        return self._char_masks
+
+    def _get_trigrams(self) -> dict[str, list[int]] | None:
+        if self._trigrams is None and self._can_build():
+            trigrams: dict[str, list[int]] = {}
+            for i, text in enumerate(self._texts):
+                for gram in {text[j:j + 3] for j in range(len(text) - 2)}:
+                    trigrams.setdefault(gram, []).append(i)
+            self._trigrams = trigrams
+        return self._trigrams
+
+def fuzzy_match_terms(terms: list[str], text: str) -> FuzzyMatch | None:
+    """Fuzzy match all the terms to the text in any order, like the fzf extended search."""
+    score = 0.0
+    positions: set[int] = set()
+    for term in terms:
+        if (match := fuzzy_match(term, text)) is None:
+            return None
+        score += match.score
+        positions.update(match.positions)
+    return FuzzyMatch(text, score, sorted(positions))
+
+def _char_mask(text: str) -> int:
+    """64-bit mask of the (case-insensitive) characters in the text."""
+    mask = 0
+    for c in set(text.lower()):
+        mask |= 1 << (ord(c) & 63)
+    return mask
+
+def regex_literals(pattern: str) -> list[str]:
+    """Return the literal strings that any match of the pattern must contain.
+
+    This is a conservative analysis. Literals in groups are ignored, and nothing is
+    returned if the pattern has an alternation or inline flags.
+
+    >>> regex_literals("open .*pdb")
+    ['open ', 'pdb']
+    >>> regex_literals("colou?r")
+    ['colo', 'r']
+    """
+    if "|" in pattern or "(?" in pattern:
+        return []
+    literals: list[str] = []
+    current: list[str] = []
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c not in _REGEX_SPECIAL:
+            if depth == 0:
+                current.append(c)
+            i += 1
+            continue
+        if c in _REGEX_OPTIONAL and current:
+            current.pop()  # the last character may not appear
+        if current:
+            literals.append("".join(current))
+            current = []
+        if c == "\\":
+            i += 2
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            i = len(pattern) if end < 0 else end + 1
+        elif c == "{":
+            end = pattern.find("}", i + 1)
+            i = len(pattern) if end < 0 else end + 1
+        else:
+            if c == "(":
+                depth += 1
+            elif c == ")":
+                depth = max(depth - 1, 0)
+            i += 1
+    if current:
+        literals.append("".join(current))
+    return literals
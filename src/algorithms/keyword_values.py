@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Iterator
+
+from .next_command import _MAX_COMMAND_WORDS, _WORD
+from .prefix_index import push_ranked
+
+MAX_VALUES = 8  # number of values kept for each keyword
+
+def iter_keyword_values(line: str) -> Iterator[tuple[tuple[str, str], str]]:
+    """Iterate over ((command, keyword), value) candidates of a command line.
+
+    Every word followed by a token is a keyword candidate. Because the command name
+    is not known without the command registry, the candidates are yielded for all
+    the possible command names made of the leading words. Wrong candidates are never
+    looked up, since the lookup uses the keywords of the command description.
+
+    >>> list(iter_keyword_values("surface dust #1 size 10"))
+    [(('surface', 'dust'), '#1'), (('surface', 'size'), '10'), (('surface dust', 'size'), '10')]
+    """
+    tokens = line.split()
+    if not tokens or tokens[0].startswith("#"):
+        return
+    num_words = 0
+    while num_words < min(len(tokens), _MAX_COMMAND_WORDS) and _WORD.fullmatch(tokens[num_words]):
+        num_words += 1
+    for i in range(1, len(tokens) - 1):
+        if not _WORD.fullmatch(tokens[i]):
+            continue
+        keyword = tokens[i].lower()
+        for n in range(1, min(num_words, i) + 1):
+            yield (" ".join(tokens[:n]).lower(), keyword), tokens[i + 1]
+
+class KeywordValueIndex:
+    """Index from (command, keyword) to the values used in the history.
+
+    Each key keeps only the `max_values` best values ranked by frecency, so that the
+    most frequent and the most recent values are found by a dict lookup.
+    """
+
+    def __init__(self, max_values: int = MAX_VALUES):
+        self._max_values = max_values
+        self._table: dict[tuple[str, str], list[tuple[float, str]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def add(self, code: str, weight: float):
+        """Add the log-weight of a use of the code."""
+        for line in code.splitlines():
+            for key, value in iter_keyword_values(line):
+                if (values := self._table.get(key)) is None:
+                    self._table[key] = values = []
+                push_ranked(values, value, weight, self._max_values)
+        return None
+
+    def values(self, command: str, keyword: str) -> list[str]:
+        """Return the values of the keyword in the order of frecency."""
+        return [value for _, value in self._table.get((command, keyword.lower()), [])]
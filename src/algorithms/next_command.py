@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from collections import deque
+import re
+import sys
+
+from .prefix_index import push_ranked
+
+MAX_CANDIDATES = 8  # number of next lines kept for each context
+_MAX_COMMAND_WORDS = 3
+_WORD = re.compile(r"[A-Za-z][A-Za-z0-9_]*")
+
+def command_signature(line: str) -> str:
+    """Normalize a command line into its command name and keyword names.
+
+    The command name is the leading words of the line, and the keyword names are
+    the words followed by a value. Specifiers, file names and values are dropped.
+    Empty and comment lines give an empty string.
+
+    >>> command_signature("volume #1 level 0.5 color red")
+    'volume color= level='
+    >>> command_signature("hide atoms")
+    'hide atoms'
+    """
+    tokens = line.split()
+    if not tokens or tokens[0].startswith("#"):
+        return ""
+    words: list[str] = []
+    i = 0
+    while i < min(len(tokens), _MAX_COMMAND_WORDS) and _WORD.fullmatch(tokens[i]):
+        words.append(tokens[i].lower())
+        i += 1
+    if not words:
+        return ""
+    keywords: set[str] = set()
+    while i < len(tokens) - 1:
+        if _WORD.fullmatch(tokens[i]):
+            keywords.add(tokens[i].lower())
+            i += 2  # skip the value
+        else:
+            i += 1
+    return sys.intern(" ".join(words) + "".join(f" {kw}=" for kw in sorted(keywords)))
+
+class NextCommandModel:
+    """Trigram model of the next command line.
+
+    A line is predicted from the signatures (see `command_signature`) of the last two
+    lines. Each context, including the shorter ones for back-off, keeps only the
+    `max_candidates` best next lines ranked by frecency, so that the table stays
+    small and a prediction is a few dict lookups.
+    """
+
+    def __init__(self, max_candidates: int = MAX_CANDIDATES):
+        self._max_candidates = max_candidates
+        # context -> [(log-score, line), ...] in descending order
+        self._table: dict[tuple[str, ...], list[tuple[float, str]]] = {}
+        self._last_signatures: deque[str] = deque(maxlen=2)
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def add(self, code: str, weight: float):
+        """Add the log-weight of a use of the code, which follows the last code."""
+        for line in code.splitlines():
+            line = line.strip()
+            if not (sig := command_signature(line)):
+                continue
+            for context in self._contexts():
+                self._update(context, line, weight)
+            self._last_signatures.append(sig)
+        return None
+
+    def predict(self) -> list[str]:
+        """Return the next lines in the order of likelihood."""
+        out: dict[str, None] = {}  # ordered set
+        for context in reversed(self._contexts()):
+            for _, line in self._table.get(context, []):
+                out[line] = None
+            if len(out) >= self._max_candidates:
+                break
+        return list(out)[:self._max_candidates]
+
+    def _contexts(self) -> list[tuple[str, ...]]:
+        """Contexts from the shortest to the longest."""
+        last = tuple(self._last_signatures)
+        return [last[i:] for i in range(len(last), -1, -1)]
+
+    def _update(self, context: tuple[str, ...], line: str, weight: float):
+        if (candidates := self._table.get(context)) is None:
+            self._table[context] = candidates = []
+        push_ranked(candidates, line, weight, self._max_candidates)
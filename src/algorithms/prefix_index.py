@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import math
+
+FRECENCY_HALF_LIFE = 14 * 24 * 3600  # seconds
+
+def frecency_weight(t: float) -> float:
+    """Log-weight of one use of a line at time `t`.
+
+    The frecency of a line is the sum of exp(-(now - t) / tau) over its uses. Because
+    the factor exp(-now / tau) is common to all the lines, the log of the sum of
+    exp(t / tau) gives the same order at any time, and it only increases with uses.
+    """
+    return t * math.log(2) / FRECENCY_HALF_LIFE
+
+def log_add(a: float, b: float) -> float:
+    """Return log(exp(a) + exp(b)) without overflow."""
+    if a < b:
+        a, b = b, a
+    if b == -math.inf:
+        return a
+    return a + math.log1p(math.exp(b - a))
+
+def push_ranked(ranked: list[tuple[float, str]], item: str, weight: float, max_size: int):
+    """Add the log-weight to an item of a list sorted by the score, keeping its size."""
+    for i, (score, each) in enumerate(ranked):
+        if each == item:
+            ranked[i] = (log_add(score, weight), item)
+            break
+    else:
+        ranked.append((weight, item))
+    ranked.sort(key=lambda x: -x[0])
+    del ranked[max_size:]
+
+class _Node:
+    """Node of the radix tree.
+
+    `best` is the highest-scored line in the subtree, so that looking up a prefix
+    does not need to visit the subtree.
+    """
+
+    __slots__ = ("children", "best", "score")
+
+    def __init__(self, best: str | None = None, score: float = -math.inf):
+        self.children: dict[str, tuple[str, _Node]] = {}  # first char -> (label, child)
+        self.best = best
+        self.score = score
+
+    def update(self, line: str, score: float):
+        if score >= self.score:
+            self.best = line
+            self.score = score
+
+class PrefixIndex:
+    """Line-level prefix index of codes ranked by frecency.
+
+    Lines are stored in a radix tree whose nodes remember the highest-scored line
+    below them. Since the score of a line never decreases, adding a use only updates
+    the nodes on the path of the line. Looking up the best line that starts with a
+    prefix costs O(len(prefix)), and a lookup of an extended prefix resumes from the
+    node where the previous lookup stopped.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._scores: dict[str, float] = {}
+        # cursor of the last lookup
+        self._last_prefix: str | None = None
+        self._last_node = self._root
+        self._last_depth = 0
+        self._last_result: str | None = None
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def add(self, code: str, weight: float):
+        """Add the log-weight of a use to all the lines of a code."""
+        # earlier lines are preferred within the same code
+        for line in reversed(code.splitlines()):
+            score = log_add(self._scores.get(line, -math.inf), weight)
+            self._scores[line] = score
+            self._insert(line, score)
+        self._last_prefix = None
+        return None
+
+    def score(self, line: str) -> float:
+        return self._scores.get(line, -math.inf)
+
+    def lookup(self, prefix: str) -> str | None:
+        """Return the highest-scored line that starts with the prefix."""
+        last = self._last_prefix
+        if last is not None and prefix.startswith(last):
+            if self._last_result is None:
+                return None
+            node, depth = self._last_node, self._last_depth
+        else:
+            node, depth = self._root, 0
+        result = None
+        while True:
+            if depth == len(prefix):
+                result = node.best
+                break
+            if (item := node.children.get(prefix[depth])) is None:
+                break
+            label, child = item
+            rest = prefix[depth:depth + len(label)]
+            if not label.startswith(rest):
+                break
+            if len(rest) < len(label):
+                # prefix ends in the middle of the edge
+                result = child.best
+                break
+            node, depth = child, depth + len(label)
+        self._last_prefix = prefix
+        self._last_node = node
+        self._last_depth = depth
+        self._last_result = result
+        return result
+
+    def _insert(self, line: str, score: float):
+        node = self._root
+        node.update(line, score)
+        depth = 0
+        while depth < len(line):
+            c = line[depth]
+            if (item := node.children.get(c)) is None:
+                node.children[c] = (line[depth:], _Node(line, score))
+                return
+            label, child = item
+            rest = line[depth:]
+            common = 0
+            for a, b in zip(label, rest):
+                if a != b:
+                    break
+                common += 1
+            if common < len(label):
+                # split the edge
+                mid = _Node(child.best, child.score)
+                mid.children[label[common]] = (label[common:], child)
+                node.children[c] = (label[:common], mid)
+                child = mid
+            child.update(line, score)
+            node, depth = child, depth + common
+        return None
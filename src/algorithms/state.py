@@ -46,7 +46,17 @@ class Context:
     filter_bond: Callable[[list[ModelType]], list[ModelType]] = lambda x: x
     get_file_open_mode: Callable[[Any], str] = lambda x: "r"
     get_file_list: Callable[[], list[FileSpec]] = lambda: []
+    get_open_suffixes: Callable[[], list[str]] = lambda: []
+    """Suffixes of the file formats that can be opened."""
+    search_files: Callable[[str], list[str]] = lambda x: []
+    """Fuzzy search of the indexed files."""
+    search_fetch_cache: Callable[[str], list[tuple[str, str]]] = lambda x: []
+    """Search the fetched files. Returns list of (spec, description)."""
+    keyword_values: Callable[[str, str], list[str]] = lambda cmd, kw: []
+    """Values of a keyword of a command used in the history, the best first."""
     run_command: Callable[[str], Any] = lambda x: None
+    on_path_listed: Callable[[], Any] | None = None
+    """Called from a worker thread when a pending path listing is done."""
 
     def with_models(self, models: list[ModelType]) -> Context:
         # NOTE: asdict deepcopies the fields, which may be unsafe for some types.
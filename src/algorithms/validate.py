@@ -0,0 +1,326 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import difflib
+from typing import Iterable, Iterator, Mapping
+
+from .command_trie import CommandTrie, find_semicolon, split_tokens
+from .annotations import (
+    is_boolean, is_enumof, is_model_like, is_noarg, is_number, is_or, is_onoff,
+    _annotation_name,
+)
+from .._types import WordInfo, resolve_cmd_desc
+
+@dataclass(frozen=True)
+class ArgKind:
+    """Kind of an argument needed for validation.
+
+    - "noarg": keyword without value
+    - "number" / "int": a number
+    - "enum": one of `values`
+    - "spec": object specifier, which may be split into several tokens
+    - "rest": rest of the line up to a semicolon
+    - "whole_rest": rest of the line including semicolons
+    - "token": any other single token
+    """
+    kind: str
+    values: tuple[str, ...] = ()
+
+    @classmethod
+    def from_annotation(cls, annotation) -> ArgKind:
+        if is_noarg(annotation):
+            return cls("noarg")
+        if _annotation_name(annotation) == "RestOfLine":
+            return cls("rest")
+        if _annotation_name(annotation) == "WholeRestOfLine":
+            return cls("whole_rest")
+        if is_number(annotation):
+            if "Int" in _annotation_name(annotation):
+                return cls("int")
+            return cls("number")
+        if is_enumof(annotation):
+            return cls("enum", tuple(str(v) for v in annotation.values))
+        if is_boolean(annotation):
+            return cls("enum", ("true", "false", "t", "f", "1", "0", "yes", "no"))
+        if is_onoff(annotation):
+            return cls("enum", ("on", "off", "true", "false", "1", "0"))
+        if is_model_like(annotation):
+            return cls("spec")
+        if is_or(annotation):
+            kinds = [cls.from_annotation(each) for each in annotation.annotations]
+            if any(k.kind in ("spec", "rest", "whole_rest") for k in kinds):
+                return cls("spec")
+        return cls("token")
+
+    @property
+    def is_multi_token(self) -> bool:
+        return self.kind in ("spec", "rest", "whole_rest")
+
+    def check(self, value: str) -> str | None:
+        """Return the problem of the value if any."""
+        if self.kind == "int":
+            try:
+                int(value)
+            except ValueError:
+                return f"{value!r} is not an integer"
+        elif self.kind == "number":
+            try:
+                float(value)
+            except ValueError:
+                return f"{value!r} is not a number"
+        elif self.kind == "enum":
+            lower = value.lower()
+            if not any(v.lower().startswith(lower) for v in self.values):
+                return f"{value!r} is not one of {', '.join(self.values)}"
+        return None
+
+@dataclass
+class CommandSignature:
+    """Arguments of a command, which is a picklable summary of the CmdDesc."""
+    required: list[tuple[str, ArgKind]] = field(default_factory=list)
+    optional: list[tuple[str, ArgKind]] = field(default_factory=list)
+    keywords: dict[str, ArgKind] = field(default_factory=dict)
+
+    @classmethod
+    def from_cmd_desc(cls, cmd_desc) -> CommandSignature:
+        return cls(
+            required=[(k, ArgKind.from_annotation(a)) for k, a in cmd_desc._required.items()],
+            optional=[(k, ArgKind.from_annotation(a)) for k, a in cmd_desc._optional.items()],
+            keywords={k: ArgKind.from_annotation(a) for k, a in cmd_desc._keyword.items()},
+        )
+
+    def to_dict(self) -> dict:
+        def _args(args: Iterable[tuple[str, ArgKind]]):
+            return [[k, a.kind, list(a.values)] for k, a in args]
+        return {
+            "required": _args(self.required),
+            "optional": _args(self.optional),
+            "keywords": _args(self.keywords.items()),
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> CommandSignature:
+        def _args(args):
+            return [(k, ArgKind(kind, tuple(values))) for k, kind, values in args]
+        return cls(
+            required=_args(d["required"]),
+            optional=_args(d["optional"]),
+            keywords=dict(_args(d["keywords"])),
+        )
+
+class SignatureTable:
+    """Command signatures looked up by the command name.
+
+    Created from the command registry, only the command descriptions that are
+    already resolved are used, so that validation never imports a bundle. Commands
+    whose descriptions are not resolved are checked only by their names, unless
+    `resolve=True` is given.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self._names = set(names)
+        self._trie = CommandTrie(self._names)
+        self._first_words = {name.split(" ", 1)[0] for name in self._names}
+        self._signatures: dict[str, CommandSignature | None] = {}
+        self._commands: Mapping[str, WordInfo] = {}
+        self._resolve = False
+
+    @classmethod
+    def from_commands(
+        cls,
+        commands: Mapping[str, WordInfo],
+        resolve: bool = False,
+    ) -> SignatureTable:
+        self = cls(commands.keys())
+        self._commands = commands
+        self._resolve = resolve
+        return self
+
+    @classmethod
+    def from_snapshot(cls, snapshot: dict[str, dict | None]) -> SignatureTable:
+        self = cls(snapshot.keys())
+        for name, sig in snapshot.items():
+            self._signatures[name] = None if sig is None else CommandSignature.from_dict(sig)
+        return self
+
+    def to_snapshot(self) -> dict[str, dict | None]:
+        out: dict[str, dict | None] = {}
+        for name in sorted(self._names):
+            sig = self.get(name)
+            out[name] = None if sig is None else sig.to_dict()
+        return out
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._names
+
+    def get(self, name: str) -> CommandSignature | None:
+        if name in self._signatures:
+            return self._signatures[name]
+        if (winfo := self._commands.get(name)) is None or winfo.cmd_desc is None:
+            return None
+        if self._resolve:
+            cmd_desc = resolve_cmd_desc(winfo, name)
+        elif hasattr(winfo.cmd_desc, "function"):
+            cmd_desc = winfo.cmd_desc
+        else:
+            cmd_desc = None  # not resolved yet
+        if cmd_desc is None:
+            return None
+        sig = CommandSignature.from_cmd_desc(cmd_desc)
+        self._signatures[name] = sig
+        return sig
+
+    def match_command(self, tokens: list[str]) -> str | None:
+        """Return the longest command name at the start of the tokens.
+
+        Commands are found in the same way as the command line widget does.
+        """
+        return self._trie.longest_match(token.lower() for token in tokens)
+
+    def close_command(self, word: str) -> str | None:
+        matches = difflib.get_close_matches(word.lower(), self._first_words, n=1)
+        return matches[0] if matches else None
+
+@dataclass
+class Diagnostic:
+    """A problem found in a line."""
+    lineno: int
+    line: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"line {self.lineno}: {self.message}"
+
+def diagnostics_to_html(diagnostics: list[Diagnostic]) -> str:
+    """Report of the problems found before running a script."""
+    from html import escape
+
+    items = "".join(
+        f"<li>line {d.lineno}: {escape(d.message)}<br><code>{escape(d.line)}</code></li>"
+        for d in diagnostics
+    )
+    return f"<b>Found {len(diagnostics)} problem(s). Nothing was run.</b><ul>{items}</ul>"
+
+def validate_lines(
+    lines: Iterable[tuple[int, str]],
+    table: SignatureTable,
+) -> Iterator[Diagnostic]:
+    """Validate (line number, line) pairs without running them.
+
+    Command names, keyword names, the number of required arguments and the values
+    of number and enum arguments are checked. Since specifiers may contain spaces,
+    the arguments after a specifier are checked only from the next known keyword.
+    Aliases defined by the earlier lines are known commands.
+    """
+    aliases: set[str] = set()
+    for lineno, line in lines:
+        if line.startswith("#"):
+            continue
+        for command in _split_commands(line, table):
+            for message in _validate_command(command.strip(), table, aliases):
+                yield Diagnostic(lineno, line, message)
+
+def _split_commands(line: str, table: SignatureTable) -> Iterator[str]:
+    # semicolons in quoted strings and in the whole rest of line do not end a command
+    start = 0
+    while (end := find_semicolon(line, start)) >= 0:
+        command = line[start:end]
+        if _takes_whole_rest(command, table):
+            break
+        yield command
+        start = end + 1
+    yield line[start:]
+
+def _takes_whole_rest(text: str, table: SignatureTable) -> bool:
+    try:
+        tokens = split_tokens(text)
+    except ValueError:
+        return False
+    if (name := table.match_command(tokens)) is None:
+        return False
+    if (sig := table.get(name)) is None:
+        return name == "alias"  # alias may not be resolved yet
+    return any(a.kind == "whole_rest" for _, a in sig.required + sig.optional)
+
+def _validate_command(text: str, table: SignatureTable, aliases: set[str]) -> Iterator[str]:
+    if text == "":
+        return
+    try:
+        tokens = split_tokens(text)
+    except ValueError as e:
+        yield str(e)
+        return
+    first = tokens[0].lower()
+    if first in aliases:
+        return
+    if first == "alias" and len(tokens) > 2 and tokens[1].lower() not in ("delete", "list"):
+        aliases.add(tokens[1].lower())
+    elif first == "~alias" and len(tokens) > 1:
+        aliases.discard(tokens[1].lower())
+    if (name := table.match_command(tokens)) is None:
+        msg = f"unknown command {tokens[0]!r}"
+        if close := table.close_command(tokens[0]):
+            msg += f" (did you mean {close!r}?)"
+        yield msg
+        return
+    if (sig := table.get(name)) is None:
+        return
+    args = tokens[name.count(" ") + 1:]
+    keywords = {k.lower(): (k, a) for k, a in sig.keywords.items()}
+
+    # positional arguments are the tokens before the first keyword
+    num_pos = len(args)
+    for i, arg in enumerate(args):
+        if arg.lower() in keywords:
+            num_pos = i
+            break
+    positional = args[:num_pos]
+    pos_kinds = [a for _, a in sig.required + sig.optional]
+    if any(k.kind in ("rest", "whole_rest") for k in pos_kinds):
+        if len(positional) < len(sig.required):
+            yield f"{name!r} needs {len(sig.required)} argument(s)"
+        return
+    if len(positional) < len(sig.required):
+        yield f"{name!r} needs {len(sig.required)} argument(s), got {len(positional)}"
+    elif any(k.is_multi_token for k in pos_kinds):
+        for arg in positional:
+            if close := _close_keyword(arg, keywords):
+                yield f"unknown keyword {arg!r} (did you mean {close!r}?)"
+    else:
+        for arg, kind in zip(positional, pos_kinds):
+            if problem := kind.check(arg):
+                yield problem
+        # extra tokens are unknown keywords
+        num_pos = min(num_pos, len(pos_kinds))
+
+    i = num_pos
+    while i < len(args):
+        if (item := keywords.get(args[i].lower())) is None:
+            yield _unknown_keyword(args[i], keywords)
+            i += 1
+            if i < len(args) and args[i].lower() not in keywords:
+                i += 1  # skip the value of the unknown keyword
+            continue
+        keyword, kind = item
+        i += 1
+        if kind.kind == "noarg":
+            continue
+        if i >= len(args):
+            yield f"keyword {keyword!r} needs a value"
+            break
+        if problem := kind.check(args[i]):
+            yield f"{keyword}: {problem}"
+        i += 1
+        if kind.is_multi_token:
+            # skip the rest of the specifier
+            while i < len(args) and args[i].lower() not in keywords:
+                i += 1
+
+def _close_keyword(word: str, keywords: dict[str, tuple[str, ArgKind]]) -> str | None:
+    matches = difflib.get_close_matches(word.lower(), keywords.keys(), n=1, cutoff=0.8)
+    return keywords[matches[0]][0] if matches else None
+
+def _unknown_keyword(word: str, keywords: dict[str, tuple[str, ArgKind]]) -> str:
+    if close := _close_keyword(word, keywords):
+        return f"unknown keyword {word!r} (did you mean {close!r}?)"
+    return f"unexpected argument {word!r}"
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+# Check ChimeraX command scripts without running them. This module runs without
+# ChimeraX; the command signatures are read from a snapshot saved by
+# `clix lint ... save_signatures <file>` in ChimeraX.
+#
+#     python -m chimerax.clix.lint --signatures signatures.json scripts/
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+import json
+import os
+from pathlib import Path
+import sys
+from typing import Iterable, Iterator
+
+from ._script import iter_script_lines
+from .algorithms.validate import Diagnostic, SignatureTable, validate_lines
+
+@dataclass
+class FileDiagnostics:
+    """Problems found in a script file."""
+    path: str
+    diagnostics: list[Diagnostic]
+    error: str | None = None  # the file could not be read
+
+    def to_json(self) -> str:
+        return json.dumps({
+            "path": self.path,
+            "diagnostics": [[d.lineno, d.line, d.message] for d in self.diagnostics],
+            "error": self.error,
+        })
+
+    @classmethod
+    def from_json(cls, line: str) -> FileDiagnostics:
+        d = json.loads(line)
+        return cls(d["path"], [Diagnostic(*each) for each in d["diagnostics"]], d["error"])
+
+def iter_script_files(paths: Iterable[str | Path]) -> Iterator[Path]:
+    """Iterate over the .cxc files in the paths."""
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(path.rglob("*.cxc"))
+        else:
+            yield path
+
+def lint_file(path: str | Path, table: SignatureTable) -> FileDiagnostics:
+    try:
+        diagnostics = list(validate_lines(iter_script_lines(path), table))
+    except (OSError, UnicodeDecodeError) as e:
+        return FileDiagnostics(str(path), [], f"{type(e).__name__}: {e}")
+    return FileDiagnostics(str(path), diagnostics)
+
+def lint_paths(
+    paths: Iterable[str | Path],
+    snapshot: dict[str, dict | None],
+    processes: int | None = None,
+) -> Iterator[FileDiagnostics]:
+    """Check the scripts in a process pool and yield the results as they finish."""
+    files = list(iter_script_files(paths))
+    if processes == 1 or len(files) < 2:
+        table = SignatureTable.from_snapshot(snapshot)
+        for path in files:
+            yield lint_file(path, table)
+        return
+    with ProcessPoolExecutor(
+        max_workers=processes, initializer=_init_worker, initargs=(snapshot,)
+    ) as executor:
+        futures = [executor.submit(_lint_file_in_worker, path) for path in files]
+        for future in as_completed(futures):
+            yield future.result()
+
+_WORKER_TABLE: SignatureTable | None = None
+
+def _init_worker(snapshot: dict[str, dict | None]):
+    global _WORKER_TABLE
+    _WORKER_TABLE = SignatureTable.from_snapshot(snapshot)
+
+def _lint_file_in_worker(path: Path) -> FileDiagnostics:
+    return lint_file(path, _WORKER_TABLE)
+
+def python_executable() -> str:
+    """Python interpreter of ChimeraX, which may not be `sys.executable`."""
+    exe = Path(sys.executable)
+    if exe.name.lower().startswith("python"):
+        return str(exe)
+    for pattern in ("python3*", "python.exe"):
+        for candidate in sorted(exe.parent.glob(pattern)):
+            if candidate.is_file() and os.access(candidate, os.X_OK):
+                return str(candidate)
+    return str(exe)
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m chimerax.clix.lint",
+        description="Check ChimeraX command scripts without running them.",
+    )
+    parser.add_argument("paths", nargs="+", help="script files or directories")
+    parser.add_argument(
+        "--signatures", required=True, help="command signatures saved by `clix lint`"
+    )
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="output JSON lines")
+    args = parser.parse_args(argv)
+
+    with open(args.signatures, encoding="utf-8") as f:
+        snapshot = json.load(f)
+    num_problems = 0
+    for result in lint_paths(args.paths, snapshot, processes=args.processes):
+        num_problems += len(result.diagnostics) + int(result.error is not None)
+        if args.json:
+            print(result.to_json(), flush=True)
+            continue
+        if result.error is not None:
+            print(f"{result.path}: {result.error}", flush=True)
+        for d in result.diagnostics:
+            print(f"{result.path}:{d.lineno}: {d.message}", flush=True)
+    return 1 if num_problems else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 import os
+import threading
 from pathlib import Path
 from ..algorithms import complete_path, complete_model, complete_chain, complete_residue, complete_atom, Context
 from .._types import ChainType, ModelType, WordInfo, CmdDesc
@@ -7,12 +8,144 @@ def test_complete_path():
     cwd = Path(__file__).parent.parent.as_posix()
     os.chdir(cwd)  # cd src
 
-    assert complete_path("al", "open").completions == ["algorithms"]
-    assert complete_path("t", "open").completions == ["tests", "tool.py"]
+    assert complete_path("al", "open").completions == ["algorithms/"]
+    assert complete_path("t", "open").completions == ["tests/", "tool.py"]
 
     # absolute path
-    assert complete_path(f"{cwd}/al", "open").completions == ["algorithms"]
-    assert complete_path(f"{cwd}/t", "open").completions == ["tests", "tool.py"]
+    assert complete_path(f"{cwd}/al", "open").completions == ["algorithms/"]
+    assert complete_path(f"{cwd}/t", "open").completions == ["tests/", "tool.py"]
+
+def test_complete_path_mode(tmp_path: Path):
+    for name in ["a.txt", "b.pdb", "c.map.gz"]:
+        (tmp_path / name).touch()
+    (tmp_path / "d").mkdir()
+    root = f"{tmp_path.as_posix()}/"
+    assert complete_path(root, "save", mode="w").completions == ["a.txt", "b.pdb", "c.map.gz", "d/"]
+    assert complete_path(root, "cd", mode="d").completions == ["d/"]
+    out = complete_path(root, "open", mode="r", suffixes=[".pdb", ".map"])
+    assert out.completions == ["b.pdb", "c.map.gz", "d/", "a.txt"]
+
+def test_complete_path_pending(monkeypatch):
+    from ..algorithms import filepath
+
+    os.chdir(Path(__file__).parent.parent.as_posix())
+    started = threading.Event()
+    done = threading.Event()
+    _orig = filepath._complete_path_impl
+
+    def _slow_impl(last_word, request=None):
+        started.wait(1)
+        return _orig(last_word, request)
+
+    monkeypatch.setattr(filepath, "_complete_path_impl", _slow_impl)
+    # never wait for the listing if the callback is given
+    state = complete_path("algo", "open", callback=done.set, wait=5)
+    assert state.completions == [""]  # "listing ..." row
+    started.set()
+    assert done.wait(1)
+    assert complete_path("algo", "open").completions == ["algorithms/"]
+
+def test_complete_path_unreadable(tmp_path: Path, monkeypatch):
+    from ..algorithms import dircache, filepath
+
+    assert dircache.DirectoryCache().lookup(str(tmp_path / "deleted")) == []
+
+    started = threading.Event()
+    done = threading.Event()
+
+    def _broken_scandir(directory, is_alive=None):
+        started.wait(1)
+        yield "a.pdb", 0
+        raise PermissionError(directory)
+
+    monkeypatch.setattr(dircache, "iter_scandir", _broken_scandir)
+    root = f"{tmp_path.as_posix()}/"
+    assert complete_path(root, "open", callback=done.set).completions == [""]
+    started.set()
+    assert done.wait(1)
+    assert complete_path(root, "open").completions == ["a.pdb"]
+
+    def _raise(last_word, request=None):
+        started.wait(1)
+        raise PermissionError(last_word)
+
+    started.clear()
+    done.clear()
+    monkeypatch.setattr(filepath, "_complete_path_impl", _raise)
+    assert complete_path(f"{root}x", "open", callback=done.set).completions == [""]
+    started.set()
+    assert done.wait(1)
+    assert complete_path(f"{root}x", "open") is None
+
+def test_directory_cache(tmp_path: Path):
+    from ..algorithms.dircache import DirectoryCache, EntryFilter
+
+    for name in ["b.pdb", "a.cif", ".hidden", "ab"]:
+        (tmp_path / name).touch()
+    cache = DirectoryCache()
+
+    def _lookup(cache: DirectoryCache, *args, **kwargs):
+        return [name for name, _ in cache.lookup(str(tmp_path), EntryFilter(*args, **kwargs))]
+
+    assert _lookup(cache) == ["a.cif", "ab", "b.pdb"]
+    assert _lookup(cache, "a") == ["a.cif", "ab"]
+    assert _lookup(cache, ".", include_hidden=True) == [".hidden"]
+    assert _lookup(cache, n=1) == ["a.cif"]
+
+    # new entry changes the directory mtime
+    (tmp_path / "ac").touch()
+    os.utime(tmp_path, ns=(0, os.stat(tmp_path).st_mtime_ns + 10**9))
+    assert _lookup(cache, "a") == ["a.cif", "ab", "ac"]
+
+    # evicted if exceeds the memory cap
+    small_cache = DirectoryCache(max_bytes=1)
+    assert _lookup(small_cache, "b") == ["b.pdb"]
+    assert len(small_cache._listings) == 0
+
+def test_fuzzy_match():
+    from ..algorithms.fuzzy import fuzzy_match, fuzzy_search
+
+    assert fuzzy_match("emd", "maps/emd_1234.map").positions == [5, 6, 7]
+    assert fuzzy_match("xyz", "maps/emd_1234.map") is None
+    # contiguous and boundary matches are preferred
+    top = fuzzy_search("emd12", ["xemdx12", "e/m/d/1/2", "emd_1234.map"], n=2)
+    assert [m.text for m in top] == ["emd_1234.map", "e/m/d/1/2"]
+
+def test_file_index(tmp_path: Path):
+    from .._file_index import FileIndex
+
+    root = tmp_path / "project"
+    (root / "maps" / "sub").mkdir(parents=True)
+    (root / "maps" / "sub" / "emd_1234.map").touch()
+    (root / "maps" / "emd_5678.map").touch()
+    (root / "model.pdb").touch()
+    index = FileIndex(path=tmp_path / "index.json")
+    index.update([root.as_posix()])
+    assert len(index.search("emd")) == 2
+    # narrowed from the last result
+    out = [m.text for m in index.search("emd1234")]
+    assert out == [(root / "maps" / "sub" / "emd_1234.map").as_posix()]
+    assert [m.text for m in index.search("model", n=1)] == [(root / "model.pdb").as_posix()]
+
+    # reload from the saved index
+    (root / "maps" / "emd_0000.map").touch()
+    index = FileIndex(path=tmp_path / "index.json")
+    index.update([root.as_posix()])
+    assert len(index.search("emd")) == 3
+
+def test_fetch_cache_index(tmp_path: Path):
+    from .._fetch_cache import FetchCacheIndex
+
+    cache_dir = tmp_path / "ChimeraX"
+    for db, name in [("PDB", "7abc.cif"), ("PDB", "7abd.pdb"), ("EMDB", "emd_1234.map")]:
+        (cache_dir / db).mkdir(parents=True, exist_ok=True)
+        (cache_dir / db / name).write_text("x")
+    index = FetchCacheIndex(path=tmp_path / "index.json")
+    # missing or unreadable cache directories are skipped
+    index.update([(tmp_path / "missing").as_posix(), cache_dir.as_posix()])
+    assert [e.spec for e in index.search("7AB")] == ["7abc", "7abd"]
+    assert [e.spec for e in index.search("emdb:12")] == ["emdb:1234"]
+    assert index.search("emdb:12")[0].describe().startswith("local, 1 B")
 
 def get_context():
     models = [
@@ -66,6 +199,85 @@ def test_complete_atom():
     out = complete_atom(ctx, "@C", "show")
     assert out.completions == ["@Ca", "@Cb", "@C"]
 
+def test_keyword_value_index():
+    from ..algorithms.core import complete_keyword_value
+    from ..algorithms.keyword_values import KeywordValueIndex
+
+    class FloatArg:
+        pass
+
+    class StringArg:
+        pass
+
+    index = KeywordValueIndex(max_values=2)
+    index.add("volume #1 level 0.012 style mesh", 1.0)
+    index.add("volume #2 level 0.02\nvolume #2 level 0.012", 2.0)
+    index.add("volume #1 level 1.5", 0.0)
+    index.add("surface dust #1 size 10", 1.0)
+    assert index.values("volume", "level") == ["0.012", "0.02"]
+    assert index.values("volume", "Style") == ["mesh"]
+    assert index.values("surface dust", "size") == ["10"]
+
+    ctx = Context(keyword_values=index.values)
+    out = complete_keyword_value(FloatArg, "0.0", "volume", ctx, keyword="level")
+    assert out.completions == ["0.012", "0.02"]
+    out = complete_keyword_value(StringArg, "", "volume", ctx, keyword="style")
+    assert out.completions == ["mesh"]
+    assert complete_keyword_value(FloatArg, "", "volume", ctx, keyword="style") is None
+    assert complete_keyword_value(FloatArg, "", "volume", ctx) is None
+
+def test_run_batch():
+    from .._batch import run_batch
+
+    ran = []
+
+    def _run(line: str):
+        if line.startswith("bad"):
+            raise ValueError(f"cannot run {line!r}")
+        ran.append(line)
+
+    code = "open 1abc\n\nbad 1\ncartoon\nbad 2\nhide atoms"
+    result = run_batch(code, _run, on_error="stop")
+    assert ran == ["open 1abc"]
+    assert [r.lineno for r in result.errors] == [3]
+    assert result.num_skipped == 3
+
+    ran.clear()
+    result = run_batch(code, _run, on_error="continue")
+    assert ran == ["open 1abc", "cartoon", "hide atoms"]
+    assert [r.lineno for r in result.errors] == [3, 5]
+    assert "2 failed" in result.to_html()
+
+def test_run_script(tmp_path: Path):
+    import json
+    import pytest
+    from .._script import run_script
+
+    script = tmp_path / "script.cxc"
+    script.write_text("\n".join(f"turn y {i}" for i in range(1000)) + "\n\nbad\nclose\n")
+    ran = []
+
+    def _run(line: str):
+        if line == "bad":
+            raise ValueError(line)
+        ran.append(line)
+
+    with pytest.raises(ValueError):
+        run_script(script, _run, top=3, output=tmp_path / "profile.json")
+    assert len(ran) == 1000
+    rows = json.loads((tmp_path / "profile.json").read_text())
+    assert len(rows) == 1001
+    assert rows[-1] == {"lineno": 1002, "line": "bad", "wall": rows[-1]["wall"], "ok": False}
+
+    script.write_text("\n".join(f"turn y {i}" for i in range(100)))
+    profile = run_script(script, _run, top=3, output=tmp_path / "profile.csv")
+    assert profile.num_lines == 100
+    assert len(profile.slowest) == 3
+    walls = [r.wall for r in profile.slowest]
+    assert walls == sorted(walls, reverse=True)
+    assert (tmp_path / "profile.csv").read_text().splitlines()[1].startswith("1,turn y 0,")
+    assert run_script(script, _run, top=0).slowest == []
+
 def test_future_annotation():
     """Test all the files start with `from __future__ import annotations`"""
     
@@ -81,3 +293,143 @@ def test_future_annotation():
         with path.open("r", encoding="utf-8") as f:
             line = f.readline()
             assert line.strip() == "from __future__ import annotations", f"File {path} does not start with `from __future__ import annotations`"
+
+def test_validate_lines():
+    from ..algorithms.validate import SignatureTable, validate_lines
+    from .._batch import iter_lines
+
+    class FloatArg:
+        pass
+
+    class NoArg:
+        pass
+
+    class EnumOf:
+        def __init__(self, values):
+            self.values = values
+
+    class ObjectsArg:
+        name = "an objects specifier"
+
+    class RestOfLine:
+        pass
+
+    class WholeRestOfLine:
+        pass
+
+    class StringArg:
+        pass
+
+    class _CmdDesc(CmdDesc):
+        function = None
+
+    commands = {
+        "volume": WordInfo(cmd_desc=_CmdDesc.construct(
+            optional={"spec": ObjectsArg},
+            keyword={"level": FloatArg, "style": EnumOf(["surface", "mesh"])},
+        )),
+        "turn": WordInfo(cmd_desc=_CmdDesc.construct(
+            required={"axis": EnumOf(["x", "y", "z"])},
+            optional={"angle": FloatArg},
+            keyword={"center": FloatArg},
+        )),
+        "cartoon": WordInfo(cmd_desc=_CmdDesc.construct(keyword={"hide": NoArg})),
+        "fitmap": WordInfo(cmd_desc=CmdDesc.construct()),  # not resolved
+        "echo": WordInfo(cmd_desc=_CmdDesc.construct(optional={"text": RestOfLine})),
+        "alias": WordInfo(cmd_desc=_CmdDesc.construct(
+            required={"name": StringArg}, optional={"text": WholeRestOfLine},
+        )),
+        "~alias": WordInfo(cmd_desc=CmdDesc.construct()),
+    }
+    code = "\n".join([
+        "volume #1 & protein level 0.5 style mesh",  # ok
+        "volume #1 levle 0.5",  # misspelled keyword after a specifier
+        "volume #1 style cube level x",  # bad enum and number
+        "trun y 90",  # unknown command
+        "turn",  # missing required argument
+        "turn y 90 20",  # too many arguments
+        "turn y 90 centre 1; cartoon hide",  # misspelled keyword after positionals
+        "# comment",
+        "fitmap #1 inMap #2 anything",  # only the name is checked
+        "cartoon hide level",
+        "echo don't panic C:\\data\\x.pdb",  # quotes inside a token and backslashes
+        'echo "unclosed',
+        "alias myc color #1 red",
+        "myc",  # defined above
+        "~alias myc",
+        "myc",
+        'echo "a; b"; turn x',  # semicolon in a quoted string
+        "alias foo turn x; trun y",  # semicolon in the whole rest of line
+        "foo",
+        "echo a; trun y",
+    ])
+    table = SignatureTable.from_commands(commands)
+    diagnostics = list(validate_lines(iter_lines(code), table))
+    assert [d.lineno for d in diagnostics] == [2, 3, 3, 4, 5, 6, 7, 10, 12, 16, 20]
+    assert "did you mean 'level'" in diagnostics[0].message
+    assert "did you mean 'turn'" in diagnostics[3].message
+    assert "did you mean 'center'" in diagnostics[6].message
+
+    snapshot = SignatureTable.from_snapshot(table.to_snapshot())
+    assert [str(d) for d in validate_lines(iter_lines(code), snapshot)] == [
+        str(d) for d in diagnostics
+    ]
+
+def test_lint(tmp_path: Path, capsys):
+    import json
+    from ..algorithms.validate import SignatureTable
+    from ..lint import lint_paths, main
+
+    class IntArg:
+        pass
+
+    class _CmdDesc(CmdDesc):
+        function = None
+
+    commands = {
+        "wait": WordInfo(cmd_desc=_CmdDesc.construct(optional={"frames": IntArg})),
+        "close": WordInfo(cmd_desc=CmdDesc.construct()),
+    }
+    snapshot = SignatureTable.from_commands(commands).to_snapshot()
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.cxc").write_text("wait 10\nclose\n")
+    (tmp_path / "sub" / "b.cxc").write_text("wait x\n\nclsoe\n")
+    (tmp_path / "c.txt").write_text("not a script\n")
+
+    results = sorted(lint_paths([tmp_path], snapshot, processes=2), key=lambda r: r.path)
+    assert [Path(r.path).name for r in results] == ["a.cxc", "b.cxc"]
+    assert results[0].diagnostics == []
+    assert [d.lineno for d in results[1].diagnostics] == [1, 3]
+    assert "did you mean 'close'" in results[1].diagnostics[1].message
+
+    (tmp_path / "signatures.json").write_text(json.dumps(snapshot))
+    assert main(["--signatures", str(tmp_path / "signatures.json"), str(tmp_path)]) == 1
+    out = capsys.readouterr().out.splitlines()
+    assert out == [
+        f"{tmp_path / 'sub' / 'b.cxc'}:1: 'x' is not an integer",
+        f"{tmp_path / 'sub' / 'b.cxc'}:3: {results[1].diagnostics[1].message}",
+    ]
+
+
+def test_lint_without_qt():
+    import subprocess
+    import sys
+
+    # the headless linter must not import Qt
+    package = __package__.rsplit(".", 1)[0]
+    code = f"import sys; sys.modules['qtpy'] = None; import {package}.lint"
+    cwd = Path(__file__).parent.parent.parent
+    subprocess.run([sys.executable, "-c", code], cwd=cwd, check=True)
+
+def test_command_trie():
+    from ..algorithms.command_trie import CommandTrie, iter_words
+
+    trie = CommandTrie(["volume", "volume color", "toolshed list", "2dlabels arrow"])
+    assert trie.longest_match(["volume", "color", "#1"]) == "volume color"
+    assert trie.longest_match(["toolshed", "install"]) is None
+    assert trie.current_command("volume") is None
+    assert trie.current_command("volume ") == "volume"
+    assert trie.current_command("  volume col") == "volume"
+    assert trie.current_command("volume color ") == "volume color"
+    assert trie.current_command("volume  color ") == "volume"
+    assert list(iter_words(" a  bc ")) == [(1, "a"), (4, "bc")]
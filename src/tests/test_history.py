@@ -0,0 +1,372 @@
+from pathlib import Path
+from .._history import CommandHistory, record_score
+from .._history_store import HistoryStore, code_key
+
+def _load(tmp_path: Path, **kwargs) -> CommandHistory:
+    store = HistoryStore(tmp_path / "history", **kwargs)
+    return CommandHistory.load(store, max_size=kwargs.get("max_records", 100_000))
+
+def test_store_reload(tmp_path: Path):
+    hist = _load(tmp_path)
+    for code in ["open 1abc", "show", "open 1abc", "hide"]:
+        hist.record(code)
+    assert list(hist) == ["show", "open 1abc", "hide"]
+    hist._store.close()
+    hist = _load(tmp_path)
+    assert list(hist) == ["show", "open 1abc", "hide"]
+    assert hist[0] == "show"
+    assert hist[-1] == "hide"
+
+def test_store_segments_and_retention(tmp_path: Path):
+    hist = _load(tmp_path, segment_bytes=200, max_records=50, cache_size=4)
+    for i in range(200):
+        hist.record(f"turn y {i}")
+    assert len(list((tmp_path / "history").glob("*.idx"))) > 2
+    assert 50 <= len(hist) < 200
+    assert hist[-1] == "turn y 199"
+    assert hist[-50] == "turn y 150"
+    hist._store.close()
+    hist = _load(tmp_path, segment_bytes=200, max_records=50)
+    assert list(hist)[-50:] == [f"turn y {i}" for i in range(150, 200)]
+
+def test_store_retention_counts_codes(tmp_path: Path):
+    hist = _load(tmp_path, segment_bytes=200, max_records=50)
+    hist.record("open 1abc")
+    for i in range(500):
+        hist.record(f"turn y {i % 10}")
+    assert list(hist) == ["open 1abc"] + [f"turn y {i}" for i in range(10)]
+    assert hist._store.end_index() - hist._store.first_index() <= 100
+    hist._store.close()
+    hist = _load(tmp_path, segment_bytes=200, max_records=50)
+    assert list(hist) == ["open 1abc"] + [f"turn y {i}" for i in range(10)]
+
+def test_store_broken_record(tmp_path: Path):
+    hist = _load(tmp_path)
+    hist.record("show")
+    hist._store.close()
+    # index entry written but data lost in a crash
+    data_file = next((tmp_path / "history").glob("*.jsonl"))
+    with (tmp_path / "history" / f"{data_file.stem}.idx").open("ab") as f:
+        f.write((10_000).to_bytes(8, "little") * 2 + b"\x00\x00")
+    hist = _load(tmp_path)
+    assert list(hist) == ["show"]
+    hist.record("hide")
+    assert list(hist) == ["show", "hide"]
+
+def test_prepend_and_save(tmp_path: Path):
+    hist = _load(tmp_path)
+    hist.record("show")
+    hist.prepend_unique("hide")
+    hist.prepend_unique("show")
+    assert list(hist) == ["show", "hide"]
+    hist.save()
+    hist._store.close()
+    hist = _load(tmp_path)
+    assert list(hist) == ["show", "hide"]
+
+def test_order_persists(tmp_path: Path):
+    hist = _load(tmp_path)
+    hist.record("turn y 0")
+    hist.record("turn y 1")
+    hist.record("turn y 2")
+    hist.prepend_unique("foo")
+    del hist[2]
+    hist[1] = "bar"
+    assert list(hist) == ["foo", "bar", "turn y 2"]
+    hist._store.close()
+    hist = _load(tmp_path)
+    assert list(hist) == ["foo", "bar", "turn y 2"]
+
+def test_legacy_migration(tmp_path: Path):
+    (tmp_path / "history.json").write_text('["show", "hide", "show"]')
+    hist = CommandHistory.load(
+        HistoryStore(tmp_path / "history"),
+        legacy_files=(tmp_path / "history.json",),
+    )
+    assert list(hist) == ["show", "hide"]
+
+def test_prefix_index():
+    from ..algorithms.prefix_index import PrefixIndex
+
+    index = PrefixIndex()
+    for i, code in enumerate(["lighting soft", "lighting flat\nshow", "light", "color red"]):
+        index.add(code, i)
+    assert index.lookup("l") == "light"
+    assert index.lookup("lighting") == "lighting flat"
+    assert index.lookup("lighting s") == "lighting soft"
+    assert index.lookup("lighting x") is None
+    assert index.lookup("lighting xy") is None
+    assert index.lookup("sh") == "show"
+    index.add("lighting full", 4)
+    assert index.lookup("lighting") == "lighting full"
+    assert index.lookup("lighting f") == "lighting full"
+    assert index.lookup("lighting fl") == "lighting flat"
+    assert index.lookup("") == "lighting full"
+
+def test_frecency(tmp_path: Path):
+    from ..algorithms.prefix_index import PrefixIndex, frecency_weight
+
+    day = 24 * 3600
+    index = PrefixIndex()
+    for _ in range(400):
+        index.add("lighting soft", frecency_weight(10 * day))
+    index.add("lighting flat", frecency_weight(11 * day))
+    assert index.lookup("lighting") == "lighting soft"
+    index.add("lighting flat", frecency_weight(400 * day))
+    assert index.lookup("lighting") == "lighting flat"
+
+    # scores are saved with the history
+    hist = _load(tmp_path)
+    for code in ["show", "hide", "show"]:
+        hist.record(code)
+    scores = {r["code"]: record_score(r) for r in hist.iter_records()}
+    assert scores["show"] > scores["hide"] > frecency_weight(0)
+
+def test_rebuild_index_twice(tmp_path: Path, monkeypatch):
+    import threading
+    from .. import _history
+    from .._preference import Preference
+
+    monkeypatch.setattr(_history, "load_preference", lambda force=False: Preference())
+    monkeypatch.setattr(_history, "CLIX_HISTORY_FILE", tmp_path / "history.json")
+    monkeypatch.setattr(_history, "CLIX_HISTORY_DIR", tmp_path / "history")
+    monkeypatch.setattr(_history.HistoryManager, "_instance", None)
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    manager = _history.HistoryManager()
+    manager._history.record("lighting soft")
+    # both builds wait until the history is loaded and then finish together
+    loaded = threading.Event()
+    wait_loaded = manager._history.wait_loaded
+    monkeypatch.setattr(manager._history, "wait_loaded", lambda: (loaded.wait(), wait_loaded()))
+    manager.rebuild_index()
+    manager.rebuild_index()
+    manager._add_to_index("lighting flat", 1e9)
+    loaded.set()
+    for thread in threading.enumerate():
+        if thread.name == "clix-history-index":
+            thread.join()
+    assert errors == []
+    assert manager._pending_codes is None
+    assert manager.suggest("lighting ") == "flat"
+    assert manager.suggest("lighting s") == "oft"
+    manager._history._store.close()
+
+def test_cursor(tmp_path: Path):
+    hist = _load(tmp_path)
+    for code in ["a", "b", "c", "b"]:
+        hist.record(code)
+    assert list(hist) == ["a", "c", "b"]
+    assert "c" in hist and "d" not in hist
+
+    cursor = hist.cursor(last="d")
+    assert [cursor.prev() for _ in range(5)] == ["d", "b", "c", "a", "a"]
+    assert cursor.next() == "c"
+    assert cursor.next() == "b"
+    assert cursor.next() == "d"
+    assert cursor.next() is None
+
+    # the cursor restarts when the history is modified
+    cursor = hist.cursor()
+    assert cursor.prev() == "b"
+    hist.record("a")
+    assert cursor.prev() == "b"
+    assert cursor.prev() == "c"
+
+def test_history_filter():
+    from ..algorithms.history_filter import HistoryFilter
+
+    texts = ["open 1abc", "color red", "open 2xyz.pdb", "surface #1", "open 1abd"]
+    engine = HistoryFilter(texts)
+    assert engine.run("startswith", "open") == [0, 2, 4]
+    assert engine.run("startswith", "open 1") == [0, 4]
+    assert engine.run("startswith", "open 1abc") == [0]
+    assert engine.run("startswith", "op") == [0, 2, 4]
+    assert engine.run("endswith", "pdb") == [2]
+    assert engine.run("contains", "ab") == [0, 4]
+    assert engine.run("contains", "1ab") == [0, 4]
+    assert engine.run("contains", "1abd") == [4]
+    assert engine.run("contains", "e") == [0, 1, 2, 3, 4]
+    assert engine.run("regex", "open .*\\.pdb") == [2]
+    assert engine.run("regex", "colou?r") == [1]
+    assert engine.run("regex", "(col|sur)") == [1, 3]
+
+def test_history_filter_fuzzy():
+    from ..algorithms.history_filter import HistoryFilter
+
+    texts = ["surface #3 zone 2.5", "surf zone", "color red", "surface #1", "sz"]
+    engine = HistoryFilter(texts)
+    assert engine.run("fuzzy", "surfzone") == [0, 1]  # best match comes last
+    assert engine.positions(1) == [0, 1, 2, 3, 5, 6, 7, 8]
+    # terms in the wrong order
+    assert engine.run("fuzzy", "surf zone 2.5 #3") == [0]
+    assert engine.positions(0) == [0, 1, 2, 3, 8, 9, 11, 12, 13, 14, 16, 17, 18]
+    assert engine.run("fuzzy", "srf #") == [0, 3]
+    assert engine.run("fuzzy", "clr") == [2]
+
+def test_history_filter_while_building(monkeypatch):
+    import threading
+    from ..algorithms import history_filter
+    from ..algorithms.history_filter import HistoryFilter
+
+    texts = ["open 1abc", "color red", "open 2xyz.pdb", "surface #1", "open 1abd"]
+    engine = HistoryFilter(texts)
+    engine._build_thread = threading.Thread()  # indexes are not ready yet
+    assert engine.run("startswith", "open 1") == [0, 4]
+    assert engine.run("endswith", "pdb") == [2]
+    assert engine.run("contains", "1ab") == [0, 4]
+    assert engine.run("regex", "open .*\\.pdb") == [2]
+    assert engine.run("fuzzy", "srf") == [3]
+    assert engine._trigrams is None and engine._char_masks is None
+
+    monkeypatch.setattr(history_filter, "FUZZY_MAX_CANDIDATES", 2)
+    engine = HistoryFilter(texts)
+    engine.build_async()
+    engine.wait_built()
+    assert sorted(engine.run("fuzzy", "o")) == [2, 4]  # only the newest matches
+    assert sorted(engine.run("fuzzy", "op 1")) == [0, 4]
+    assert engine.run("fuzzy", "op 1c") == [0]
+
+def test_sqlite_shared(tmp_path: Path):
+    from .._history_store import SQLiteHistoryStore
+
+    hist0 = CommandHistory.load(SQLiteHistoryStore(tmp_path / "history.sqlite"))
+    hist1 = CommandHistory.load(SQLiteHistoryStore(tmp_path / "history.sqlite"))
+    hist0.record("show")
+    hist1.record("hide")
+    hist0.record("open 1abc")
+    assert list(hist0) == ["show", "open 1abc"]
+    hist0._store.sync()
+    # records are read in the writer thread and picked up by the next refresh
+    assert hist1.refresh() == []
+    hist1._store.sync()
+    assert [r["code"] for r in hist1.refresh()] == ["show", "open 1abc"]
+    assert list(hist1) == ["hide", "show", "open 1abc"]
+    assert hist0.refresh() == []
+    hist0._store.sync()
+    assert [r["code"] for r in hist0.refresh()] == ["hide"]
+    assert list(hist0) == ["show", "open 1abc", "hide"]
+
+    # rewriting in one process reloads the other
+    hist0._store.sync()
+    hist1.save()
+    assert hist0.refresh() == []  # read before rewriting
+    hist0._store.sync()
+    assert hist0.refresh() is None
+    assert list(hist0) == ["hide", "show", "open 1abc"]
+    hist0._store.close()
+    hist1._store.close()
+
+def test_sqlite_retention(tmp_path: Path):
+    from .._history_store import SQLiteHistoryStore
+
+    store = SQLiteHistoryStore(tmp_path / "history.sqlite", max_records=5)
+    hist = CommandHistory.load(store, max_size=5)
+    hist.record("open 1abc")
+    for i in range(30):
+        hist.record(f"turn y {i % 3}")
+        store.sync()
+    assert store._num_rows <= 10
+    assert hist.refresh() is None  # compacted
+    assert list(hist) == ["open 1abc", "turn y 0", "turn y 1", "turn y 2"]
+    store.close()
+    hist = CommandHistory.load(SQLiteHistoryStore(tmp_path / "history.sqlite"))
+    assert list(hist) == ["open 1abc", "turn y 0", "turn y 1", "turn y 2"]
+    hist._store.close()
+
+def test_migrate_to_sqlite(tmp_path: Path):
+    from .._history_store import SQLiteHistoryStore
+
+    hist = _load(tmp_path)
+    for code in ["show", "hide", "show"]:
+        hist.record(code)
+    hist._store.close()
+    hist = CommandHistory.load(
+        SQLiteHistoryStore(tmp_path / "history.sqlite"),
+        legacy_store=HistoryStore(tmp_path / "history"),
+    )
+    assert list(hist) == ["hide", "show"]
+    hist._store.close()
+
+def test_merge(tmp_path: Path):
+    hist = _load(tmp_path)
+    for code in ["a", "b", "c"]:
+        hist.record(code)
+    assert hist.merge(["d", "b", "e"]) == 2
+    assert list(hist) == ["a", "c", "d", "b", "e"]
+    assert hist.merge(["f", "a"], prepend=True) == 1
+    assert list(hist) == ["a", "f", "c", "d", "b", "e"]
+    hist._store.close()
+    assert list(_load(tmp_path)) == ["a", "f", "c", "d", "b", "e"]
+
+def test_iter_json_array(tmp_path: Path):
+    import json
+    from .._utils import iter_json_array
+
+    data = [[f"turn y {i}", i % 3 != 0] for i in range(100)]
+    (tmp_path / "commands").write_text(json.dumps(data, indent=1))
+    assert list(iter_json_array(tmp_path / "commands", chunk_size=7)) == data
+
+def test_command_timing(tmp_path: Path):
+    from .._timing import CommandTimingLog
+
+    log = CommandTimingLog(tmp_path / "timing.jsonl", max_bytes=4096)
+    log.record("open 1abc", 0.5, True)
+    log.record("open 2xyz", 1.5, True)
+    log.record("color red", 0.001, True)
+    log.record("color xxx", 0.002, False)
+    stats = log.stats(top=2)
+    assert [e.line for e in stats.slowest] == ["open 2xyz", "open 1abc"]
+    assert [s.name for s in stats.per_command] == ["open", "color"]
+    assert stats.per_command[1].num_errors == 1
+    assert stats.histogram == [2, 0, 1, 1, 0]
+
+    hist = _load(tmp_path)
+    hist.record("open 1abc", wall=0.5)
+    assert hist._store.get(hist._entries[code_key("open 1abc")])["wall"] == 0.5
+
+    for i in range(200):
+        log.record(f"turn y {i}", 0.01, True)
+    log.close()
+    assert (tmp_path / "timing.jsonl").stat().st_size <= 4096
+    assert list(log.iter_entries())[-1].line == "turn y 199"
+
+def test_next_command_model():
+    from ..algorithms.next_command import NextCommandModel, command_signature
+
+    assert command_signature("volume #1 level 0.5 color red") == "volume color= level="
+    assert command_signature("open x.pdb") == "open"
+    assert command_signature("hide atoms") == "hide atoms"
+    assert command_signature("# comment") == ""
+
+    model = NextCommandModel(max_candidates=3)
+    for i in range(3):
+        model.add(f"open {i}.pdb\nhide atoms", float(i))
+        model.add("cartoon", float(i))
+        model.add(f"volume #{i} level 0.{i}", float(i))
+        model.add("surface dust #1 size 10", float(i))
+    model.add("open new.pdb", 10.0)
+    assert model.predict()[0] == "hide atoms"
+    model.add("hide atoms", 10.0)
+    assert model.predict()[0] == "cartoon"
+    model.add("volume #3 level 0.3", 10.0)
+    assert model.predict()[0] == "surface dust #1 size 10"
+    assert len(model.predict()) <= 3
+
+def test_next_command_model_from_log(tmp_path: Path):
+    from .._history import next_command_model_from_log
+    from .._timing import CommandTimingLog
+
+    log = CommandTimingLog(tmp_path / "timing.jsonl")
+    for i in range(3):
+        log.record(f"open {i}.pdb", 0.1, True)
+        log.record("hide atoms", 0.1, True)
+        log.record("cartoon", 0.1, True)
+    log.record("open 3.pdb", 0.1, True)
+    log.record("bad command", 0.1, False)
+    end = log.end_offset()
+    log.record("lighting soft", 0.1, True)
+    # the deduplicated history would put "open 3.pdb" last
+    model = next_command_model_from_log(log, end)
+    assert model.predict()[0] == "hide atoms"
+    log.close()
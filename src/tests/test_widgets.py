@@ -1,4 +1,6 @@
+from dataclasses import replace
 from ..widgets import QCommandLineEdit
+from ..algorithms.command_trie import CommandTrie
 from .._types import Mode
 from qtpy import QtWidgets as QtW, QtCore
 
@@ -49,3 +51,171 @@ def test_switching_mode(qtbot):
     assert widget._mode is Mode.CLI
     widget.insertPlainText("/")
     assert widget._mode is Mode.RECENT
+
+def test_bulk_paste(qtbot):
+    from ..widgets.cli_widget import BULK_PASTE_LINES
+
+    widget = _get_widget()
+    qtbot.addWidget(widget)
+    widget.show()
+    highlighter = widget._highlighter
+    calls = []
+    _highlight_block = highlighter.highlightBlock
+
+    def _spy(text: str):
+        if not highlighter._suspended:
+            calls.append(text)
+        _highlight_block(text)
+
+    highlighter.highlightBlock = _spy
+    text = "\n".join(f"turn y {i}" for i in range(BULK_PASTE_LINES * 4))
+    widget._insert_pasted_text(text)
+    assert widget.toPlainText() == text
+    num_visible = len(calls)
+    assert 0 < num_visible < BULK_PASTE_LINES
+    qtbot.waitUntil(lambda: highlighter._next_block is None)
+    assert len(calls) == num_visible + BULK_PASTE_LINES * 4
+
+def test_command_queue(qtbot):
+    from .._batch import run_batch
+    from ..widgets.command_queue import QCommandQueue
+
+    ran = []
+
+    def _run(line: str):
+        if line == "bad":
+            raise ValueError("bad line")
+        if line == "cancel":
+            queue.cancel()
+        ran.append(line)
+
+    queue = QCommandQueue(_run, lambda code, on_error: run_batch(code, _run, on_error))
+    finished = []
+    queue.finished.connect(finished.append)
+    queue.submit("a\nb\n\nc")
+    queue.submit("d\nbad\ne")
+    queue.submit("f\ng", batch_on_error="continue")
+    assert ran == []  # nothing runs until the event loop turns
+    qtbot.waitUntil(lambda: not queue.is_running())
+    assert ran == ["a", "b", "c", "d", "f", "g"]
+    assert [q.ok for q in finished] == [True, False, True]
+    assert [r.lineno for r in finished[0].results] == [1, 2, 4]
+    assert finished[1].num_cancelled == 1
+
+    ran.clear()
+    finished.clear()
+    queue.submit("a\ncancel\nb")
+    queue.submit("c")
+    qtbot.waitUntil(lambda: not queue.is_running())
+    assert ran == ["a", "cancel"]
+    assert len(finished) == 1
+    assert not finished[0].ok
+    queue.submit("x\ny")
+    qtbot.waitUntil(lambda: not queue.is_running())
+    assert ran == ["a", "cancel", "x", "y"]
+
+def test_highlighter_tokens(qtbot):
+    from .._types import WordInfo, CmdDesc
+
+    class FloatArg:
+        pass
+
+    class _CmdDesc(CmdDesc):
+        function = None
+
+    commands = {
+        "volume": WordInfo(cmd_desc=_CmdDesc.construct(keyword={"level": FloatArg})),
+        "toolshed list": WordInfo(cmd_desc=CmdDesc.construct()),
+    }
+    widget = QCommandLineEdit(commands, Session(), load_preference())
+    qtbot.addWidget(widget)
+    highlighter = widget._highlighter
+    assert highlighter._tokenize("volume #1  level 0.5") == (
+        (0, 6, "command"), (7, 2, "model"), (11, 5, "keyword"), (17, 3, "number"),
+    )
+    assert highlighter._tokenize("toolshed list 1") == (
+        (0, 8, "command"), (9, 4, "command"), (14, 1, "number"),
+    )
+    assert highlighter._tokenize("# volume") == ((0, 8, "comment"),)
+    assert highlighter._tokenize("volume?") == ((0, 6, "command"),)
+
+    widget.setPlainText("volume #1 level 0.5")
+    spans = highlighter._spans["volume #1 level 0.5"]
+    highlighter.rehighlight()
+    assert highlighter._spans["volume #1 level 0.5"] is spans
+
+    # aliases update the commands
+    widget._commands = {"vol": WordInfo(cmd_desc=CmdDesc.construct())}
+    widget._command_trie = CommandTrie(widget._commands.keys())
+    highlighter.rehighlight()
+    assert list(highlighter._spans) == ["volume #1 level 0.5"]
+    assert highlighter._spans["volume #1 level 0.5"][0] == (7, 2, "model")
+
+def test_preference_store(qtbot, tmp_path):
+    import json
+    import os
+    from .._preference import PreferenceStore, ColorTheme
+    from ..widgets._theme import QPreferenceNotifier, theme_colors
+
+    path = tmp_path / "preferences.json"
+    store = PreferenceStore(path)
+    changes = []
+    store.connect(changes.append)
+    pref = store.get()
+    assert store.get() is pref
+    assert path.exists()
+
+    # edited by another instance
+    js = json.loads(path.read_text())
+    js["show_label"] = not pref.show_label
+    path.write_text(json.dumps(js))
+    os.utime(path, ns=(0, 0))
+    new = store.get()
+    assert new.show_label is not pref.show_label
+    assert changes == [new]
+
+    saved = store.save(show_label=pref.show_label, area=None)
+    assert saved.area == pref.area
+    assert changes == [new, saved]
+    assert store.save(show_label=pref.show_label) == saved
+    assert len(changes) == 2
+    assert PreferenceStore(path).get() == saved
+
+    # widgets are restyled by the notification
+    widget = _get_widget()
+    qtbot.addWidget(widget)
+    theme = ColorTheme(command="#010203")
+    QPreferenceNotifier.instance().changed.emit(replace(widget._preference, color_theme=theme))
+    assert widget._preference.color_theme is theme
+    assert widget._highlighter._formats["command"].foreground().color().name() == "#010203"
+    assert theme_colors(ColorTheme(command="#010203"))["command"] is theme_colors(theme)["command"]
+
+def test_path_fallback_mode(qtbot, monkeypatch):
+    from .._types import WordInfo, CmdDesc
+    from ..widgets import popups
+
+    class OpenFileNameArg:
+        check_existence = True
+
+    class _CmdDesc(CmdDesc):
+        function = None
+
+    commands = {
+        "mycmd": WordInfo(cmd_desc=_CmdDesc.construct(
+            required={"name": OpenFileNameArg},
+        )),
+    }
+    widget = QCommandLineEdit(commands, Session(), load_preference())
+    qtbot.addWidget(widget)
+    calls = []
+
+    def _complete_path(last_word, current_command, callback=None, **kwargs):
+        calls.append(kwargs)
+
+    monkeypatch.setattr(popups, "complete_path", _complete_path)
+    monkeypatch.setattr(popups, "complete_keyword_name_or_value", lambda **kwargs: None)
+    monkeypatch.setattr(popups._inj, "chimerax_open_suffixes", lambda session: [".pdb"])
+    widget._current_popup()._get_completion_list("mycmd x")
+    assert calls == [{"mode": "r", "suffixes": [".pdb"]}]
+    widget._current_popup()._get_completion_list("mycmd x y")
+    assert calls[-1] == {"mode": "", "suffixes": []}
@@ -5,6 +5,10 @@ from qtpy import QtWidgets as QtW
 from .user_data import init_log
 from .widgets import QCommandLineEdit, QShowHistoryButton, QShowDialogButton
 from ._preference import load_preference
+from ._file_index import FileIndex
+from ._fetch_cache import FetchCacheIndex
+from ._injection import chimerax_fetch_cache_dirs
+from ._history import HistoryManager
 
 class ClixTool(ToolInstance):
     SESSION_ENDURING = False
@@ -26,6 +30,10 @@ class ClixTool(ToolInstance):
         if self._preference.auto_focus:
             session.ui.register_for_keystrokes(self._clix_widget)
         init_log()
+        HistoryManager.instance().load_async()
+        if self._preference.file_index_roots:
+            FileIndex.instance().start(self._preference.file_index_roots)
+        FetchCacheIndex.instance().start(chimerax_fetch_cache_dirs())
 
     def _build_ui(self):
         layout = QtW.QHBoxLayout()
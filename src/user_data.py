@@ -5,8 +5,13 @@ from platformdirs import user_data_dir
 
 CLIX_DATA_DIR = Path(user_data_dir("chimerax-clix"))
 CLIX_HISTORY_FILE = CLIX_DATA_DIR / "history.json"
+CLIX_HISTORY_DIR = CLIX_DATA_DIR / "history"
+CLIX_HISTORY_DB_FILE = CLIX_DATA_DIR / "history.sqlite"
+CLIX_TIMING_LOG_FILE = CLIX_DATA_DIR / "timing.jsonl"
 CLIX_PREFERENCE_FILE = CLIX_DATA_DIR / "preferences.json"
 CLIX_LOG_PATH = CLIX_DATA_DIR / "clix.log"
+CLIX_FILE_INDEX_FILE = CLIX_DATA_DIR / "file_index.json"
+CLIX_FETCH_CACHE_FILE = CLIX_DATA_DIR / "fetch_cache.json"
 
 CHIMERAX_DIR = Path(user_data_dir("ChimeraX", "UCSF"))
 COMMAND_HISTORY_PATH = CHIMERAX_DIR / "commands"
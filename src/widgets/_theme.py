@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from dataclasses import astuple, fields
+from qtpy import QtCore, QtGui
+
+from .._preference import ColorTheme, Preference, PreferenceStore
+
+class QPreferenceNotifier(QtCore.QObject):
+    """Forward the preference changes to the widgets in the main thread.
+
+    The preference store may find a change in any thread. Connecting widgets to the
+    signal of this object delivers the change in the thread of the widgets, and
+    the connections are removed when the widgets are deleted.
+    """
+
+    changed = QtCore.Signal(object)
+
+    _instance: QPreferenceNotifier | None = None
+
+    @classmethod
+    def instance(cls) -> QPreferenceNotifier:
+        """Return the singleton instance of the class."""
+        if cls._instance is None:
+            cls._instance = cls()
+            PreferenceStore.instance().connect(cls._instance._emit)
+        return cls._instance
+
+    def _emit(self, preference: Preference):
+        self.changed.emit(preference)
+
+def theme_colors(theme: ColorTheme) -> dict[str, QtGui.QColor]:
+    """QColor of each field, created once for each color theme."""
+    key = astuple(theme)
+    if (colors := _COLORS.get(key)) is None:
+        colors = {f.name: QtGui.QColor(getattr(theme, f.name)) for f in fields(theme)}
+        _COLORS[key] = colors
+    return colors
+
+_COLORS: dict[tuple[str, ...], dict[str, QtGui.QColor]] = {}
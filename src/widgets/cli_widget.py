@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import logging
+import sys
+import time
 from qtpy import QtWidgets as QtW, QtCore, QtGui
 from qtpy.QtCore import Qt
 
@@ -9,9 +11,17 @@ from ._base import is_too_bottom
 from .popups import QCompletionPopup, QCommandPalettePopup, QRecentFilePopup, QTooltipPopup, QSelectablePopup
 from .highlighter import QCommandHighlighter
 from .hints import HINTS
+from .command_queue import QCommandQueue, QueuedCode
+from ._theme import QPreferenceNotifier
 from .._types import WordInfo, resolve_cmd_desc, Mode
 from .._history import HistoryManager
+from .._timing import CommandTimingLog
+from .._batch import BatchResult, iter_lines
+from .._file_index import FileIndex
+from .._fetch_cache import FetchCacheIndex
 from ..algorithms import CompletionState, Context
+from ..algorithms.validate import SignatureTable, validate_lines, diagnostics_to_html
+from ..algorithms.command_trie import CommandTrie
 from .._utils import colored
 from .._preference import Preference
 from .._cli_utils import iter_all_commands
@@ -35,7 +45,13 @@ class QSuggestionLabel(QtW.QLabel):
 
 LOGGER = logging.getLogger(__name__)
 
+# pasting text with more lines than this suspends completion and highlighting
+BULK_PASTE_LINES = 50
+
 class QCommandLineEdit(QtW.QTextEdit):
+    # emitted from a worker thread when a pending path listing is done
+    _path_listed = QtCore.Signal()
+
     def __init__(self, commands: dict[str, WordInfo], session, preference: Preference):
         super().__init__()
         self.setFont(QtGui.QFont(_FONT))
@@ -43,7 +59,10 @@ class QCommandLineEdit(QtW.QTextEdit):
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.setPlaceholderText(HINTS.get_primary_hint())
         self.textChanged.connect(self._on_text_changed)
+        self._path_listed.connect(self._on_path_listed)
+        self._preference = preference
         self._commands = commands
+        self._command_trie = CommandTrie(commands.keys())
         self._mode = Mode.CLI
         self._current_completion_state = CompletionState.empty()
         self._list_widgets: dict[Mode, QSelectablePopup] = {
@@ -57,7 +76,20 @@ class QCommandLineEdit(QtW.QTextEdit):
         self._highlighter = QCommandHighlighter(self)
         self.set_height_for_block_counts()
         self._dont_need_inline_suggestion = False
+        self._bulk_inserting = False
+        self._signature_table: SignatureTable | None = None
+        self._queue = QCommandQueue(
+            self._run_queued_line, _inj.chimerax_run_batch(session), self
+        )
+        self._queue.progress.connect(self._on_queue_progress)
+        self._queue.finished.connect(self._on_queue_finished)
+        QPreferenceNotifier.instance().changed.connect(self._on_preference_changed)
+
+    def _on_preference_changed(self, preference: Preference):
+        old_theme = self._preference.color_theme
         self._preference = preference
+        if preference.color_theme != old_theme:
+            self._highlighter.set_color_theme(preference.color_theme)
 
     def get_context(self, winfo: WordInfo) -> Context:
         return Context(
@@ -72,7 +104,12 @@ class QCommandLineEdit(QtW.QTextEdit):
             filter_bond=_inj.chimerax_filter_bond,
             get_file_open_mode=_inj.chimerax_get_mode,
             get_file_list=_inj.chimerax_file_history(self._session),
+            get_open_suffixes=lambda: _inj.chimerax_open_suffixes(self._session),
+            search_files=_search_indexed_files,
+            search_fetch_cache=_search_fetch_cache,
+            keyword_values=_keyword_values,
             run_command=_inj.chimerax_run(self._session),
+            on_path_listed=self._path_listed.emit,
         )
     
     def clear_completion_state(self):
@@ -123,12 +160,35 @@ class QCommandLineEdit(QtW.QTextEdit):
             self._open_help_viewer(code[:-1].strip())
             self.setText("")
             return None
+        if "\n" in code and self._preference.validate_scripts:
+            table = self._get_signature_table()
+            if diagnostics := list(validate_lines(iter_lines(code), table)):
+                # keep the code so that it can be fixed
+                self._session.logger.error(diagnostics_to_html(diagnostics), is_html=True)
+                return None
+        if "\n" in code or self._queue.is_running():
+            # run in the following event loop turns
+            batch = self._preference.batch_execution
+            self._queue.submit(code, None if batch == "off" or "\n" not in code else batch)
+            self.setText("")
+            self.clear_completion_state()
+            return None
         ctx = self.get_context(None)
+        timing_log = CommandTimingLog.instance()
+        total_wall = 0.0
         try:
             for line in code.split("\n"):
                 if (line := line.strip()) == "":
                     continue
-                ctx.run_command(line)
+                t0 = time.perf_counter()
+                try:
+                    ctx.run_command(line)
+                except Exception:
+                    timing_log.record(line, time.perf_counter() - t0, False)
+                    raise
+                wall = time.perf_counter() - t0
+                timing_log.record(line, wall, True)
+                total_wall += wall
                 self._update_alias(line)  # If alias is set, update the library
                 self._update_namespace(line)
         except Exception:
@@ -136,12 +196,54 @@ class QCommandLineEdit(QtW.QTextEdit):
             raise
         else:
             if code:
-                HistoryManager.instance().add_code(code)
+                HistoryManager.instance().add_code(code, total_wall)
             HistoryManager.instance().init_iterator()
         finally:
             self.setText("")
             self.clear_completion_state()
 
+    def _get_signature_table(self) -> SignatureTable:
+        if self._signature_table is None:
+            self._signature_table = SignatureTable.from_commands(self._commands)
+        return self._signature_table
+
+    def _run_queued_line(self, line: str):
+        self.get_context(None).run_command(line)
+        self._update_alias(line)
+        self._update_namespace(line)
+
+    def _on_queue_progress(self, done: int, total: int):
+        msg = f"Running line {done}/{total} ... (Esc to cancel)"
+        self.setPlaceholderText(msg)
+        self._session.logger.status(msg)
+
+    def _on_queue_finished(self, queued: QueuedCode):
+        timing_log = CommandTimingLog.instance()
+        for each in queued.results:
+            timing_log.record(each.line, each.wall, each.ok)
+        mgr = HistoryManager.instance()
+        if queued.ok:
+            mgr.add_code(queued.code, queued.wall)
+            mgr.init_iterator()
+        else:
+            mgr.init_iterator(last=queued.code)
+        if not self._queue.is_running():
+            self.setPlaceholderText(HINTS.get_random_hint())
+            self._session.logger.status("")
+        if queued.batch_on_error is not None:
+            for each in queued.results:
+                if each.ok:
+                    self._update_alias(each.line)
+                    self._update_namespace(each.line)
+            result = BatchResult(queued.results, queued.num_cancelled)
+            if result.errors:
+                self._session.logger.error(result.to_html(), is_html=True)
+            else:
+                self._session.logger.info(result.to_html(), is_html=True)
+        elif (err := queued.error) is not None:
+            # report as the errors raised in the event loop
+            sys.excepthook(type(err), err, err.__traceback__)
+
     def _open_help_viewer(self, code: str):
         from chimerax.help_viewer import show_url  # type: ignore
             
@@ -175,6 +277,8 @@ class QCommandLineEdit(QtW.QTextEdit):
                 each_widget.try_show_me()
 
     def _on_text_changed(self):
+        if self._bulk_inserting:
+            return
         if txt := self.toPlainText():
             LOGGER.debug("Text changed: %r", txt)
         self._inline_suggestion_widget.hide()
@@ -186,7 +290,21 @@ class QCommandLineEdit(QtW.QTextEdit):
         list_widget = self._current_popup()
         self._show_popup_widget(list_widget)
         list_widget.post_show_me()
-        self.setPlaceholderText(HINTS.get_random_hint())
+        if self._inline_suggestion_widget.isVisible() and not txt:
+            # the predicted command overlaps the hint
+            self.setPlaceholderText("")
+        else:
+            self.setPlaceholderText(HINTS.get_random_hint())
+
+    def _on_path_listed(self):
+        """Refresh the path completion list after the listing is done."""
+        if self._mode is not Mode.CLI or not self.hasFocus():
+            return
+        if "path" not in self._current_completion_state.type.split(","):
+            return
+        list_widget = self._current_popup()
+        self._show_popup_widget(list_widget)
+        list_widget.post_show_me()
 
     def _show_inline_suggestion(self, suggested: str):
         # Guard against accessing cursor when document might be empty
@@ -288,6 +406,9 @@ class QCommandLineEdit(QtW.QTextEdit):
         if self._mode is Mode.CLI:
             if list_widget.isVisible():
                 list_widget.exec_current_item()
+            elif self.toPlainText() == "":
+                self._inline_suggestion_widget.hide()
+                list_widget.show_next_commands()
             elif not self._update_completion_state(True):
                 pass
             else:
@@ -302,8 +423,28 @@ class QCommandLineEdit(QtW.QTextEdit):
         # if html is pasted, converted it to a plain text
         clip = QtW.QApplication.clipboard()
         text = clip.text()
-        self.insertPlainText(text)
+        self._insert_pasted_text(text)
         return True
+
+    def _insert_pasted_text(self, text: str):
+        if text.count("\n") < BULK_PASTE_LINES:
+            self.insertPlainText(text)
+            return None
+        # Large paste such as a script. Completion, popups and highlighting of all the
+        # blocks are too slow to run for each change.
+        self._close_popups()
+        self._bulk_inserting = True
+        self._highlighter.suspend()
+        try:
+            self.insertPlainText(text)
+        finally:
+            self._bulk_inserting = False
+        self.ensureCursorVisible()
+        first = self.cursorForPosition(QtCore.QPoint(0, 0)).block()
+        last = self.cursorForPosition(self.viewport().rect().bottomRight()).block()
+        self._highlighter.resume(first, last)
+        self._on_text_changed()  # completion of the cursor line
+        return None
     
     def _event_delete_word(self, event: QtGui.QKeyEvent):
         cursor = self.textCursor()
@@ -406,8 +547,12 @@ class QCommandLineEdit(QtW.QTextEdit):
         if (
             any(w.isVisible() for w in self._list_widgets.values())
             or self._tooltip_widget.isVisible()
+            or self._inline_suggestion_widget.isVisible()
         ):
             self._close_popups()
+        elif self.toPlainText() == "" and self._queue.is_running():
+            if num := self._queue.cancel():
+                self._session.logger.info(f"Cancelled {num} remaining lines.")
         else:
             self.setText("")
             HistoryManager.instance().init_iterator()
@@ -484,6 +629,8 @@ class QCommandLineEdit(QtW.QTextEdit):
         if line.startswith(("~alias ", "alias ")):
             # NOTE: this is not the most efficient way, but is "safest"
             self._commands = dict(iter_all_commands())
+            self._command_trie = CommandTrie(self._commands.keys())
+            self._signature_table = None
          
     def _update_namespace(self, line: str):
         """Update the command registry for namespace changes."""
@@ -491,6 +638,18 @@ class QCommandLineEdit(QtW.QTextEdit):
             _inj.chimerax_selectors.clear_cache()
             _inj.chimerax_selectors()  # create cache here
 
+def _search_indexed_files(query: str) -> list[str]:
+    return [match.text for match in FileIndex.instance().search(query)]
+
+def _search_fetch_cache(prefix: str) -> list[tuple[str, str]]:
+    return [
+        (entry.spec, entry.describe())
+        for entry in FetchCacheIndex.instance().search(prefix)
+    ]
+
+def _keyword_values(command: str, keyword: str) -> list[str]:
+    return HistoryManager.instance().keyword_values(command, keyword)
+
 _HIDE_POPUPS = {
     QtCore.QEvent.Type.Move,
     QtCore.QEvent.Type.Hide,
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+import time
+from typing import Any, Callable
+from qtpy import QtCore
+
+from .._batch import BatchResult, LineResult, iter_lines
+
+@dataclass
+class QueuedCode:
+    """Code submitted to the command queue."""
+    code: str
+    lines: list[tuple[int, str]]
+    batch_on_error: str | None = None  # run all the lines at once if given
+    results: list[LineResult] = field(default_factory=list)
+    num_cancelled: int = 0
+
+    @property
+    def error(self) -> Exception | None:
+        for result in self.results:
+            if not result.ok:
+                return result.error
+        return None
+
+    @property
+    def ok(self) -> bool:
+        return self.num_cancelled == 0 and all(r.ok for r in self.results)
+
+    @property
+    def wall(self) -> float:
+        return sum(r.wall for r in self.results)
+
+class QCommandQueue(QtCore.QObject):
+    """Queue of command lines run one per event loop turn.
+
+    ChimeraX commands must run in the main thread. Running one line per turn keeps
+    the event loop responsive, so that the progress is shown, the remaining lines
+    can be cancelled and the next input can be typed and queued.
+    """
+
+    # (number of the lines done, number of all the lines) of the current code
+    progress = QtCore.Signal(int, int)
+    # emitted with the QueuedCode when all its lines are run, failed or cancelled
+    finished = QtCore.Signal(object)
+
+    def __init__(
+        self,
+        run_line: Callable[[str], Any],
+        run_batch: Callable[[str, str], BatchResult],
+        parent: QtCore.QObject | None = None,
+    ):
+        super().__init__(parent)
+        self._run_line = run_line
+        self._run_batch = run_batch
+        self._queue: deque[QueuedCode] = deque()
+        self._next_line = 0  # index of the next line of the current code
+        self._timer = QtCore.QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self._run_next)
+
+    def is_running(self) -> bool:
+        return len(self._queue) > 0
+
+    def submit(self, code: str, batch_on_error: str | None = None) -> QueuedCode:
+        """Add the code to the queue and start running if not running."""
+        queued = QueuedCode(code, list(iter_lines(code)), batch_on_error)
+        self._queue.append(queued)
+        if not self._timer.isActive():
+            self._timer.start()
+        return queued
+
+    def cancel(self) -> int:
+        """Cancel all the remaining lines and return the number of them."""
+        if not self._queue:
+            return 0
+        self._timer.stop()
+        current = self._queue.popleft()
+        current.num_cancelled = len(current.lines) - self._next_line
+        num_cancelled = current.num_cancelled + sum(len(q.lines) for q in self._queue)
+        self._queue.clear()
+        self._next_line = 0
+        self.finished.emit(current)
+        return num_cancelled
+
+    def _run_next(self):
+        if not self._queue:
+            return
+        current = self._queue[0]
+        if current.batch_on_error is not None:
+            result = self._run_batch(current.code, current.batch_on_error)
+            current.results = result.results
+            current.num_cancelled = result.num_skipped
+            self._finish_current()
+            return
+        if self._next_line >= len(current.lines):
+            self._finish_current()
+            return
+        lineno, line = current.lines[self._next_line]
+        t0 = time.perf_counter()
+        try:
+            self._run_line(line)
+        except Exception as e:
+            error = e
+        else:
+            error = None
+        if not self._queue or self._queue[0] is not current:
+            return  # cancelled while running the line
+        if error is not None:
+            current.results.append(LineResult(lineno, line, time.perf_counter() - t0, error))
+            current.num_cancelled = len(current.lines) - self._next_line - 1
+            self._finish_current()
+            return
+        current.results.append(LineResult(lineno, line, time.perf_counter() - t0))
+        self._next_line += 1
+        self.progress.emit(self._next_line, len(current.lines))
+        if self._next_line >= len(current.lines):
+            self._finish_current()
+        else:
+            self._timer.start()
+
+    def _finish_current(self):
+        current = self._queue.popleft()
+        self._next_line = 0
+        if self._queue:
+            self._timer.start()
+        self.finished.emit(current)
@@ -1,85 +1,175 @@
 from __future__ import annotations
 
+from dataclasses import astuple
 from typing import TYPE_CHECKING
 
-from qtpy import QtGui
+from qtpy import QtGui, QtCore
 from .._types import resolve_cmd_desc, Mode
-from .._preference import load_preference
+from .._preference import ColorTheme
+from ..algorithms.command_trie import iter_words
+from ._theme import theme_colors
 
 if TYPE_CHECKING:
     from .cli_widget import QCommandLineEdit
 
+# number of blocks highlighted in one event loop turn after resuming
+HIGHLIGHT_CHUNK = 200
+# number of blocks whose tokens are cached
+BLOCK_CACHE_SIZE = 2048
+
 class QCommandHighlighter(QtGui.QSyntaxHighlighter):
-    """Syntax highlighter for QCommandLineEdit."""
+    """Syntax highlighter for QCommandLineEdit.
+
+    The tokens of each block are cached by the block text, and the text formats are
+    shared, so that highlighting a block again does not create any object.
+    """
     def __init__(self, parent: QCommandLineEdit):
         super().__init__(parent.document())
-        self._command_strings = set()
-        for cmd in parent._commands.keys():
-            self._command_strings.add(cmd)
-            if " " in cmd:
-                self._command_strings.add(cmd.split(" ", 1)[0])
         self._parent = parent
-    
+        self._trie = parent._command_trie
+        self._formats = formats_for_theme(parent._preference.color_theme)
+        # block text -> (start, length, kind) of the tokens
+        self._spans: dict[str, tuple[tuple[int, int, str], ...]] = {}
+        self._keywords: dict[str, frozenset[str]] = {}
+        self._suspended = False
+        self._next_block: int | None = None  # next block to be highlighted later
+
+    def suspend(self):
+        """Stop highlighting the changed blocks until `resume` is called."""
+        self._suspended = True
+        self._next_block = None
+
+    def resume(self, first: QtGui.QTextBlock, last: QtGui.QTextBlock):
+        """Highlight the blocks from `first` to `last` now and the others when idle."""
+        self._suspended = False
+        block = first
+        while block.isValid():
+            self.rehighlightBlock(block)
+            if block == last:
+                break
+            block = block.next()
+        self._next_block = 0
+        QtCore.QTimer.singleShot(0, self._highlight_next_chunk)
+
+    def _highlight_next_chunk(self):
+        if self._suspended or self._next_block is None:
+            return
+        block = self.document().findBlockByNumber(self._next_block)
+        for _ in range(HIGHLIGHT_CHUNK):
+            if not block.isValid():
+                self._next_block = None
+                return
+            self.rehighlightBlock(block)
+            block = block.next()
+        if block.isValid():
+            self._next_block = block.blockNumber()
+            QtCore.QTimer.singleShot(0, self._highlight_next_chunk)
+        else:
+            self._next_block = None
+
+    def set_color_theme(self, theme: ColorTheme):
+        """Use the formats of the color theme and highlight all the blocks again."""
+        self._formats = formats_for_theme(theme)
+        self.rehighlight()
+
     def highlightBlock(self, text: str):
-        if text.strip() == "":
+        if self._suspended or self._parent._mode is not Mode.CLI:
             return
-        _color_theme = load_preference(force=False).color_theme
-        if self._parent._mode is not Mode.CLI:
-            self.setFormat(0, 1, QtGui.QTextCharFormat())
-            fmt = QtGui.QTextCharFormat()
-            fmt.setForeground(QtGui.QColor(_color_theme.comment))
-            self.setFormat(1, len(text), QtGui.QTextCharFormat())
-            return None
+        if self._trie is not self._parent._command_trie:
+            # commands are updated by aliases
+            self._trie = self._parent._command_trie
+            self._spans.clear()
+            self._keywords.clear()
+        if (spans := self._spans.get(text)) is None:
+            spans = self._tokenize(text)
+        formats = self._formats
+        for start, length, kind in spans:
+            self.setFormat(start, length, formats[kind])
+
+    def _tokenize(self, text: str) -> tuple[tuple[int, int, str], ...]:
+        """Return the (start, length, kind) of the highlighted tokens of a block."""
         if text.startswith("#"):
-            # comment
-            fmt = QtGui.QTextCharFormat()
-            fmt.setForeground(QtGui.QColor(_color_theme.comment))
-            self.setFormat(0, len(text), fmt)
-            return None
-        if text.endswith("?"):
-            return self.highlightBlock(text[:-1])
-        cur_command: list[str] = []
-        cur_start = 0
-        cur_stop = 0
-        for word in text.split(" "):
-            if word != "":
-                cur_command.append(word)
-            next_stop = cur_stop + len(word)
-            if " ".join(cur_command) in self._command_strings:
-                fmt = QtGui.QTextCharFormat()
-                fmt.setForeground(QtGui.QColor(_color_theme.command))
-                fmt.setFontWeight(QtGui.QFont.Weight.Bold)
-                self.setFormat(cur_start, next_stop, fmt)
-            elif word.startswith(("#", "/", ":", "@")):
-                fmt = QtGui.QTextCharFormat()
-                fmt.setForeground(QtGui.QColor(_color_theme.model))
-                self.setFormat(cur_start, next_stop, fmt)
-            elif self._is_keyword(word):
-                fmt = QtGui.QTextCharFormat()
-                fmt.setForeground(QtGui.QColor(_color_theme.keyword))
-                self.setFormat(cur_start, next_stop, fmt)
+            return self._cache_spans(text, ((0, len(text), "comment"),))
+        spans: list[tuple[int, int, str]] = []
+        node = self._trie.root
+        depth = 0
+        command: str | None = None
+        keywords: frozenset[str] | None = None
+        cacheable = True
+        for start, word in iter_words(text[:-1] if text.endswith("?") else text):
+            if node is not None and (node := node.children.get(word)) is not None:
+                depth += 1
+                if node.name is not None:
+                    command = node.name
+                if node.name is not None or depth == 1:
+                    spans.append((start, len(word), "command"))
+                    continue
+            if word.startswith(("#", "/", ":", "@")):
+                spans.append((start, len(word), "model"))
+                continue
+            if keywords is None:
+                if (keywords := self._keywords_of(command)) is None:
+                    # highlight keywords after the command is resolved
+                    keywords = frozenset()
+                    cacheable = False
+            if word in keywords:
+                spans.append((start, len(word), "keyword"))
             elif self._is_real_number(word):
-                fmt = QtGui.QTextCharFormat()
-                fmt.setForeground(QtGui.QColor(_color_theme.number))
-                self.setFormat(cur_start, next_stop, fmt)
-            else:
-                self.setFormat(cur_start, next_stop, QtGui.QTextCharFormat())
-            cur_start = next_stop + 1
-            cur_stop += len(word) + 1
-
-    def _is_keyword(self, word: str) -> bool:
-        cmd = self._parent._current_completion_state.command
-        if cmd is None:
-            return False
-        winfo = self._parent._commands[cmd]
-        cmd_desc = resolve_cmd_desc(winfo, cmd)
-        if cmd_desc is None:
-            return False
-        return word in cmd_desc._keyword.keys()
-    
+                spans.append((start, len(word), "number"))
+        if cacheable:
+            return self._cache_spans(text, tuple(spans))
+        return tuple(spans)
+
+    def _cache_spans(self, text: str, spans: tuple[tuple[int, int, str], ...]):
+        if len(self._spans) >= BLOCK_CACHE_SIZE:
+            self._spans.clear()
+        self._spans[text] = spans
+        return spans
+
+    def _keywords_of(self, command: str | None) -> frozenset[str] | None:
+        """Keywords of the command, or None if the command is not resolved yet.
+
+        Only the command being typed is resolved here, so that highlighting a
+        pasted script does not import the bundles of all its commands.
+        """
+        if command is None:
+            return frozenset()
+        if (keywords := self._keywords.get(command)) is not None:
+            return keywords
+        winfo = self._parent._commands.get(command)
+        if winfo is None or winfo.cmd_desc is None:
+            keywords = frozenset()
+        elif (
+            hasattr(winfo.cmd_desc, "function")
+            or command == self._parent._current_completion_state.command
+        ):
+            cmd_desc = resolve_cmd_desc(winfo, command)
+            keywords = frozenset() if cmd_desc is None else frozenset(cmd_desc._keyword)
+        else:
+            return None
+        self._keywords[command] = keywords
+        return keywords
+
     def _is_real_number(self, word: str) -> bool:
         try:
             float(word)
             return True
         except Exception:
             return False
+
+def formats_for_theme(theme: ColorTheme) -> dict[str, QtGui.QTextCharFormat]:
+    """Text formats of each token kind, created once for each color theme."""
+    key = astuple(theme)
+    if (formats := _FORMATS.get(key)) is None:
+        colors = theme_colors(theme)
+        formats = {}
+        for kind in ("comment", "command", "model", "keyword", "number"):
+            fmt = QtGui.QTextCharFormat()
+            fmt.setForeground(colors[kind])
+            if kind == "command":
+                fmt.setFontWeight(QtGui.QFont.Weight.Bold)
+            formats[kind] = fmt
+        _FORMATS[key] = formats
+    return formats
+
+_FORMATS: dict[tuple[str, ...], dict[str, QtGui.QTextCharFormat]] = {}
@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+from html import escape
 from pathlib import Path
-from typing import TYPE_CHECKING
+from typing import Callable, TYPE_CHECKING
 import re
 from qtpy import QtWidgets as QtW, QtCore, QtGui
 from .._history import HistoryManager
+from .._preference import load_preference
+from .._utils import bold_colored
+from ..algorithms.history_filter import HistoryFilter, FilterMode
 from .consts import _FONT
 
 if TYPE_CHECKING:
@@ -43,7 +47,31 @@ class QHistoryListModel(QtCore.QAbstractListModel):
     def __init__(self, history: list[str], parent: QHistoryList):
         super().__init__(parent)
         self._history = history
+        self._rows: list[int] = list(range(len(history)))  # indices of shown items
+        self._positions: Callable[[int], list[int]] | None = None
         self.set_theme(False)  # initialize brushes
+
+    def set_rows(self, rows: list[int], positions: Callable[[int], list[int]] | None = None):
+        """Update the shown items in place."""
+        self.beginResetModel()
+        self._rows = rows
+        self._positions = positions
+        self.endResetModel()
+
+    def highlighted_html(self, row: int) -> str | None:
+        """Return the HTML text with the matched characters highlighted, if any."""
+        if self._positions is None:
+            return None
+        index = self._rows[row]
+        if not (positions := self._positions(index)):
+            return None
+        text = self._history[index]
+        color = load_preference(force=False).color_theme.matched
+        matched = set(positions)
+        return "".join(
+            bold_colored(escape(c), color) if i in matched else escape(c)
+            for i, c in enumerate(text)
+        ).replace("\n", "<br>")
     
     def set_theme(self, is_dark: bool):
         if is_dark:
@@ -56,13 +84,13 @@ class QHistoryListModel(QtCore.QAbstractListModel):
             self._brush_odd = QtGui.QBrush(QtGui.QColor(238, 238, 238))
 
     def rowCount(self, parent=None):
-        return len(self._history)
+        return len(self._rows)
 
     def data(self, index, role):
         if not index.isValid():
             return None
         if role == QtCore.Qt.ItemDataRole.DisplayRole:
-            return self._history[index.row()]
+            return self._history[self._rows[index.row()]]
         elif role == QtCore.Qt.ItemDataRole.FontRole:
             return _QFONT
         elif role == QtCore.Qt.ItemDataRole.BackgroundRole:
@@ -78,6 +106,32 @@ class QHistoryListModel(QtCore.QAbstractListModel):
         def parent(self) -> QHistoryList:
             return super().parent()
 
+class QHighlightDelegate(QtW.QStyledItemDelegate):
+    """Delegate that paints the fuzzy matched characters in bold."""
+
+    def paint(self, painter: QtGui.QPainter, option, index: QtCore.QModelIndex):
+        model = index.model()
+        if not isinstance(model, QHistoryListModel):
+            return super().paint(painter, option, index)
+        if (html := model.highlighted_html(index.row())) is None:
+            return super().paint(painter, option, index)
+        opt = QtW.QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        opt.text = ""
+        style = opt.widget.style() if opt.widget else QtW.QApplication.style()
+        style.drawControl(QtW.QStyle.ControlElement.CE_ItemViewItem, opt, painter, opt.widget)
+        doc = QtGui.QTextDocument()
+        doc.setDefaultFont(_QFONT)
+        doc.setDocumentMargin(0)
+        doc.setHtml(html)
+        text_rect = style.subElementRect(
+            QtW.QStyle.SubElement.SE_ItemViewItemText, opt, opt.widget
+        )
+        painter.save()
+        painter.translate(text_rect.topLeft())
+        doc.drawContents(painter, QtCore.QRectF(0, 0, text_rect.width(), text_rect.height()))
+        painter.restore()
+
 class QHistoryWidget(QtW.QWidget):
     """Widget that will be shown when the user clicks on the history button."""
     def __init__(self, btn: QShowHistoryButton):
@@ -113,12 +167,14 @@ class QHistoryWidget(QtW.QWidget):
         
         self.setMaximumHeight(500)
         self._filter._filter_line.textChanged.connect(self._filter_text_changed)
+        self._filter._method_choice.currentIndexChanged.connect(self._filter_text_changed)
 
-    def _filter_text_changed(self, txt: str):
-        if txt == "":
-            self._history_list.set_list(HistoryManager.instance().aslist())
-        texts = self._filter.run_filter(self._history_list._model._history)
-        self._history_list.set_list(texts)
+    def _filter_text_changed(self):
+        try:
+            rows = self._filter.run_filter(self._history_list._engine)
+        except re.error:
+            return  # incomplete regular expression
+        self._history_list.set_rows(rows, self._history_list._engine.positions)
     
     def _selection_to_text(self) -> str:
         """Get the selected text from the history list."""
@@ -171,15 +227,21 @@ class QHistoryList(QtW.QListView):
         self.setEditTriggers(QtW.QAbstractItemView.EditTrigger.NoEditTriggers)
         self.setSelectionMode(QtW.QAbstractItemView.SelectionMode.ExtendedSelection)
         self._btn = parent
+        self._model = QHistoryListModel([], self)
+        self.setModel(self._model)
+        self.setItemDelegate(QHighlightDelegate(self))
         self.set_list(HistoryManager.instance().aslist())
 
     def set_list(self, hist: list[str]):
-        self._model = QHistoryListModel(hist, self)
-        self.setModel(self._model)
+        self._engine = HistoryFilter(hist)
+        self._engine.build_async()
+        self._model._history = self._engine.texts
+        self.set_rows(list(range(len(hist))))
+
+    def set_rows(self, rows: list[int], positions: Callable[[int], list[int]] | None = None):
+        self._model.set_rows(rows, positions)
         self.scrollToBottom()
         self.setCurrentIndex(self._model.index(self._model.rowCount() - 1, 0))
-        if list_widget := self._btn._hist_list_widget:
-            list_widget.set_theme(list_widget._is_dark)
 
 class QFilterLineEdit(QtW.QLineEdit):
     def keyPressEvent(self, a0: QtGui.QKeyEvent | None) -> None:
@@ -208,11 +270,12 @@ class QHistoryFilter(QtW.QWidget):
         
         self._method_choice = QtW.QComboBox()
 
-        self._method_choice.addItems(["abc___", "___abc", "__abc__", ".*"])
+        self._method_choice.addItems(["abc___", "___abc", "__abc__", ".*", "a_b_c"])
         self._method_choice.setItemData(0, "Starts with", QtCore.Qt.ItemDataRole.ToolTipRole)
         self._method_choice.setItemData(1, "Ends with", QtCore.Qt.ItemDataRole.ToolTipRole)
         self._method_choice.setItemData(2, "Contains", QtCore.Qt.ItemDataRole.ToolTipRole)
         self._method_choice.setItemData(3, "Regular expression match", QtCore.Qt.ItemDataRole.ToolTipRole)
+        self._method_choice.setItemData(4, "Fuzzy match (best match at the bottom)", QtCore.Qt.ItemDataRole.ToolTipRole)
 
         self._layout.addWidget(QtW.QLabel("Search:"))
         self._layout.addWidget(self._method_choice)
@@ -220,15 +283,11 @@ class QHistoryFilter(QtW.QWidget):
         
         self._method_choice.currentIndexChanged.connect(lambda: self._filter_line.setFocus())
     
-    def run_filter(self, texts: list[str]) -> list[str]:
-        if self._method_choice.currentIndex() == 0:
-            out = [text for text in texts if text.startswith(self._filter_line.text())]
-        elif self._method_choice.currentIndex() == 1:
-            out = [text for text in texts if text.endswith(self._filter_line.text())]
-        elif self._method_choice.currentIndex() == 2:
-            out = [text for text in texts if self._filter_line.text() in text]
-        elif self._method_choice.currentIndex() == 3:
-            out = [text for text in texts if re.match(self._filter_line.text(), text) is not None]
-        else:
-            out = texts
-        return out
+    def run_filter(self, engine: HistoryFilter) -> list[int]:
+        """Return the indices of the matched texts."""
+        modes = [
+            FilterMode.STARTS_WITH, FilterMode.ENDS_WITH, FilterMode.CONTAINS,
+            FilterMode.REGEX, FilterMode.FUZZY,
+        ]
+        mode = modes[self._method_choice.currentIndex()]
+        return engine.run(mode, self._filter_line.text())
@@ -17,6 +17,7 @@ from ..palette import command_palette_actions, color_text_by_match
 from .._preference import load_preference
 from .._utils import colored
 from ..algorithms import complete_path, complete_keyword_name_or_value, CompletionState
+from ..algorithms.annotations import is_file_path
 try:
     from .. import _injection as _inj
 except ImportError:
@@ -62,6 +63,18 @@ class QCompletionPopup(QSelectablePopup):
 
     def complete_with(self, comp: str, typ: str):
         parent = self.parentWidget()
+        if "replace" in typ.split(","):
+            # replace the whole word with the completion
+            cursor = parent.textCursor()
+            cursor.movePosition(
+                QtGui.QTextCursor.MoveOperation.Left,
+                QtGui.QTextCursor.MoveMode.KeepAnchor,
+                len(parent._current_completion_state.text),
+            )
+            cursor.insertText(comp)
+            parent._update_completion_state(False)
+            parent._close_popups()
+            return
         if "path" in typ.split(","):
             _n = len(parent._current_completion_state.text.rsplit("/", 1)[-1].rsplit("\\", 1)[-1])
         else:
@@ -188,16 +201,53 @@ class QCompletionPopup(QSelectablePopup):
                 return state
 
         # path completion
-        if state := complete_path(last_word, current_command):
+        mode, suffixes = self._path_mode(cmd, args)
+        if state := complete_path(
+            last_word,
+            current_command,
+            self.parentWidget()._path_listed.emit,
+            mode=mode,
+            suffixes=suffixes,
+        ):
             return state
 
         return CompletionState(text, [], current_command)
    
+    def _path_mode(self, cmd: str, args: list[str]) -> tuple[str, list[str]]:
+        """File open mode and favored suffixes of the argument being typed."""
+        parent = self.parentWidget()
+        if (winfo := parent._commands.get(cmd, None)) is None:
+            return "", []
+        if (cmd_desc := resolve_cmd_desc(winfo, cmd)) is None:
+            return "", []
+        if args and args[-1] in cmd_desc._keyword:
+            annot = cmd_desc._keyword[args[-1]]
+        else:
+            positional = [*cmd_desc._required.values(), *cmd_desc._optional.values()]
+            if len(args) >= len(positional):
+                return "", []
+            annot = positional[len(args)]
+        if not is_file_path(annot):
+            return "", []
+        mode = _inj.chimerax_get_mode(annot)
+        if mode in ("r", "rm"):
+            return mode, _inj.chimerax_open_suffixes(parent._session)
+        return mode, []
+
+    def show_next_commands(self) -> bool:
+        """Show the lines that are likely to be run next for the empty line."""
+        parent = self.parentWidget()
+        if not (lines := HistoryManager.instance().predict_next()):
+            return False
+        parent._current_completion_state = CompletionState("", lines, type="history")
+        self.add_items_with_highlight(parent._current_completion_state)
+        parent._optimize_selectable_popup_geometry(self)
+        self.setCurrentRow(0)
+        return True
+
     def _current_and_matched_commands(self, text: str) -> tuple[str, list[str]]:
         matched_commands: list[str] = []
-        current_command: str | None = None
         text_lstrip = text.lstrip()
-        text_strip = text.strip()
         for command_name in self.parentWidget()._commands.keys():
             if command_name.startswith(text_lstrip):
                 # if `text` is "toolshed", add
@@ -205,8 +255,7 @@ class QCompletionPopup(QSelectablePopup):
                 #   toolshed install ...
                 # to `matched_commands`
                 matched_commands.append(command_name)
-            elif text_strip == command_name or text_strip.startswith(command_name.rstrip() + " "):
-                current_command = command_name
+        current_command = self.parentWidget()._command_trie.current_command(text)
         return current_command, matched_commands
 
 
@@ -258,6 +307,9 @@ class QCompletionPopup(QSelectablePopup):
         if not parent._dont_need_inline_suggestion:
             # Guard against accessing cursor when document might be empty
             if parent.document().isEmpty():
+                # predict the next command from the previous ones
+                if suggested := HistoryManager.instance().suggest(""):
+                    parent._show_inline_suggestion(suggested)
                 return
             cursor = parent.textCursor()
             if not cursor.isNull() and cursor.position() <= parent.document().characterCount():
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import os
 from .._preference import Preference, ColorTheme, load_preference, save_preference
 from ._color_widget import QLabeledColorSwatch
 from qtpy import QtWidgets as QtW, QtGui
@@ -66,6 +67,40 @@ class QPreferenceDialog(QtW.QDialog):
         )
         self._auto_focus.setChecked(preference.auto_focus)
         layout.addRow(self._auto_focus)
+
+        self._file_index_roots = QtW.QLineEdit()
+        self._file_index_roots.setToolTip(
+            "Directories to be indexed for fuzzy file path completion (such as \n"
+            f"`open **emd_1234`). Multiple directories are separated by {os.pathsep!r}."
+        )
+        self._file_index_roots.setText(os.pathsep.join(preference.file_index_roots))
+        layout.addRow("Indexed directories", self._file_index_roots)
+
+        self._history_backend = QtW.QComboBox()
+        self._history_backend.addItems(["file", "sqlite"])
+        self._history_backend.setToolTip(
+            "Storage of the command history. Use \"sqlite\" to share the history \n"
+            "between ChimeraX instances running at the same time."
+        )
+        self._history_backend.setCurrentText(preference.history_backend)
+        layout.addRow("History backend", self._history_backend)
+
+        self._batch_execution = QtW.QComboBox()
+        self._batch_execution.addItems(["off", "stop", "continue"])
+        self._batch_execution.setToolTip(
+            "Run multi-line input as one unit without redrawing after each line.\n"
+            "\"stop\" skips the rest after an error and \"continue\" runs all the lines."
+        )
+        self._batch_execution.setCurrentText(preference.batch_execution)
+        layout.addRow("Batch execution", self._batch_execution)
+
+        self._validate_scripts = QtW.QCheckBox("Validate scripts before running")
+        self._validate_scripts.setToolTip(
+            "Check the command names and arguments of all the lines of multi-line \n"
+            "input before running any of them."
+        )
+        self._validate_scripts.setChecked(preference.validate_scripts)
+        layout.addRow(self._validate_scripts)
         
         layout.addRow(QtW.QLabel(" --- Color ---"))
         self._color_theme = QColorThemePage()
@@ -87,6 +122,12 @@ class QPreferenceDialog(QtW.QDialog):
             show_label=self._show_label.isChecked(),
             enter_completion=self._enter_completion.isChecked(),
             auto_focus=self._auto_focus.isChecked(),
+            file_index_roots=[
+                root for root in self._file_index_roots.text().split(os.pathsep) if root
+            ],
+            history_backend=self._history_backend.currentText(),
+            batch_execution=self._batch_execution.currentText(),
+            validate_scripts=self._validate_scripts.isChecked(),
             color_theme=self._color_theme.get_color_theme(),
         )
         self.accept()